@@ -0,0 +1,131 @@
+"""
+Throughput of the batch anomaly detection on synthetic fleet data, through the path the
+detect-anomalies command takes: BatchAnomalyDetector.run loads the readings of every equipment,
+scores them and replaces the anomalies of the window. The time of each of the three steps is reported.
+
+The readings are written to a temporary SQLite database first; set NAVEXA_DATABASE_URI to run against a
+scratch PostgreSQL database instead (the synthetic fleet is added to it and left there).
+
+    PYTHONPATH=src python benchmark/anomaly_benchmark.py --equipment 20 --sensors-per-equipment 6 --hz 1 --hours 2
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+FOLDER = tempfile.mkdtemp()
+os.environ.setdefault("NAVEXA_DATABASE_URI", f"sqlite:///{os.path.join(FOLDER, 'anomalies.db')}")
+
+import numpy as np
+from sqlalchemy import func, insert, select, text
+
+from analytics import BatchAnomalyDetector
+from api import app
+from models import db, Organization, Fleet, Vessel, Equipment, Sensor, SensorReading, SensorThreshold
+
+END = datetime(2025, 1, 2)
+INSERT_BATCH = 10_000
+
+
+def synthetic_equipment(rng, sensors: int, samples: int, anomaly_rate: float):
+    sensor_index = np.repeat(np.arange(sensors), samples)
+    timestamps = np.tile(np.arange(samples, dtype=float), sensors)
+    baseline = rng.uniform(20, 500, sensors)
+    values = baseline[sensor_index] + rng.normal(0, 1, sensors * samples)
+    spikes = rng.random(values.shape) < anomaly_rate
+    values[spikes] += rng.choice([-1, 1], spikes.sum()) * 25
+    return sensor_index, timestamps, values, baseline - 10, baseline + 10
+
+
+class TimedDetector(BatchAnomalyDetector):
+    """Adds up the seconds spent loading the readings and scoring them."""
+    def __init__(self, session, **options):
+        super().__init__(session, **options)
+        self.seconds = Counter()
+
+    def load(self, equipment_id: int, start: datetime, end: datetime):
+        began = time.perf_counter()
+        columns = super().load(equipment_id, start, end)
+        self.seconds["load"] += time.perf_counter() - began
+        return columns
+
+    def detect_equipment(self, *args) -> list[dict]:
+        began = time.perf_counter()
+        anomalies = super().detect_equipment(*args)
+        self.seconds["load and detect"] += time.perf_counter() - began
+        return anomalies
+
+
+def seed(args) -> list[int]:
+    """Writes the synthetic fleet; returns the ids of its equipment."""
+    rng = np.random.default_rng(42)
+    samples = int(args.hours * 3600 * args.hz)
+    offsets = np.arange(samples) / args.hz
+    start = END - timedelta(hours=args.hours)
+    reading_id = (db.session.scalar(select(func.max(SensorReading.reading_id))) or 0) + 1
+    fleet = Fleet(name="Benchmark Fleet", organization=Organization(name="Benchmark Shipping"))
+    vessel = Vessel(name="MS Benchmark", fleet=fleet)
+    equipment_ids = []
+    for _ in range(args.equipment):
+        equipment = Equipment(type="Main Engine", vessel=vessel)
+        db.session.add(equipment)
+        db.session.flush()
+        equipment_ids.append(equipment.equipment_id)
+        sensor_index, _, values, lower, upper = synthetic_equipment(
+            rng, args.sensors_per_equipment, samples, args.anomaly_rate)
+        for s in range(args.sensors_per_equipment):
+            sensor = Sensor(type=f"Sensor {s}", equipment_id=equipment.equipment_id)
+            db.session.add(sensor)
+            db.session.flush()
+            db.session.add(SensorThreshold(sensor_id=sensor.sensor_id, min_value=float(lower[s]),
+                                           max_value=float(upper[s]), context_conditions="Normal operation"))
+            sensor_values = values[sensor_index == s]
+            # Explicit ids, SQLite only generates them for INTEGER primary keys
+            rows = [{"reading_id": reading_id + i, "sensor_id": sensor.sensor_id,
+                     "timestamp": start + timedelta(seconds=float(offsets[i])), "value": float(sensor_values[i])}
+                    for i in range(samples)]
+            reading_id += samples
+            for batch in range(0, len(rows), INSERT_BATCH):
+                db.session.execute(insert(SensorReading), rows[batch:batch + INSERT_BATCH])
+    db.session.commit()
+    return equipment_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--equipment', type=int, default=20)
+    parser.add_argument('--sensors-per-equipment', type=int, default=6)
+    parser.add_argument('--hz', type=float, default=1.0, help='sampling frequency of every sensor')
+    parser.add_argument('--hours', type=float, default=2.0)
+    parser.add_argument('--anomaly-rate', type=float, default=1e-4)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+        sqlite = db.engine.dialect.name == "sqlite"
+        if sqlite:
+            # The index db/create.sql gives every partition, which create_all doesn't
+            db.session.execute(text("CREATE INDEX IF NOT EXISTS sensor_reading_sensor_id_timestamp_idx "
+                                    "ON sensor_reading (sensor_id, timestamp)"))
+        equipment_ids = seed(args)
+        if sqlite:
+            db.session.execute(text("ANALYZE"))  # without statistics SQLite scans the whole index per equipment
+        detector = TimedDetector(db.session)
+        began = time.perf_counter()
+        written = detector.run(END - timedelta(hours=args.hours), END, equipment_ids)
+        elapsed = time.perf_counter() - began
+    shutil.rmtree(FOLDER, ignore_errors=True)
+
+    points = args.equipment * args.sensors_per_equipment * int(args.hours * 3600 * args.hz)
+    load = detector.seconds["load"]
+    detect = detector.seconds["load and detect"] - load
+    print(f"{points:,} readings of {args.equipment * args.sensors_per_equipment} sensors in {elapsed:.2f}s "
+          f"-> {points / elapsed:,.0f} readings/s, {written:,} anomalies")
+    print(f"load {load:.2f}s, detect {detect:.2f}s, replace the anomalies {elapsed - load - detect:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+"""
+Concurrent queries through the workflow graph, each planned as organization data -> summary, with a
+thread per query calling invoke against one event loop calling ainvoke. Reports queries per second
+and the peak number of threads.
+
+Runs against local stand-ins: the API is served by uvicorn in a separate process on a temporary
+SQLite database, the LLM answers after `--llm-latency` seconds and the plan classifier knows the query.
+
+    PYTHONPATH=src python benchmark/async_load_benchmark.py --queries 200 --concurrency 10 50 200
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DATABASE = os.path.join(tempfile.mkdtemp(), "navexa.db")
+os.environ["NAVEXA_DATABASE_URI"] = f"sqlite:///{DATABASE}"
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+import workflow
+from api import app
+from models import db, Organization, Fleet, Vessel, Equipment
+from tools import api
+from utils.clients import registry
+from utils.embeddings import FakeEmbeddings
+from utils.plan_cache import PlanClassifier
+
+QUERY = "List the equipment of Maritime Shipping Co."
+
+
+class StandInChatModel(BaseChatModel):
+    """Answers every prompt, and every structured output request with the first organization, after `latency`."""
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "stand-in"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="answer"))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="answer"))])
+
+    def with_structured_output(self, schema, **kwargs):
+        async def answer(prompt):
+            await asyncio.sleep(self.latency)
+            return schema(name="Maritime Shipping Co.", id=1)
+        return RunnableLambda(lambda prompt: time.sleep(self.latency) or schema(name="Maritime Shipping Co.", id=1),
+                              answer)
+
+
+class ThreadSampler(threading.Thread):
+    def __init__(self):
+        super().__init__(daemon=True)
+        self.peak = threading.active_count()
+        self.running = True
+
+    def run(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.005)
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        organization = Organization(name="Maritime Shipping Co.", type="Shipping")
+        vessel = Vessel(name="Vessel 1", fleet=Fleet(name="Fleet 1", organization=organization))
+        for model in ["C32", "C18", "RT-flex82C"]:
+            Equipment(type="Main Engine", model=model, vessel=vessel)
+        db.session.add(organization)
+        db.session.commit()
+
+
+def serve() -> tuple[subprocess.Popen, str]:
+    """The ASGI API in its own process, so that it does not share the interpreter lock with the queries."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    src = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "asgi:asgi_app", "--app-dir", src, "--port", str(port),
+                               "--log-level", "warning", "--lifespan", "off"])
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port)).close()
+            return server, f"http://127.0.0.1:{port}/"
+        except ConnectionRefusedError:
+            time.sleep(0.05)
+
+
+def measure(label: str, queries: int, run):
+    sampler = ThreadSampler()
+    sampler.start()
+    began = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - began
+    sampler.running = False
+    print(f"{label}: {queries / seconds:.1f} queries/s, peak {sampler.peak} threads")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="seconds per LLM call")
+    args = parser.parse_args()
+
+    seed()
+    server, api.API_HOST = serve()
+    api.IN_PROCESS_DATA = False  # measure the HTTP path
+    llm = StandInChatModel(latency=args.llm_latency)
+    registry.register("llm", lambda: llm)
+    registry.register("plan_classifier", lambda: PlanClassifier(FakeEmbeddings(), seeds={
+        QUERY: ("extract_organization_level_data", "summarize")}))
+    graph = workflow.build_graph()
+    graph.invoke({"query": QUERY})  # warm up the clients, the classifier and the connections
+
+    for concurrency in args.concurrency:
+        def threaded():
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(lambda _: graph.invoke({"query": QUERY}), range(args.queries)))
+
+        async def gathered():
+            semaphore = asyncio.Semaphore(concurrency)
+
+            async def one():
+                async with semaphore:
+                    await graph.ainvoke({"query": QUERY})
+            await asyncio.gather(*[one() for _ in range(args.queries)])
+
+        measure(f"{concurrency:>4} concurrent, thread per query", args.queries, threaded)
+        measure(f"{concurrency:>4} concurrent, asyncio", args.queries, lambda: asyncio.run(gathered()))
+    server.terminate()
+
+
+if __name__ == '__main__':
+    main()
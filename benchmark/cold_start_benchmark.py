@@ -0,0 +1,91 @@
+"""
+Cold start of the agent modules: wall time to import them and the LLM/embedding clients and
+Postgres connections created while doing so, then after the first use of every shared client.
+
+Runs offline: psycopg2.connect is replaced by a counting stub, so any connection made on import
+is counted, and the Google clients are only constructed, never called.
+
+    PYTHONPATH=src python benchmark/cold_start_benchmark.py
+"""
+import argparse
+import importlib
+import os
+import sys
+import time
+from collections import Counter
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+created = Counter()
+
+
+class StubCursor:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, *args):
+        pass
+
+    def fetchall(self):
+        return []
+
+
+class StubConnection(StubCursor):
+    def cursor(self):
+        return StubCursor()
+
+    def close(self):
+        pass
+
+
+def instrument():
+    import psycopg2
+    import langchain_google_genai
+
+    def connect(*args, **kwargs):
+        created["postgres connections"] += 1
+        return StubConnection()
+    psycopg2.connect = connect
+
+    for name, label in [("ChatGoogleGenerativeAI", "LLM clients"), ("GoogleGenerativeAIEmbeddings", "embedding clients")]:
+        cls = getattr(langchain_google_genai, name)
+        original = cls.__init__
+
+        def counting_init(self, *args, original=original, label=label, **kwargs):
+            created[label] += 1
+            original(self, *args, **kwargs)
+        cls.__init__ = counting_init
+
+
+def report(title: str, seconds: float):
+    print(f"{title}: {seconds * 1000:.0f} ms, " + ", ".join(
+        f"{created[label]} {label}" for label in ["LLM clients", "embedding clients", "postgres connections"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modules', nargs='+', default=['tools', 'tools.executor', 'tools.query_rewrite', 'workflow'])
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    instrument()
+    baseline = time.perf_counter() - began
+    began = time.perf_counter()
+    for module in args.modules:
+        importlib.import_module(module)
+    report(f"import {' '.join(args.modules)}", time.perf_counter() - began)
+
+    clients = sys.modules.get("utils.clients")
+    if clients is not None:
+        began = time.perf_counter()
+        for _ in range(2):
+            clients.get_llm(), clients.get_embeddings()
+        report("after first use of every client", time.perf_counter() - began)
+    print(f"(not included: {baseline * 1000:.0f} ms importing psycopg2 and langchain_google_genai to instrument them)")
+
+
+if __name__ == '__main__':
+    main()
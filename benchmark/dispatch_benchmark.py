@@ -0,0 +1,108 @@
+"""
+LLM calls and time spent choosing and calling the planned tools, per query, with the tool-calling
+agent for every step against direct dispatch of the tool the plan names.
+
+Runs offline: the LLM is a counting stand-in that answers after `--llm-latency` seconds and the tools
+are stubs, so only the calls made to dispatch steps are counted. The calls the real tools make
+themselves (2 for organization data, 1 for a manual lookup, 1 for a summary) are the same either way.
+
+    PYTHONPATH=src python benchmark/dispatch_benchmark.py --llm-latency 0.2
+"""
+import argparse
+import os
+import re
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+
+from common import Step
+from tools import executor
+from utils.clients import registry
+
+PLANS = {
+    "List the equipment of Maritime and two characteristics of each from the manuals":
+        ["extract_organization_level_data", "extract_from_manual", "summarize"],
+    "What is the service interval of the C32?": ["extract_from_manual", "summarize"],
+    "Hello, what can you do?": ["summarize"],
+}
+
+
+class CountingChatModel(BaseChatModel):
+    """Calls the tool named in the step it is given, then answers; counts its calls."""
+    latency: float = 0.0
+    calls: int = 0
+    arguments: dict = {}
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting"
+
+    def bind_tools(self, tools, **kwargs):
+        self.arguments = {t.name: list(t.args) for t in tools}
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        time.sleep(self.latency)
+        if any(isinstance(message, ToolMessage) for message in messages):
+            message = AIMessage(content="done")
+        else:
+            name = re.search(r"tool='(\w+)'", messages[-1].content).group(1)
+            message = AIMessage(content="", tool_calls=[
+                {"name": name, "args": {arg: "" for arg in self.arguments[name]}, "id": f"call-{self.calls}"}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def extract_organization_level_data(query: str):
+    """Organization data."""
+    return "organization"
+
+@tool
+def extract_from_manual(query: str):
+    """Manual lookup."""
+    return "manual"
+
+@tool
+def summarize(context: str, query: str):
+    """Summary."""
+    return "summary"
+
+
+def run(llm: CountingChatModel, direct: bool) -> tuple[float, float]:
+    """Mean LLM calls and seconds per query."""
+    executor.DIRECT_DISPATCH = direct
+    llm.calls = 0
+    began = time.perf_counter()
+    for query, plan in PLANS.items():
+        steps = [Step(order=order, tool=name, reason_it_was_chosen=name) for order, name in enumerate(plan, 1)]
+        output = ""
+        for current_step in range(len(steps)):
+            output = executor.execute_tool({"query": query, "steps": steps, "current_step": current_step,
+                                            "output": output})["output"]
+    return llm.calls / len(PLANS), (time.perf_counter() - began) / len(PLANS)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--llm-latency', type=float, default=0.0, help="seconds per LLM call")
+    args = parser.parse_args()
+
+    llm = CountingChatModel(latency=args.llm_latency)
+    stubs = [extract_organization_level_data, extract_from_manual, summarize]
+    executor.tools = stubs
+    executor.tools_by_name = {stub.name: stub for stub in stubs}
+    registry.register("llm", lambda: llm)
+    registry.reset("tool_agent")
+    for label, direct in [("agent per step", False), ("direct dispatch", True)]:
+        calls, seconds = run(llm, direct)
+        print(f"{label}: {calls:.2f} LLM calls, {seconds * 1000:.0f} ms per query")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Import time of the agent modules, from `python -X importtime`: the median cumulative time of each
+module over several fresh interpreters and the slowest modules it pulls in.
+
+    PYTHONPATH=src python benchmark/import_time_benchmark.py workflow tools --runs 5 --top 15
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def import_times(module: str) -> dict[str, int]:
+    """Cumulative import time in microseconds of every module imported by `import module`."""
+    environment = {**os.environ, "PYTHONPATH": SRC, "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "benchmark")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], env=environment,
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line.split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('modules', nargs='*', default=['workflow'])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest imported modules to list')
+    args = parser.parse_args()
+
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.runs)]
+        print(f"import {module}: {statistics.median(r[module] for r in runs) / 1000:.0f} ms "
+              f"(median of {args.runs}, {len(runs[0])} modules)")
+        last = runs[-1]
+        for name, micros in sorted(last.items(), key=lambda item: item[1], reverse=True)[1:args.top + 1]:
+            print(f"  {micros / 1000:8.0f} ms  {name}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+"""
+Latency percentiles and throughput of the workflow, the manual lookup, PDF ingestion and the Flask
+endpoints at several concurrency levels, compared against stored baselines. A p95 latency or a
+throughput worse than its baseline by more than `--tolerance` fails the run with exit status 1.
+
+Runs offline and deterministically: FakeLLMConfiguration answers through a fake chat model after
+`--llm-latency` seconds per call and `--token-latency` per generated word, and embeds with hashed
+bags of words after `--embedding-latency` seconds per batch; the manuals of docs/manuals/equipment
+are ingested into in-memory FAISS indexes and the organization data is a temporary SQLite database.
+Every concurrent ingestion fills indexes of its own, `--ingest-requests` of them per concurrency level.
+Baselines are only compared for the simulated latencies they were recorded with.
+
+    PYTHONPATH=src python benchmark/offline_benchmark.py --concurrency 1 4 16
+    PYTHONPATH=src python benchmark/offline_benchmark.py --update-baselines
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+FOLDER = tempfile.mkdtemp()
+os.environ["NAVEXA_DATABASE_URI"] = f"sqlite:///{os.path.join(FOLDER, 'navexa.db')}"
+os.environ["NAVEXA_RESPONSE_CACHE_THRESHOLD"] = "2"  # every query runs the graph
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+import workflow
+from api import app
+from injest import PDFIngestion
+from models import db, Organization, Fleet, Vessel, Equipment, Sensor, SensorReading
+from tools import extract_from_manual
+from utils.clients import registry
+from utils.embeddings import BatchedEmbeddings, EmbeddingCache
+from utils.llm_configuration import FakeLLMConfiguration
+from utils.vector_db_configuration import FAISSVectorStoreConfiguration
+
+MANUALS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "docs", "manuals", "equipment")
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+# Latency differences below this are noise, whatever the tolerance
+MIN_DELTA_MS = 25
+WORKFLOW_QUERIES = [
+    "Give me all the list of equipments and it's 2 unique characteristics for Maritime",
+    "What is the weight of CAT-032?",
+    "What is the service interval of the Wartsila RT-flex82C?",
+    "List the vessels of the fleets of Maritime Shipping Co.",
+    "Tell me a story of a camel and it's owner.",
+]
+MANUAL_QUERIES = ["lubricating oil pressure of the Caterpillar C32", "Wartsila RT-flex82C cylinder lubrication",
+                  "C32 fuel injector service interval", "RT-flex82C turbocharger maintenance"]
+ENDPOINTS = ["/api/organizations", "/api/organization/1", "/api/operational_data/1?limit=100"]
+
+
+class OfflineVectorStoreConfiguration(FAISSVectorStoreConfiguration):
+    """In-memory FAISS indexes embedding through the fake LLM configuration, without a disk cache or a rate limit."""
+    def __init__(self, llm_configuration: FakeLLMConfiguration):
+        super().__init__(folder_path=None)
+        self.llm_configuration = llm_configuration
+        self.embeddings = BatchedEmbeddings(llm_configuration.get_embeddings(), EmbeddingCache(":memory:"),
+                                            requests_per_minute=0)
+
+    def get_vector_store_embedding_model(self):
+        return self.embeddings
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        organization = Organization(name="Maritime Shipping Co.", type="Shipping")
+        fleet = Fleet(name="Cargo Fleet Alpha", type="Container", organization=organization)
+        engines = []
+        for v in range(3):
+            vessel = Vessel(name=f"MS Vessel {v}", fleet=fleet)
+            engines.append(Equipment(type="Main Engine", manufacturer="Caterpillar", model="C32", vessel=vessel))
+            Equipment(type="Main Engine", manufacturer="Wartsila", model="RT-flex82C", vessel=vessel)
+        db.session.add(organization)
+        db.session.flush()
+        for e, engine in enumerate(engines):
+            sensor = Sensor(type="Temperature", measurement_unit="C", equipment_id=engine.equipment_id)
+            for minute in range(200):
+                # Explicit ids, SQLite only generates them for INTEGER primary keys
+                SensorReading(reading_id=e * 200 + minute + 1, sensor=sensor,
+                              timestamp=datetime(2025, 1, 1) + timedelta(minutes=minute), value=80 + minute % 7)
+            db.session.add(sensor)
+        db.session.commit()
+
+
+def ingest(folder: str, vector_store_config) -> dict:
+    """Ingests the manuals into the vector store, from scratch: the manifest is written aside."""
+    return PDFIngestion(MANUALS, manifest_path=os.path.join(folder, "manifest.json"), max_workers=1) \
+        .ingest_pdfs_to_index(vector_store_config)
+
+
+def percentile(latencies: list[float], q: float) -> float:
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+def run(call, requests: int, concurrency: int) -> dict:
+    """Latency percentiles in milliseconds and requests per second of `requests` calls, `concurrency` at a time."""
+    def timed(i):
+        began = time.perf_counter()
+        call(i)
+        return time.perf_counter() - began
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(requests)))
+    seconds = time.perf_counter() - began
+    return {"p50_ms": percentile(latencies, 0.50) * 1000, "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000, "throughput": requests / seconds}
+
+
+def best_of(call, requests: int, concurrency: int, repeats: int) -> dict:
+    """The best of every figure over `repeats` runs, which a busy machine only ever makes worse."""
+    runs = [run(call, requests, concurrency) for _ in range(repeats)]
+    best = {name: min(r[name] for r in runs) for name in ("p50_ms", "p95_ms", "p99_ms")}
+    best["throughput"] = max(r["throughput"] for r in runs)
+    return {name: round(value, 1) for name, value in best.items()}
+
+
+def regressions(results: dict, baselines: dict, tolerance: float) -> list[str]:
+    found = []
+    for scenario, levels in results.items():
+        for concurrency, result in levels.items():
+            baseline = baselines.get(scenario, {}).get(concurrency)
+            if baseline is None:
+                continue
+            if result["p95_ms"] > baseline["p95_ms"] * (1 + tolerance) and result["p95_ms"] - baseline["p95_ms"] > MIN_DELTA_MS:
+                found.append(f"{scenario} x{concurrency}: p95 {result['p95_ms']:.0f} ms, baseline {baseline['p95_ms']:.0f} ms")
+            if result["throughput"] < baseline["throughput"] * (1 - tolerance):
+                found.append(f"{scenario} x{concurrency}: {result['throughput']:.1f}/s, baseline {baseline['throughput']:.1f}/s")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', nargs='+', default=["workflow", "manual", "ingest", "api"],
+                        choices=["workflow", "manual", "ingest", "api"])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=40, help="requests per scenario and concurrency level")
+    parser.add_argument('--repeats', type=int, default=3, help="runs per concurrency level, the best one counts")
+    parser.add_argument('--ingest-requests', type=int, default=4,
+                        help="ingestions of the manuals per concurrency level, at least the concurrency")
+    parser.add_argument('--llm-latency', type=float, default=0.05, help="seconds per LLM call")
+    parser.add_argument('--token-latency', type=float, default=0.0, help="seconds per generated word")
+    parser.add_argument('--embedding-latency', type=float, default=0.01, help="seconds per embedding batch")
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed relative regression")
+    parser.add_argument('--baselines', default=BASELINES)
+    parser.add_argument('--update-baselines', action='store_true', help="store the results as the new baselines")
+    args = parser.parse_args()
+
+    settings = {"llm_latency": args.llm_latency, "token_latency": args.token_latency,
+                "embedding_latency": args.embedding_latency}
+    llm_configuration = FakeLLMConfiguration(args.llm_latency, args.token_latency, args.embedding_latency)
+    registry.register("llm_configuration", lambda: llm_configuration)
+    registry.register("vector_store_config", lambda: OfflineVectorStoreConfiguration(llm_configuration))
+    results = {}
+    seed()
+    ingest(tempfile.mkdtemp(dir=FOLDER), registry.get("vector_store_config"))
+    scenarios = {
+        "workflow": lambda i: workflow.Workflow().invoke(f"{WORKFLOW_QUERIES[i % len(WORKFLOW_QUERIES)]} #{i}"),
+        "manual": lambda i: extract_from_manual.invoke({"query": MANUAL_QUERIES[i % len(MANUAL_QUERIES)]}),
+        "api": lambda i: app.test_client().get(ENDPOINTS[i % len(ENDPOINTS)]).close(),
+        # Every ingestion fills vector stores of its own
+        "ingest": lambda i: ingest(tempfile.mkdtemp(dir=FOLDER), OfflineVectorStoreConfiguration(llm_configuration)),
+    }
+    for scenario in args.scenarios:
+        scenarios[scenario](0)  # warms up imports, connections and caches
+        requests = (lambda c: max(args.ingest_requests, c)) if scenario == "ingest" else (lambda c: args.requests)
+        results[scenario] = {str(c): best_of(scenarios[scenario], requests(c), c, args.repeats)
+                             for c in args.concurrency}
+    for scenario, levels in results.items():
+        for concurrency, result in levels.items():
+            print(f"{scenario:>8} x{concurrency:<3} p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  "
+                  f"p99 {result['p99_ms']:7.1f} ms  {result['throughput']:7.1f}/s")
+    shutil.rmtree(FOLDER, ignore_errors=True)
+
+    stored = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            stored = json.load(f)
+    if args.update_baselines:
+        if stored.get("settings") != settings:
+            stored = {"settings": settings}
+        for scenario, levels in results.items():
+            stored.setdefault("results", {}).setdefault(scenario, {}).update(levels)
+        with open(args.baselines, "w") as f:
+            json.dump(stored, f, indent=2)
+        print(f"baselines stored in {args.baselines}")
+        return
+    if stored.get("settings") != settings:
+        print("no baselines for these latencies, nothing compared")
+        return
+    found = regressions(results, stored["results"], args.tolerance)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    if found:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
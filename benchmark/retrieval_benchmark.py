@@ -0,0 +1,100 @@
+"""
+Recall@k and latency of manual retrieval: vector search alone, BM25 alone, both fused with
+reciprocal rank fusion, and fused plus reranking (what the manual tools use unless NAVEXA_RERANK=0), over a
+fixed question set on the bundled manuals.
+
+A question is answered when a retrieved chunk contains its expected passage. Runs offline with the
+hashed bag-of-words FakeEmbeddings; --embeddings google uses the configured Gemini model instead:
+
+    PYTHONPATH=src python benchmark/retrieval_benchmark.py --embeddings google --k 1 3 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from injest import PDFIngestion
+from utils.llm_configuration import DefaultLLMConfiguration, FakeLLMConfiguration
+from utils.retrieval import HybridRetriever, rerank_by_coverage
+from utils.vector_db_configuration import FAISSVectorStoreConfiguration
+
+MANUALS = os.path.join(os.path.dirname(__file__), "..", "docs", "manuals", "equipment")
+
+# (index, question keywords, passage the answer is in)
+QUESTIONS = [
+    ("caterpillar-c32", "C32 bore stroke", "145 mm (5.71 in)"),
+    ("caterpillar-c32", "displacement liters", "32.1 L (1958.9"),
+    ("caterpillar-c32", "net dry weight", "3004 kg (6625 lb)"),
+    ("caterpillar-c32", "oil change interval hours", "oil change intervals of up to 500-hours"),
+    ("caterpillar-c32", "secondary fuel filter micron", "Fuel filter, secondary (2 micron)"),
+    ("caterpillar-c32", "torque N*m at 1200 rpm", "5499"),
+    ("caterpillar-c32", "DITA compression ratio 16.0", "16.0 : 1"),
+    ("caterpillar-c32", "cooling system capacity", "67.9 L (71.7 qt)"),
+    ("caterpillar-c32", "flywheel housing SAE No. 0", "SAE No. 0 or SAE No. 1 flywheel housing"),
+    ("caterpillar-c32", "IND-C intermittent rating full load", "exceed 50%"),
+    ("wartsila-rt-flex82c", "cylinder bore piston stroke main data", "Cylinder bore 820 mm"),
+    ("wartsila-rt-flex82c", "fuel oil injection pressure bar", "at pressures up to 1000 bar"),
+    ("wartsila-rt-flex82c", "servo oil pressure fine filter", "at pressures up to 200 bar"),
+    ("wartsila-rt-flex82c", "very slow running nominal speed smoking", "12% nominal speed"),
+    ("wartsila-rt-flex82c", "Pulse Lubrication System feed rate", "enables much lower lubricating oil feed rates"),
+    ("wartsila-rt-flex82c", "BSFC g/kWh load 100%", "Load 100% 169"),
+    ("wartsila-rt-flex82c", "cylinder cover elastic studs", "by eight elastic studs"),
+    ("wartsila-rt-flex82c", "piston rings chromium-ceramic coating", "chromium-ceramic coating"),
+    ("wartsila-rt-flex82c", "auxiliary blowers starting slow running", "electrically-driven auxiliary blowers"),
+    ("wartsila-rt-flex82c", "holding-down bolts thrust sleeves", "thrust sleeves on a number"),
+]
+
+
+def build_retrievers(config: FAISSVectorStoreConfiguration) -> dict[str, dict[str, object]]:
+    retrievers = {}
+    for index_name in config.get_indexes():
+        store = config.get_vector_store_handle(index_name)
+        documents = config.get_documents(index_name)
+        hybrid = HybridRetriever(store, documents)
+        retrievers[index_name] = {
+            "vector": lambda query, k, store=store: store.similarity_search(query, k=k),
+            "bm25": lambda query, k, bm25=hybrid.bm25: [bm25.documents[i] for i, _ in bm25.search(query, k)],
+            "hybrid": hybrid.search,
+            "hybrid+rerank": HybridRetriever(store, documents, reranker=rerank_by_coverage).search,
+        }
+    return retrievers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--embeddings', choices=['fake', 'google'], default='fake')
+    parser.add_argument('--k', type=int, nargs='+', default=[1, 3, 5])
+    parser.add_argument('--repeat', type=int, default=20, help='timed passes over the question set')
+    args = parser.parse_args()
+
+    config = FAISSVectorStoreConfiguration()
+    config.llm_configuration = FakeLLMConfiguration() if args.embeddings == 'fake' else DefaultLLMConfiguration()
+    with tempfile.TemporaryDirectory() as folder:
+        PDFIngestion(MANUALS, manifest_path=os.path.join(folder, "manifest.json")).ingest_pdfs_to_index(config)
+    retrievers = build_retrievers(config)
+
+    for index_name, _, passage in QUESTIONS:
+        if not any(passage in d.page_content for d in config.get_documents(index_name)):
+            raise SystemExit(f"No chunk of {index_name} contains {passage!r}")
+
+    depth = max(args.k)
+    print(f"{len(QUESTIONS)} questions, {args.embeddings} embeddings\n")
+    print(f"{'retriever':<15}" + "".join(f"{f'recall@{k}':>11}" for k in args.k) + f"{'ms/query':>11}")
+    for mode in ["vector", "bm25", "hybrid", "hybrid+rerank"]:
+        ranks = []
+        for index_name, question, passage in QUESTIONS:
+            found = retrievers[index_name][mode](question, depth)
+            ranks.append(next((i for i, d in enumerate(found) if passage in d.page_content), None))
+        began = time.perf_counter()
+        for _ in range(args.repeat):
+            for index_name, question, _ in QUESTIONS:
+                retrievers[index_name][mode](question, depth)
+        latency = (time.perf_counter() - began) * 1000 / (args.repeat * len(QUESTIONS))
+        recalls = [sum(r is not None and r < k for r in ranks) / len(QUESTIONS) for k in args.k]
+        print(f"{mode:<15}" + "".join(f"{r:>11.2f}" for r in recalls) + f"{latency:>11.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Time to first token of an answer, through the server-sent events endpoint against waiting for
+Workflow.invoke, for a query planned as organization data -> summary. Reports, in milliseconds, when
+the first event, the first token of the answer and the whole answer arrive.
+
+Runs offline: the LLM is a stand-in that starts answering after `--llm-latency` seconds and then
+streams `--tokens` tokens, one every `--token-latency` seconds; the organization is read from a
+temporary SQLite database and the plan classifier knows the query.
+
+    PYTHONPATH=src python benchmark/ttft_benchmark.py --queries 5 --llm-latency 0.5 --tokens 100
+"""
+import argparse
+import os
+import tempfile
+import time
+
+DATABASE = os.path.join(tempfile.mkdtemp(), "navexa.db")
+os.environ["NAVEXA_DATABASE_URI"] = f"sqlite:///{DATABASE}"
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+import workflow
+from api import app
+from models import db, Organization, Fleet, Vessel, Equipment
+from utils.clients import registry
+from utils.embeddings import FakeEmbeddings
+from utils.plan_cache import PlanClassifier
+from utils.response_cache import SemanticCache
+
+QUERY = "List the equipment of Maritime Shipping Co."
+
+
+class StreamingChatModel(BaseChatModel):
+    """Answers `tokens` tokens after `latency`, one every `token_latency`, streamed when asked to."""
+    latency: float = 0.0
+    tokens: int = 100
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming stand-in"
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for i in range(self.tokens):
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=f"token{i} "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        text = "".join(chunk.text for chunk in self._stream(messages))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=text))])
+
+
+def seed():
+    with app.app_context():
+        db.create_all()
+        organization = Organization(name="Maritime Shipping Co.", type="Shipping")
+        vessel = Vessel(name="Vessel 1", fleet=Fleet(name="Fleet 1", organization=organization))
+        for model in ["C32", "C18", "RT-flex82C"]:
+            Equipment(type="Main Engine", model=model, vessel=vessel)
+        db.session.add(organization)
+        db.session.commit()
+
+
+def blocking() -> dict:
+    began = time.perf_counter()
+    workflow.Workflow().invoke(QUERY)
+    seconds = time.perf_counter() - began
+    return {"first event": seconds, "first token": seconds, "answer": seconds}
+
+
+def streamed(client) -> dict:
+    began = time.perf_counter()
+    arrivals = {}
+    response = client.get("/api/query/stream", query_string={"query": QUERY}, buffered=False)
+    for chunk in response.response:
+        now = time.perf_counter() - began
+        arrivals.setdefault("first event", now)
+        if b"event: token" in chunk:
+            arrivals.setdefault("first token", now)
+        if b"event: answer" in chunk:
+            arrivals["answer"] = now
+    response.close()
+    return arrivals
+
+
+def report(label: str, runs: list[dict]):
+    means = {name: sum(run[name] for run in runs) / len(runs) * 1000 for name in runs[0]}
+    print(f"{label}: " + ", ".join(f"{name} {ms:.0f} ms" for name, ms in means.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--queries', type=int, default=5)
+    parser.add_argument('--llm-latency', type=float, default=0.5, help="seconds before an LLM call's first token")
+    parser.add_argument('--tokens', type=int, default=100, help="tokens per LLM answer")
+    parser.add_argument('--token-latency', type=float, default=0.02, help="seconds per token")
+    args = parser.parse_args()
+
+    seed()
+    llm = StreamingChatModel(latency=args.llm_latency, tokens=args.tokens, token_latency=args.token_latency)
+    registry.register("llm", lambda: llm)
+    registry.register("plan_classifier", lambda: PlanClassifier(FakeEmbeddings(), seeds={
+        QUERY: ("extract_organization_level_data", "summarize")}))
+    registry.register("response_cache", lambda: SemanticCache(FakeEmbeddings(), threshold=2.0))  # never hits
+    client = app.test_client()
+    workflow.Workflow().invoke(QUERY)  # warm up the graph, the classifier and the database
+
+    report("invoke", [blocking() for _ in range(args.queries)])
+    report("stream", [streamed(client) for _ in range(args.queries)])
+
+
+if __name__ == '__main__':
+    main()
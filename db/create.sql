@@ -113,16 +113,148 @@ CREATE TABLE operational_state (
 );
 
 -- Sensor Reading
+-- Range partitioned by day on timestamp; the partition key has to be part of the primary key.
+-- Rows outside of any daily partition land in sensor_reading_default.
 CREATE TABLE sensor_reading (
-    reading_id SERIAL PRIMARY KEY,
+    reading_id BIGSERIAL,
     sensor_id INT NOT NULL,
     timestamp TIMESTAMP NOT NULL,
     value DECIMAL(15,6),
     quality_indicator VARCHAR(50),
     collection_method VARCHAR(50),
+    PRIMARY KEY (reading_id, timestamp),
+    FOREIGN KEY (sensor_id) REFERENCES sensor(sensor_id)
+) PARTITION BY RANGE (timestamp);
+
+CREATE TABLE sensor_reading_default PARTITION OF sensor_reading DEFAULT;
+
+-- Creates the missing daily partitions covering [from_date, to_date]. Rows of such a day that
+-- landed in sensor_reading_default are moved into its new partition, which is only attached once
+-- they are in (a default partition holding rows of a new partition's range fails the creation).
+CREATE OR REPLACE FUNCTION create_sensor_reading_partitions(from_date DATE, to_date DATE)
+RETURNS INT AS $$
+DECLARE
+    day DATE := from_date;
+    created INT := 0;
+    partition_name TEXT;
+BEGIN
+    WHILE day <= to_date LOOP
+        partition_name := 'sensor_reading_p' || to_char(day, 'YYYYMMDD');
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (SELECT 1 FROM sensor_reading_default WHERE timestamp >= day AND timestamp < day + 1) THEN
+                LOCK TABLE sensor_reading_default IN EXCLUSIVE MODE;  -- no new rows of the day until it is attached
+                EXECUTE format('CREATE TABLE %I (LIKE sensor_reading INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+                EXECUTE format(
+                    'WITH moved AS (DELETE FROM sensor_reading_default WHERE timestamp >= %L AND timestamp < %L RETURNING *) '
+                    'INSERT INTO %I SELECT * FROM moved',
+                    day, day + 1, partition_name
+                );
+                EXECUTE format(
+                    'ALTER TABLE sensor_reading ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, day, day + 1
+                );
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF sensor_reading FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, day, day + 1
+                );
+            END IF;
+            created := created + 1;
+        END IF;
+        day := day + 1;
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drops the daily partitions whose whole range is older than the retention period, and deletes
+-- the rows of sensor_reading_default that are as old
+CREATE OR REPLACE FUNCTION drop_expired_sensor_reading_partitions(retention INTERVAL)
+RETURNS INT AS $$
+DECLARE
+    part RECORD;
+    dropped INT := 0;
+BEGIN
+    DELETE FROM sensor_reading_default WHERE timestamp < (now() - retention)::DATE;
+    FOR part IN
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = 'sensor_reading'
+          AND c.relname ~ '^sensor_reading_p[0-9]{8}$'
+    LOOP
+        IF to_date(substring(part.relname FROM 17), 'YYYYMMDD') + 1 <= (now() - retention)::DATE THEN
+            EXECUTE format('DROP TABLE %I', part.relname);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Meant to run daily (cron, pg_cron or `flask --app api maintain-partitions`)
+CREATE OR REPLACE FUNCTION maintain_sensor_reading_partitions(days_ahead INT DEFAULT 7, retention INTERVAL DEFAULT '90 days')
+RETURNS VOID AS $$
+BEGIN
+    PERFORM create_sensor_reading_partitions(current_date, current_date + days_ahead);
+    PERFORM drop_expired_sensor_reading_partitions(retention);
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT create_sensor_reading_partitions(current_date - 1, current_date + 7);
+
+-- Sensor Reading Rollups
+-- Per sensor aggregates over 1 minute, 1 hour and 1 day buckets, kept up to date by
+-- sensor_reading_rollup_trigger. mean and m2 (sum of squared deviations) are merged with
+-- Chan's parallel variance formula so every insert statement only aggregates its own rows.
+CREATE TABLE sensor_reading_1m (
+    sensor_id INT NOT NULL,
+    bucket TIMESTAMP NOT NULL,
+    reading_count BIGINT NOT NULL,
+    mean DOUBLE PRECISION NOT NULL,
+    m2 DOUBLE PRECISION NOT NULL,
+    min_value DOUBLE PRECISION NOT NULL,
+    max_value DOUBLE PRECISION NOT NULL,
+    PRIMARY KEY (sensor_id, bucket),
     FOREIGN KEY (sensor_id) REFERENCES sensor(sensor_id)
 );
 
+CREATE TABLE sensor_reading_1h (LIKE sensor_reading_1m INCLUDING ALL);
+ALTER TABLE sensor_reading_1h ADD FOREIGN KEY (sensor_id) REFERENCES sensor(sensor_id);
+
+CREATE TABLE sensor_reading_1d (LIKE sensor_reading_1m INCLUDING ALL);
+ALTER TABLE sensor_reading_1d ADD FOREIGN KEY (sensor_id) REFERENCES sensor(sensor_id);
+
+CREATE OR REPLACE FUNCTION rollup_sensor_readings() RETURNS TRIGGER AS $$
+DECLARE
+    rollup RECORD;
+BEGIN
+    FOR rollup IN SELECT * FROM (VALUES ('sensor_reading_1m', 'minute'), ('sensor_reading_1h', 'hour'), ('sensor_reading_1d', 'day')) AS r(table_name, unit)
+    LOOP
+        EXECUTE format($sql$
+            INSERT INTO %1$I AS t (sensor_id, bucket, reading_count, mean, m2, min_value, max_value)
+            SELECT sensor_id, date_trunc(%2$L, timestamp), count(*), avg(value), coalesce(var_pop(value), 0) * count(*), min(value), max(value)
+            FROM new_readings
+            WHERE value IS NOT NULL
+            GROUP BY 1, 2
+            ON CONFLICT (sensor_id, bucket) DO UPDATE SET
+                reading_count = t.reading_count + EXCLUDED.reading_count,
+                mean = t.mean + (EXCLUDED.mean - t.mean) * EXCLUDED.reading_count / (t.reading_count + EXCLUDED.reading_count),
+                m2 = t.m2 + EXCLUDED.m2 + (EXCLUDED.mean - t.mean) ^ 2 * t.reading_count * EXCLUDED.reading_count / (t.reading_count + EXCLUDED.reading_count),
+                min_value = least(t.min_value, EXCLUDED.min_value),
+                max_value = greatest(t.max_value, EXCLUDED.max_value)
+        $sql$, rollup.table_name, rollup.unit);
+    END LOOP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER sensor_reading_rollup_trigger
+    AFTER INSERT ON sensor_reading
+    REFERENCING NEW TABLE AS new_readings
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_sensor_readings();
+
 -- Failure Event
 CREATE TABLE failure_event (
     event_id SERIAL PRIMARY KEY,
@@ -294,6 +426,15 @@ CREATE TABLE sensor_threshold (
     FOREIGN KEY (sensor_id) REFERENCES sensor(sensor_id)
 );
 
+-- Streaming Detector State
+-- Checkpoint of the per sensor rolling state of the streaming anomaly detector
+CREATE TABLE sensor_detector_state (
+    sensor_id INT PRIMARY KEY,
+    state BYTEA NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT now(),
+    FOREIGN KEY (sensor_id) REFERENCES sensor(sensor_id)
+);
+
 -- Junction tables for many-to-many relationships
 CREATE TABLE maintenance_procedure_spare_part (
     procedure_id INT NOT NULL,
@@ -308,7 +449,8 @@ CREATE TABLE maintenance_procedure_spare_part (
 CREATE INDEX idx_equipment_vessel ON equipment(vessel_id);
 CREATE INDEX idx_component_equipment ON component(equipment_id);
 CREATE INDEX idx_sensor_equipment ON sensor(equipment_id);
-CREATE INDEX idx_sensor_reading_sensor ON sensor_reading(sensor_id);
+CREATE INDEX idx_sensor_reading_sensor_timestamp ON sensor_reading(sensor_id, timestamp);
+CREATE INDEX idx_sensor_reading_timestamp_brin ON sensor_reading USING BRIN (timestamp);
 CREATE INDEX idx_alert_prediction ON alert(prediction_id);
 CREATE INDEX idx_alert_anomaly ON alert(anomaly_id);
 CREATE INDEX idx_maintenance_task_equipment ON maintenance_task(equipment_id);
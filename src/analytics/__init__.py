@@ -0,0 +1,2 @@
+from analytics.batch_detector import BatchAnomalyDetector
+from analytics.streaming_detector import StreamingAnomalyDetector
@@ -0,0 +1,209 @@
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import delete, exists, insert, select
+
+from models import Alert, AnomalyDetection, Sensor, SensorReading, SensorThreshold
+
+THRESHOLD = "Threshold Breach"
+RATE_OF_CHANGE = "Rate of Change"
+OUTLIER = "Statistical Outlier"
+
+SEVERITY = {THRESHOLD: "High", RATE_OF_CHANGE: "Medium", OUTLIER: "Low"}
+# Readings held as Row objects at once while loading an equipment; PostgreSQL streams them from a server-side cursor
+FETCH_ROWS = 50_000
+
+##################################
+# VECTORIZED ANOMALY DETECTION   #
+##################################
+def group_starts(sensor_index: np.ndarray) -> np.ndarray:
+    """For every row of a sensor-sorted array, the index of the first row of its sensor."""
+    is_start = np.r_[True, sensor_index[1:] != sensor_index[:-1]]
+    starts = np.flatnonzero(is_start)
+    return np.repeat(starts, np.diff(np.r_[starts, len(sensor_index)]))
+
+def rolling_zscore(sensor_index: np.ndarray, values: np.ndarray, window: int, min_periods: int) -> np.ndarray:
+    """
+    z-score of every value against the mean/std of up to `window` previous values of the same sensor.
+    NaN where fewer than min_periods previous values exist or they have no spread.
+    """
+    first = group_starts(sensor_index)
+    # Shift every sensor to start at 0 so the running sums don't lose precision on large offsets
+    shifted = values - values[first]
+    sums = np.r_[0.0, np.cumsum(shifted)]
+    squares = np.r_[0.0, np.cumsum(shifted * shifted)]
+    index = np.arange(len(values))
+    lower = np.maximum(index - window, first)
+    count = index - lower
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = sums[index] - sums[lower]
+        mean = total / count
+        variance = (squares[index] - squares[lower] - total * mean) / (count - 1)
+        z = (shifted - mean) / np.sqrt(variance)
+    z[(count < min_periods) | ~(variance > 1e-12)] = np.nan
+    return z
+
+def detect(sensor_index: np.ndarray, timestamps: np.ndarray, values: np.ndarray,
+           lower: np.ndarray, upper: np.ndarray, z_window: int = 60, z_threshold: float = 4.0,
+           rate_fraction: float = 0.5, min_periods: int = 10) -> dict[str, np.ndarray]:
+    """
+    Flags anomalous readings of many sensors at once.
+
+    sensor_index, timestamps (seconds) and values are parallel arrays sorted by (sensor, timestamp);
+    lower/upper hold the threshold of every sensor (NaN if unknown) and are indexed by sensor_index.
+    A reading is flagged when it is outside its threshold, when it changes faster than rate_fraction
+    of the threshold band per second, or when its rolling z-score exceeds z_threshold.
+    Returns one boolean mask per anomaly type.
+    """
+    low, high = lower[sensor_index], upper[sensor_index]
+    outside = (values < low) | (values > high)
+
+    jumps = np.zeros(len(values), dtype=bool)
+    same_sensor = sensor_index[1:] == sensor_index[:-1]
+    elapsed = np.diff(timestamps)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.abs(np.diff(values)) / elapsed
+        jumps[1:] = same_sensor & (elapsed > 0) & (rate > rate_fraction * (high - low)[1:])
+
+    z = rolling_zscore(sensor_index, values, z_window, min_periods)
+    with np.errstate(invalid="ignore"):
+        outliers = np.abs(z) > z_threshold
+
+    return {THRESHOLD: outside, RATE_OF_CHANGE: jumps, OUTLIER: outliers}
+
+def load_thresholds(session) -> dict[int, tuple[float, float]]:
+    """(min, max) per sensor, preferring the 'Normal operation' context when there are several."""
+    thresholds = {}
+    rows = session.execute(select(
+        SensorThreshold.sensor_id, SensorThreshold.min_value, SensorThreshold.max_value,
+        SensorThreshold.context_conditions
+    ).order_by(SensorThreshold.threshold_id)).all()
+    for sensor_id, min_value, max_value, context in rows:
+        normal = (context or "").lower().startswith("normal")
+        if sensor_id not in thresholds or normal:
+            thresholds[sensor_id] = (
+                float(min_value) if min_value is not None else np.nan,
+                float(max_value) if max_value is not None else np.nan
+            )
+    return thresholds
+
+def runs(mask: np.ndarray, sensor_index: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """First and last index of every run of consecutive flagged readings of the same sensor."""
+    continues = np.r_[False, mask[:-1] & mask[1:] & (sensor_index[1:] == sensor_index[:-1])]
+    starts = np.flatnonzero(mask & ~continues)
+    ends = np.flatnonzero(mask & ~np.r_[continues[1:], False])
+    return starts, ends
+
+
+def fetch_columns(session, statement) -> list[list]:
+    """
+    The columns of the statement's rows, fetched FETCH_ROWS rows at a time and transposed in C. The
+    statement runs as plain SQL with its parameters put through their bind processors, which skips
+    the result processors: SQLite hands the timestamps over as ISO strings, which numpy parses faster.
+    """
+    connection = session.connection()
+    compiled = statement.compile(dialect=connection.dialect)
+    parameters = {}
+    for name, value in compiled.params.items():
+        process = compiled.binds[name].type.dialect_impl(connection.dialect).bind_processor(connection.dialect)
+        parameters[name] = process(value) if process else value
+    if compiled.positional:
+        parameters = tuple(parameters[name] for name in compiled.positiontup)
+    columns = [[] for _ in statement.selected_columns]
+    result = connection.exec_driver_sql(str(compiled), parameters, execution_options={"yield_per": FETCH_ROWS})
+    for partition in result.partitions():
+        for column, values in zip(columns, zip(*partition)):
+            column.extend(values)
+    return columns
+
+
+class BatchAnomalyDetector:
+    """
+    Evaluates sensor_reading against sensor_threshold for a time window, one equipment at a time,
+    and stores every run of anomalous readings as an anomaly_detection row, replacing the ones an
+    earlier run stored for the same window.
+    """
+    def __init__(self, session, z_window: int = 60, z_threshold: float = 4.0, rate_fraction: float = 0.5,
+                 min_periods: int = 10):
+        self.session = session
+        self.options = dict(z_window=z_window, z_threshold=z_threshold, rate_fraction=rate_fraction,
+                            min_periods=min_periods)
+
+    def load(self, equipment_id: int, start: datetime, end: datetime):
+        sensor_ids, times, values = fetch_columns(self.session, (
+            select(SensorReading.sensor_id, SensorReading.timestamp, SensorReading.value)
+            .join(Sensor)
+            .where(Sensor.equipment_id == equipment_id,
+                   SensorReading.timestamp >= start,
+                   SensorReading.timestamp < end,
+                   SensorReading.value.is_not(None))
+            .order_by(SensorReading.sensor_id, SensorReading.timestamp)
+        ))
+        # SQLite returns the timestamps as ISO strings, which numpy parses as well
+        return (np.array(sensor_ids, dtype=np.int64), np.array(times, dtype="datetime64[us]"),
+                np.array(values, dtype=np.float64))
+
+    def detect_equipment(self, equipment_id: int, sensors: dict[int, str], thresholds: dict, start: datetime,
+                         end: datetime) -> list[dict]:
+        sensor_ids, times, values = self.load(equipment_id, start, end)
+        if not len(values):
+            return []
+        timestamps = times.astype(np.int64) / 1e6
+        unique_ids, sensor_index = np.unique(sensor_ids, return_inverse=True)
+        lower = np.array([thresholds.get(s, (np.nan, np.nan))[0] for s in unique_ids])
+        upper = np.array([thresholds.get(s, (np.nan, np.nan))[1] for s in unique_ids])
+
+        anomalies = []
+        for kind, mask in detect(sensor_index, timestamps, values, lower, upper, **self.options).items():
+            for first, last in zip(*runs(mask, sensor_index)):
+                sensor_id = int(unique_ids[sensor_index[first]])
+                run = values[first:last + 1]
+                anomalies.append({
+                    "equipment_id": equipment_id,
+                    "timestamp": times[first].item(),
+                    "type": f"{sensors[sensor_id]} {kind}"[:50],
+                    "severity": SEVERITY[kind],
+                    "description": (
+                        f"{len(run)} readings from {times[first].item()} to {times[last].item()} "
+                        f"ranging {run.min():g} to {run.max():g}, "
+                        f"threshold [{lower[sensor_index[first]]:g}, {upper[sensor_index[first]]:g}]"
+                    ),
+                    "affected_sensors": f"{sensors[sensor_id]} sensor #{sensor_id}",
+                })
+        return anomalies
+
+    def clear(self, equipment_id: int, sensors: dict[int, str], start: datetime, end: datetime):
+        """
+        Deletes the anomalies of the equipment in [start, end) of the types this detector records,
+        except the ones with an alert, which the streaming detector opens for its own.
+        """
+        self.session.execute(delete(AnomalyDetection).where(
+            AnomalyDetection.equipment_id == equipment_id,
+            AnomalyDetection.timestamp >= start,
+            AnomalyDetection.timestamp < end,
+            AnomalyDetection.type.in_({f"{sensor_type} {kind}"[:50] for sensor_type in sensors.values() for kind in SEVERITY}),
+            ~exists().where(Alert.anomaly_id == AnomalyDetection.anomaly_id)
+        ))
+
+    def run(self, start: datetime, end: datetime, equipment_ids: list[int] = None) -> int:
+        """
+        Detects anomalies in [start, end) and bulk inserts them in place of the ones of an earlier run
+        over the window. Returns the number of rows written.
+        """
+        query = select(Sensor.sensor_id, Sensor.equipment_id, Sensor.type)
+        if equipment_ids:
+            query = query.where(Sensor.equipment_id.in_(equipment_ids))
+        sensors_by_equipment: dict[int, dict[int, str]] = {}
+        for sensor_id, equipment_id, sensor_type in self.session.execute(query):
+            sensors_by_equipment.setdefault(equipment_id, {})[sensor_id] = sensor_type
+
+        thresholds = load_thresholds(self.session)
+        written = 0
+        for equipment_id, sensors in sensors_by_equipment.items():
+            anomalies = self.detect_equipment(equipment_id, sensors, thresholds, start, end)
+            self.clear(equipment_id, sensors, start, end)
+            if anomalies:
+                self.session.execute(insert(AnomalyDetection), anomalies)
+                written += len(anomalies)
+        self.session.commit()
+        return written
@@ -0,0 +1,252 @@
+import math
+import struct
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql, sqlite
+
+from analytics.batch_detector import THRESHOLD, RATE_OF_CHANGE, OUTLIER, SEVERITY, load_thresholds
+from models import Alert, AnomalyDetection, Sensor, SensorDetectorState
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+DRIFT = "Drift"
+KINDS = (THRESHOLD, RATE_OF_CHANGE, OUTLIER, DRIFT)
+STREAMING_SEVERITY = {**SEVERITY, DRIFT: "Medium"}
+# First key of the transaction level advisory locks serializing the batches of one sensor on PostgreSQL
+STATE_LOCK_KEY = 7007
+
+##################################
+# STREAMING ANOMALY DETECTION    #
+##################################
+class SensorState:
+    """
+    Constant size rolling state of one sensor:
+    Welford mean/variance over all readings, an EWMA, and a ring buffer of the last N readings
+    with running sums. Values are stored relative to the first reading (offset) to keep the
+    running sums precise.
+    """
+    __slots__ = ("count", "mean", "m2", "ewma", "offset", "last_value", "last_timestamp", "active",
+                 "ring", "ring_position", "ring_size", "ring_sum", "ring_squares")
+
+    HEADER = struct.Struct("<QdddddqBIIdd")
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma = 0.0
+        self.offset = 0.0
+        self.last_value = 0.0
+        self.last_timestamp = 0  # microseconds since the epoch
+        self.active = 0  # bitmask of the KINDS currently flagged, so a sustained anomaly is reported once
+        self.ring = array("d", bytes(8 * window))
+        self.ring_position = 0
+        self.ring_size = 0
+        self.ring_sum = 0.0
+        self.ring_squares = 0.0
+
+    def to_bytes(self) -> bytes:
+        return self.HEADER.pack(
+            self.count, self.mean, self.m2, self.ewma, self.offset, self.last_value, self.last_timestamp,
+            self.active, self.ring_position, self.ring_size, self.ring_sum, self.ring_squares
+        ) + self.ring.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "SensorState":
+        header, ring = data[:cls.HEADER.size], data[cls.HEADER.size:]
+        state = cls(len(ring) // 8)
+        (state.count, state.mean, state.m2, state.ewma, state.offset, state.last_value, state.last_timestamp,
+         state.active, state.ring_position, state.ring_size, state.ring_sum, state.ring_squares) = cls.HEADER.unpack(header)
+        state.ring = array("d", ring)
+        return state
+
+    def window_zscore(self, shifted: float, min_periods: int) -> float:
+        n = self.ring_size
+        if n < max(min_periods, 2):
+            return math.nan
+        mean = self.ring_sum / n
+        variance = (self.ring_squares - self.ring_sum * mean) / (n - 1)
+        return (shifted - mean) / math.sqrt(variance) if variance > 1e-12 else math.nan
+
+    def push(self, shifted: float):
+        ring = self.ring
+        if self.ring_size == len(ring):
+            old = ring[self.ring_position]
+            self.ring_sum -= old
+            self.ring_squares -= old * old
+        else:
+            self.ring_size += 1
+        ring[self.ring_position] = shifted
+        self.ring_sum += shifted
+        self.ring_squares += shifted * shifted
+        self.ring_position = (self.ring_position + 1) % len(ring)
+        if self.ring_position == 0:
+            # Re-sum once per lap so floating point drift of the running sums can't build up (amortized O(1))
+            self.ring_sum = math.fsum(ring)
+            self.ring_squares = math.fsum(v * v for v in ring)
+
+
+class StreamingAnomalyDetector:
+    """
+    Scores every reading as it arrives, in constant time per reading, against the same rules as
+    the batch detector (threshold, rate of change, rolling z-score) plus EWMA drift away from the
+    long term Welford mean. Only the start of an anomaly is reported; it has to clear before the
+    same kind is reported again for that sensor.
+
+    `states` holds the state of every sensor scored directly through update() or process(); record()
+    keeps no state in the process, it scores against the committed checkpoints instead.
+    """
+    def __init__(self, thresholds: dict[int, tuple[float, float]], sensors: dict[int, tuple[int, str]],
+                 window: int = 60, z_threshold: float = 4.0, rate_fraction: float = 0.5, ewma_alpha: float = 0.05,
+                 drift_sigmas: float = 3.0, min_periods: int = 10):
+        self.thresholds = thresholds
+        self.sensors = sensors  # sensor_id -> (equipment_id, sensor type)
+        self.window = window
+        self.z_threshold = z_threshold
+        self.rate_fraction = rate_fraction
+        self.ewma_alpha = ewma_alpha
+        # std of an EWMA of independent readings is sigma * sqrt(alpha / (2 - alpha))
+        self.drift_limit = drift_sigmas * math.sqrt(ewma_alpha / (2 - ewma_alpha))
+        self.min_periods = min_periods
+        # The EWMA starts at the first reading, give it its effective memory before judging drift
+        self.drift_periods = max(min_periods, math.ceil(2 / ewma_alpha))
+        self.states: dict[int, SensorState] = {}
+
+    def update(self, sensor_id: int, timestamp: datetime, value: float, states: dict = None) -> list[str]:
+        """
+        Folds one reading into the state of its sensor, kept in `states` or else the detector's,
+        and returns the anomaly kinds it starts.
+        """
+        states = self.states if states is None else states
+        state = states.get(sensor_id)
+        if state is None:
+            state = states[sensor_id] = SensorState(self.window)
+        micros = (timestamp - EPOCH) // MICROSECOND  # timestamps are naive UTC, as stored
+        if state.count == 0:
+            state.offset = value
+            state.ewma = value
+        shifted = value - state.offset
+
+        low, high = self.thresholds.get(sensor_id, (math.nan, math.nan))
+        flags = 0
+        if value < low or value > high:
+            flags |= 1 << KINDS.index(THRESHOLD)
+        if state.count and micros > state.last_timestamp:
+            rate = abs(value - state.last_value) / ((micros - state.last_timestamp) / 1e6)
+            if rate > self.rate_fraction * (high - low):
+                flags |= 1 << KINDS.index(RATE_OF_CHANGE)
+        z = state.window_zscore(shifted, self.min_periods)
+        if abs(z) > self.z_threshold:
+            flags |= 1 << KINDS.index(OUTLIER)
+        state.ewma += self.ewma_alpha * (value - state.ewma)
+        if state.count >= self.drift_periods:
+            std = math.sqrt(state.m2 / (state.count - 1))
+            if std > 0 and abs(state.ewma - state.offset - state.mean) > self.drift_limit * std:
+                flags |= 1 << KINDS.index(DRIFT)
+
+        # Welford
+        state.count += 1
+        delta = shifted - state.mean
+        state.mean += delta / state.count
+        state.m2 += delta * (shifted - state.mean)
+        state.push(shifted)
+        state.last_value = value
+        state.last_timestamp = max(micros, state.last_timestamp)
+
+        started = flags & ~state.active
+        state.active = flags
+        return [kind for i, kind in enumerate(KINDS) if started & (1 << i)]
+
+    def process(self, rows, states: dict = None) -> list[dict]:
+        """
+        Scores (sensor_id, timestamp, value, ...) rows and returns anomaly_detection rows for
+        the anomalies they start. Rows of sensors the detector doesn't know are ignored.
+        """
+        anomalies = []
+        for sensor_id, timestamp, value, *_ in rows:
+            if sensor_id not in self.sensors:
+                continue
+            for kind in self.update(sensor_id, timestamp, value, states):
+                equipment_id, sensor_type = self.sensors[sensor_id]
+                low, high = self.thresholds.get(sensor_id, (math.nan, math.nan))
+                anomalies.append({
+                    "equipment_id": equipment_id,
+                    "timestamp": timestamp,
+                    "type": f"{sensor_type} {kind}"[:50],
+                    "severity": STREAMING_SEVERITY[kind],
+                    "description": f"Reading {value:g} at {timestamp}, threshold [{low:g}, {high:g}]",
+                    "affected_sensors": f"{sensor_type} sensor #{sensor_id}",
+                })
+        return anomalies
+
+    ###############
+    # PERSISTENCE #
+    ###############
+    @classmethod
+    def restore(cls, session, **options) -> "StreamingAnomalyDetector":
+        """Builds a detector for every known sensor and its thresholds; the sensor states stay in the database."""
+        sensors = {sensor_id: (equipment_id, sensor_type) for sensor_id, equipment_id, sensor_type
+                   in session.execute(select(Sensor.sensor_id, Sensor.equipment_id, Sensor.type))}
+        return cls(load_thresholds(session), sensors, **options)
+
+    def load_states(self, session, sensor_ids) -> dict[int, SensorState]:
+        """
+        The checkpointed states of the sensors as the caller's transaction sees them. On PostgreSQL
+        the sensors are first locked until that transaction ends, so the batches of a sensor are
+        scored one after the other whichever process receives them.
+        """
+        sensor_ids = sorted(sensor_ids)
+        if not sensor_ids:
+            return {}
+        if session.get_bind().dialect.name == "postgresql":
+            # Locked in sensor order, so two batches sharing sensors can't deadlock
+            session.execute(text("SELECT pg_advisory_xact_lock(:key, sensor_id) "
+                                 "FROM (SELECT unnest(CAST(:sensor_ids AS int[])) AS sensor_id ORDER BY 1) sensors"),
+                            {"key": STATE_LOCK_KEY, "sensor_ids": sensor_ids})
+        states = {}
+        for sensor_id, state in session.execute(select(SensorDetectorState.sensor_id, SensorDetectorState.state)
+                                                .where(SensorDetectorState.sensor_id.in_(sensor_ids))):
+            restored = SensorState.from_bytes(state)
+            if len(restored.ring) == self.window:
+                states[sensor_id] = restored
+        return states
+
+    def checkpoint(self, session, states: dict[int, SensorState]):
+        """Upserts the states (does not commit)."""
+        rows = [{"sensor_id": sensor_id, "state": state.to_bytes(), "updated_at": datetime.now()}
+                for sensor_id, state in states.items()]
+        if not rows:
+            return
+        dialect = postgresql if session.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(SensorDetectorState)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[SensorDetectorState.sensor_id],
+            set_={"state": statement.excluded.state, "updated_at": statement.excluded.updated_at}
+        ), rows)
+
+    def record(self, session, rows) -> int:
+        """
+        Scores rows against the states checkpointed in the caller's transaction and stores the
+        anomalies they start with one open alert each, plus the new checkpoint, in that transaction.
+        A rollback undoes the scoring with the readings. Returns the number of anomalies.
+        """
+        states = self.load_states(session, {row[0] for row in rows if row[0] in self.sensors})
+        anomalies = self.process(rows, states)
+        if anomalies:
+            anomaly_ids = session.execute(
+                insert(AnomalyDetection).returning(AnomalyDetection.anomaly_id, sort_by_parameter_order=True),
+                anomalies
+            ).scalars().all()
+            session.execute(insert(Alert), [{
+                "anomaly_id": anomaly_id,
+                "type": "Anomaly",
+                "severity": anomaly["severity"],
+                "timestamp": anomaly["timestamp"],
+                "description": f"{anomaly['type']}: {anomaly['description']}",
+                "status": "Open",
+            } for anomaly_id, anomaly in zip(anomaly_ids, anomalies)])
+        self.checkpoint(session, states)
+        return len(anomalies)
@@ -0,0 +1,17 @@
+"""
+The API as an ASGI application, served by an asyncio server with keep-alive connections:
+
+    uvicorn asgi:asgi_app --app-dir src --port 5000
+
+Connections are handled on the event loop; the Flask views and their SQLAlchemy queries run on a
+pool of ASGI_WORKERS threads, sharing the engine's connection pool, instead of a thread per connection.
+"""
+import os
+
+from a2wsgi import WSGIMiddleware
+
+from api import app
+
+ASGI_WORKERS = int(os.getenv('NAVEXA_ASGI_WORKERS', 10))
+
+asgi_app = WSGIMiddleware(app, workers=ASGI_WORKERS)
@@ -1,13 +1,18 @@
 import operator
-from typing import TypedDict, Annotated, List
+from typing import TypedDict, Annotated, Dict, List, Optional
 from pydantic import BaseModel
 
+# Tags the LLM calls whose tokens are the answer itself, streamed to the user when the last step makes them
+ANSWER_TAG = "answer"
+
 class Step(BaseModel):
     """Each Tool invocation Step"""
     order: int
     """order in which this step must be performed"""
     tool: str
     reason_it_was_chosen: str
+    depends_on: Optional[List[int]] = None
+    """orders of the steps whose output this step needs: None for the step before it, empty for none"""
 
 class Output(BaseModel):
         equipment_name: str
@@ -17,8 +22,15 @@ class Steps(BaseModel):
     """Steps"""
     steps: List[Step]
 
+def merge(left: dict, right: dict) -> dict:
+    return {**(left or {}), **(right or {})}
+
 class WorkflowState(TypedDict):
     output: str
     query: str
     current_step: int
     steps: Annotated[List[Step], operator.add]
+    results: Annotated[Dict[int, str], merge]
+    """output of every executed step by its index, written by parallel branches"""
+    prompt_tokens: Annotated[Dict[int, int], merge]
+    """approximate tokens of the prompts every executed step sent to the LLM, by its index"""
@@ -0,0 +1,328 @@
+import csv
+import io
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from sensor_ingest import COPY_SQL
+
+GENERATOR_WORKERS = int(os.getenv('NAVEXA_GENERATOR_WORKERS', os.cpu_count() or 1))
+# Rows per COPY and commit of a worker, which bounds its memory and the rollup trigger's transition table
+READINGS_PER_COPY = 200000
+# Equipment per worker task, small enough to spread the readings evenly over the workers
+EQUIPMENT_PER_TASK = 20
+# Readings of the equipment drift towards the threshold this long before it fails ...
+DEGRADATION = timedelta(hours=48)
+# ... and its sensors are silent this long after, while it is repaired
+REPAIR = timedelta(hours=12)
+OPERATIONAL_STATE_INTERVAL = timedelta(hours=6)
+
+# type, manufacturer, model, specifications, manual_ref
+EQUIPMENT_MODELS = [
+    ("Main Engine", "Wärtsilä", "RT-flex82C", "8-cylinder, 72,000 hp", "manuals/equipment/Wartsila-RT-flex82C.pdf"),
+    ("Main Engine", "MAN BnW", "G95ME-C", "10-cylinder, 85,000 hp", "manuals/equipment/MAN-B&W-G95ME-C.pdf"),
+    ("Generator", "Caterpillar", "C32", "1000 kW, 60 Hz", "manuals/equipment/Caterpillar-C32.pdf"),
+    ("Boiler", "Alfa Laval", "Aalborg OS", "Steam output: 2.5 t/h", None),
+    ("Cargo Pump", "Framo", "SD300", "Capacity: 1000 m³/h", None),
+]
+# name, type, expected lifetime in hours
+COMPONENTS = {
+    "Main Engine": [("Fuel Pump", "Pump", 12000), ("Piston", "Engine Part", 20000),
+                    ("Turbocharger", "Engine Part", 15000), ("Cylinder Liner", "Engine Part", 30000)],
+    "Generator": [("Voltage Regulator", "Electrical", 10000), ("Alternator", "Electrical", 40000),
+                  ("Cooling Fan", "Cooling", 15000)],
+    "Boiler": [("Burner", "Boiler Part", 8000), ("Feed Water Pump", "Pump", 12000), ("Safety Valve", "Valve", 20000)],
+    "Cargo Pump": [("Impeller", "Pump Part", 15000), ("Mechanical Seal", "Seal", 8000),
+                   ("Hydraulic Motor", "Motor", 25000)],
+}
+# type, location, unit, accuracy, samples per hour (sampling_frequency), normal mean and spread, threshold min and max
+SENSORS = {
+    "Main Engine": [("Temperature", "Cylinder Head", "Celsius", "±0.5°C", 60, 82.0, 2.0, 70.0, 95.0),
+                    ("Pressure", "Fuel Line", "Bar", "±0.1 Bar", 60, 35.0, 0.8, 30.0, 40.0),
+                    ("Vibration", "Engine Mount", "mm/s", "±0.05 mm/s", 120, 2.5, 0.4, 0.0, 5.0)],
+    "Generator": [("Voltage", "Output Terminal", "Volt", "±0.5V", 30, 440.0, 1.5, 430.0, 450.0),
+                  ("Temperature", "Stator Winding", "Celsius", "±0.5°C", 60, 75.0, 2.5, 60.0, 95.0)],
+    "Boiler": [("Temperature", "Steam Output", "Celsius", "±1.0°C", 30, 180.0, 3.0, 160.0, 200.0),
+               ("Pressure", "Steam Drum", "Bar", "±0.1 Bar", 60, 7.0, 0.2, 6.0, 8.0)],
+    "Cargo Pump": [("Pressure", "Discharge", "Bar", "±0.1 Bar", 60, 10.0, 0.5, 8.0, 12.0),
+                   ("Vibration", "Bearing", "mm/s", "±0.05 mm/s", 120, 2.0, 0.3, 0.0, 4.5)],
+}
+ORGANIZATION_TYPES = [("Shipping", "Enterprise"), ("Logistics", "Premium"), ("Offshore", "Standard")]
+FLEET_TYPES = [("Container", "Container Ship"), ("Oil Tanker", "Oil Tanker"), ("Bulk Carrier", "Bulk Carrier")]
+PORTS = ["Rotterdam", "Singapore", "Shanghai", "Los Angeles", "Hamburg", "Busan", "Santos", "Jebel Ali"]
+SEVERITIES = ["Minor", "Moderate", "Major", "Critical"]
+OPERATING_MODES = ["Normal", "Normal", "Normal", "Maneuvering", "Idle"]
+
+# Order the tables are loaded in, parents first, with their primary key and generated columns
+TABLES = {
+    "organization": ("organization_id", ("name", "type", "contact_info", "subscription_level")),
+    "fleet": ("fleet_id", ("organization_id", "name", "type", "description")),
+    "vessel": ("vessel_id", ("fleet_id", "name", "type", "build_year", "classification", "dimensions", "gross_tonnage")),
+    "equipment": ("equipment_id", ("vessel_id", "type", "manufacturer", "model", "installation_date", "specifications",
+                                   "manual_ref")),
+    "component": ("component_id", ("equipment_id", "name", "type", "manufacturer", "serial_number", "installation_date",
+                                   "expected_lifetime")),
+    "sensor": ("sensor_id", ("equipment_id", "type", "location", "measurement_unit", "calibration_date",
+                             "accuracy_range", "sampling_frequency")),
+    "sensor_threshold": ("threshold_id", ("sensor_id", "min_value", "max_value", "warning_levels",
+                                          "context_conditions")),
+    "voyage": ("voyage_id", ("vessel_id", "start_date", "end_date", "route", "cargo_type", "operating_conditions",
+                             "weather_data")),
+    "failure_event": ("event_id", ("equipment_id", "component_id", "date_time", "failure_type", "severity", "impact",
+                                   "resolution")),
+}
+OPERATIONAL_STATE_COPY_SQL = ("COPY operational_state (equipment_id, timestamp, operating_mode, load_percentage, "
+                              "environmental_conditions) FROM STDIN WITH (FORMAT csv)")
+
+##################################
+# SYNTHETIC FLEET                #
+##################################
+def copy_csv(cursor, sql: str, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    cursor.copy_expert(sql, buffer)
+
+def readings_per_sensor(samples_per_hour: int, days: int) -> int:
+    return samples_per_hour * 24 * days
+
+class FleetGenerator:
+    """
+    Synthetic organizations, fleets, vessels, equipment, components and sensors at a given scale,
+    with days of sensor readings ending at `end`. Readings follow a daily cycle around the normal
+    value of their sensor type; a fraction `anomaly_rate` of them are spikes outside the threshold,
+    and a fraction `failure_rate` of the equipment fails once, its readings drifting out of range
+    before the failure_event and stopping while it is repaired. The same seed gives the same data.
+    """
+    def __init__(self, organizations: int = 10, fleets: int = 3, vessels: int = 10, equipment: int = 5,
+                 components: int = 3, sensors: int = 3, days: int = 7, end: datetime = None,
+                 anomaly_rate: float = 0.001, failure_rate: float = 0.05, seed: int = 0):
+        self.organizations = organizations
+        self.fleets = fleets
+        self.vessels = vessels
+        self.equipment = equipment
+        self.components = components
+        self.sensors = sensors
+        self.days = days
+        self.end = (end or datetime.now()).replace(microsecond=0)
+        self.start = self.end - timedelta(days=days)
+        self.anomaly_rate = anomaly_rate
+        self.failure_rate = failure_rate
+        self.seed = seed
+
+    def equipment_models(self) -> list[tuple]:
+        """The model of every equipment of a vessel, a main engine first."""
+        return [EQUIPMENT_MODELS[i % len(EQUIPMENT_MODELS)] for i in range(self.equipment)]
+
+    def sensor_profiles(self, equipment_type: str) -> list[tuple]:
+        profiles = SENSORS[equipment_type]
+        return [profiles[i % len(profiles)] for i in range(self.sensors)]
+
+    def counts(self) -> dict[str, int]:
+        """
+        Rows per table, the readings and operational states included, without generating them.
+        The readings missing while failed equipment is repaired are not subtracted.
+        """
+        vessels = self.organizations * self.fleets * self.vessels
+        sensor_reading = sum(readings_per_sensor(profile[4], self.days)
+                             for model in self.equipment_models() for profile in self.sensor_profiles(model[0]))
+        return {
+            "organization": self.organizations,
+            "fleet": self.organizations * self.fleets,
+            "vessel": vessels,
+            "equipment": vessels * self.equipment,
+            "component": vessels * self.equipment * self.components,
+            "sensor": vessels * self.equipment * self.sensors,
+            "sensor_reading": vessels * sensor_reading,
+            "operational_state": vessels * self.equipment * int(timedelta(days=self.days) / OPERATIONAL_STATE_INTERVAL),
+        }
+
+    def entities(self, first_ids: dict[str, int]) -> tuple[dict[str, list[tuple]], list[dict]]:
+        """
+        Rows of every table of TABLES, ids first and numbered from first_ids, and the worker tasks
+        generating the readings and operational states of EQUIPMENT_PER_TASK equipment each.
+        """
+        rng = random.Random(self.seed)
+        rows = {table: [] for table in TABLES}
+
+        def add(table: str, *values) -> int:
+            row_id = first_ids[table] + len(rows[table])
+            rows[table].append((row_id, *values))
+            return row_id
+
+        tasks, task = [], None
+        for o in range(self.organizations):
+            organization_type, subscription = ORGANIZATION_TYPES[o % len(ORGANIZATION_TYPES)]
+            name = f"Synthetic {organization_type} {o + 1}"
+            organization_id = add("organization", name, organization_type,
+                                  f"contact@synthetic-{organization_type.lower()}-{o + 1}.com", subscription)
+            for f in range(self.fleets):
+                fleet_type, vessel_type = FLEET_TYPES[f % len(FLEET_TYPES)]
+                fleet_id = add("fleet", organization_id, f"{fleet_type} Fleet {f + 1}", fleet_type,
+                               f"Synthetic {fleet_type.lower()} fleet of {name}")
+                for v in range(self.vessels):
+                    build_year = rng.randint(1995, 2023)
+                    length = rng.randint(180, 400)
+                    vessel_id = add("vessel", fleet_id, f"MV Synthetic {organization_id}-{fleet_id}-{v + 1}",
+                                    vessel_type, build_year, rng.choice(["Class A", "Class B"]),
+                                    f"{length}m x {length // 6}m x {length // 10}m",
+                                    round(rng.uniform(20000, 200000), 2))
+                    self.voyages(rng, vessel_id, add)
+                    for model in self.equipment_models():
+                        equipment_type, manufacturer, model_name, specifications, manual_ref = model
+                        installed = datetime(build_year, rng.randint(1, 12), rng.randint(1, 28)).date()
+                        equipment_id = add("equipment", vessel_id, equipment_type, manufacturer, model_name, installed,
+                                           specifications, manual_ref)
+                        component_ids = []
+                        for c in range(self.components):
+                            component_name, component_type, lifetime = COMPONENTS[equipment_type][c % len(COMPONENTS[equipment_type])]
+                            component_ids.append(add("component", equipment_id, component_name, component_type,
+                                                     manufacturer, f"SN-{equipment_id}-{c + 1}", installed, lifetime))
+                        sensors = []
+                        for profile in self.sensor_profiles(equipment_type):
+                            sensor_type, location, unit, accuracy, samples_per_hour, _, _, low, high = profile
+                            sensor_id = add("sensor", equipment_id, sensor_type, location, unit,
+                                            (self.start - timedelta(days=rng.randint(30, 365))).date(), accuracy,
+                                            samples_per_hour)
+                            margin = (high - low) * 0.1
+                            add("sensor_threshold", sensor_id, low, high,
+                                f"Warning: <{low + margin:g} or >{high - margin:g}, Critical: <{low:g} or >{high:g}",
+                                "Normal operation")
+                            sensors.append((sensor_id, profile))
+                        failures = self.failures(rng, equipment_id, equipment_type, component_ids, add)
+                        if task is None or len(task["equipment"]) == EQUIPMENT_PER_TASK:
+                            task = {"equipment": [], "start": self.start, "end": self.end,
+                                    "anomaly_rate": self.anomaly_rate, "seed": self.seed}
+                            tasks.append(task)
+                        task["equipment"].append((equipment_id, sensors, failures))
+        return rows, tasks
+
+    def voyages(self, rng: random.Random, vessel_id: int, add):
+        day = self.start - timedelta(days=rng.randint(0, 20))
+        while day < self.end:
+            arrival = day + timedelta(days=rng.randint(10, 40))
+            origin, destination = rng.sample(PORTS, 2)
+            add("voyage", vessel_id, day.date(), arrival.date(), f"{origin} to {destination}",
+                rng.choice(["Consumer Goods", "Crude Oil", "Iron Ore", "Mixed Cargo"]), "Normal Operation",
+                f"{rng.choice(['Calm', 'Moderate', 'Rough'])} seas, Wind {rng.randint(5, 30)} knots")
+            day = arrival + timedelta(days=rng.randint(1, 5))
+
+    def failures(self, rng: random.Random, equipment_id: int, equipment_type: str, component_ids: list[int], add) -> list[datetime]:
+        """Failure events of the equipment inside the window, after enough readings to degrade."""
+        if rng.random() >= self.failure_rate or timedelta(days=self.days) <= DEGRADATION:
+            return []
+        failed = self.start + DEGRADATION + (self.end - self.start - DEGRADATION) * rng.random()
+        failed = failed.replace(microsecond=0)
+        component = rng.randrange(len(component_ids)) if component_ids else None
+        name = COMPONENTS[equipment_type][component % len(COMPONENTS[equipment_type])][0] if component is not None \
+            else equipment_type
+        add("failure_event", equipment_id, component_ids[component] if component is not None else None, failed,
+            f"{name} Failure", rng.choice(SEVERITIES), f"{equipment_type} out of service", f"{name} replaced")
+        return [failed]
+
+##################################
+# TIME SERIES                    #
+##################################
+def sensor_series(rng: np.random.Generator, profile: tuple, start: datetime, end: datetime,
+                  failures: list[datetime], anomaly_rate: float) -> tuple[np.ndarray, np.ndarray]:
+    """Timestamps (datetime64[s]) and values of one sensor's readings between start and end."""
+    _, _, _, _, samples_per_hour, mean, spread, low, high = profile
+    interval = 3600 / samples_per_hour
+    seconds = np.arange(0, (end - start).total_seconds(), interval)
+    seconds = seconds + rng.uniform(0, interval / 10, len(seconds))
+    values = mean + spread * (0.5 * np.sin(2 * np.pi * seconds / 86400 + rng.uniform(0, 2 * np.pi))
+                              + rng.standard_normal(len(seconds)))
+    keep = np.ones(len(seconds), dtype=bool)
+    for failed in failures:
+        at = (failed - start).total_seconds()
+        degrading = (seconds > at - DEGRADATION.total_seconds()) & (seconds <= at)
+        progress = 1 - (at - seconds[degrading]) / DEGRADATION.total_seconds()
+        values[degrading] += progress ** 2 * (high - mean) * 1.5
+        keep &= ~((seconds > at) & (seconds <= at + REPAIR.total_seconds()))
+    spikes = rng.random(len(seconds)) < anomaly_rate
+    band = high - low
+    values[spikes] = np.where(rng.random(spikes.sum()) < 0.5, high + rng.uniform(0.1, 0.5, spikes.sum()) * band,
+                              low - rng.uniform(0.1, 0.5, spikes.sum()) * band)
+    timestamps = np.datetime64(start, "s") + seconds.astype("timedelta64[s]")
+    return timestamps[keep], values[keep]
+
+def reading_lines(sensor_id: int, timestamps: np.ndarray, values: np.ndarray) -> list[str]:
+    return [f"{sensor_id},{timestamp},{value},Good,Automatic\n"
+            for timestamp, value in zip(np.datetime_as_string(timestamps), np.char.mod("%.4f", values))]
+
+def load_task(dsn: str, task: dict) -> dict[str, int]:
+    """
+    Generates and COPYs the readings and operational states of the equipment of one task on its own
+    connection, committing every READINGS_PER_COPY rows. Returns the rows loaded per table.
+    """
+    import psycopg2
+    loaded = {"sensor_reading": 0, "operational_state": 0}
+    connection = psycopg2.connect(dsn)
+    try:
+        with connection.cursor() as cursor:
+            lines = []
+
+            def flush():
+                cursor.copy_expert(COPY_SQL, io.StringIO("".join(lines)))
+                connection.commit()
+                loaded["sensor_reading"] += len(lines)
+                lines.clear()
+
+            for equipment_id, sensors, failures in task["equipment"]:
+                rng = np.random.default_rng([task["seed"], equipment_id])
+                states = []
+                timestamp = task["start"]
+                while timestamp < task["end"]:
+                    states.append((equipment_id, timestamp, OPERATING_MODES[rng.integers(len(OPERATING_MODES))],
+                                   round(float(rng.uniform(40, 95)), 2), f"Sea temp: {rng.integers(5, 30)}°C"))
+                    timestamp += OPERATIONAL_STATE_INTERVAL
+                copy_csv(cursor, OPERATIONAL_STATE_COPY_SQL, states)
+                loaded["operational_state"] += len(states)
+                for sensor_id, profile in sensors:
+                    timestamps, values = sensor_series(rng, profile, task["start"], task["end"], failures,
+                                                       task["anomaly_rate"])
+                    lines += reading_lines(sensor_id, timestamps, values)
+                    if len(lines) >= READINGS_PER_COPY:
+                        flush()
+            if lines:
+                flush()
+            connection.commit()
+    finally:
+        connection.close()
+    return loaded
+
+def load_fleet(connection, dsn: str, generator: FleetGenerator, workers: int = GENERATOR_WORKERS,
+               on_progress=None) -> dict[str, int]:
+    """
+    Loads a synthetic fleet: the entities through COPY on `connection` (a psycopg2 connection),
+    committed before the readings, then the daily sensor_reading partitions of the window, then the
+    readings and operational states COPYed by `workers` processes connecting to `dsn`.
+    on_progress, if given, is called with the rows loaded per table after every finished task.
+    Returns the rows loaded per table.
+    """
+    with connection.cursor() as cursor:
+        first_ids = {}
+        for table, (key, _) in TABLES.items():
+            cursor.execute(f"SELECT coalesce(max({key}), 0) + 1 FROM {table}")
+            first_ids[table] = cursor.fetchone()[0]
+        rows, tasks = generator.entities(first_ids)
+        for table, (key, columns) in TABLES.items():
+            copy_csv(cursor, f"COPY {table} ({key}, {', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", rows[table])
+            # Ids were given explicitly, the sequence has to move past them for later inserts
+            cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', '{key}'), "
+                           f"(SELECT coalesce(max({key}), 1) FROM {table}))")
+        cursor.execute("SELECT create_sensor_reading_partitions(%s, %s)", (generator.start.date(), generator.end.date()))
+    connection.commit()
+
+    loaded = {table: len(table_rows) for table, table_rows in rows.items()}
+    loaded.update(sensor_reading=0, operational_state=0)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for finished in as_completed([pool.submit(load_task, dsn, task) for task in tasks]):
+            for table, count in finished.result().items():
+                loaded[table] += count
+            if on_progress:
+                on_progress(loaded)
+    return loaded
@@ -1,49 +1,143 @@
+import hashlib
+import json
+import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
+
 from PyPDF2 import PdfReader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from utils.vector_db_configuration import DefaultVectorStoreConfiguration as VectorStoreConfiguration
+from utils.clients import get_vector_store_config
+from utils.telemetry import span
+from utils.vector_db_configuration import VectorStoreConfiguration
 
-vector_store_config = VectorStoreConfiguration()
+MANIFEST_NAME = ".ingest_manifest.json"
+PAGES_PER_TASK = 8
+INGEST_WORKERS = int(os.getenv('NAVEXA_INGEST_WORKERS', os.cpu_count() or 1))
+logger = logging.getLogger(__name__)
 
-def extract_text_from_pdf(file_path: str) -> str:
+def file_digest(file_path: str) -> str:
     """
-    Extract text from a PDF file.
+    SHA-256 of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def count_pages(file_path: str) -> int:
+    with open(file_path, 'rb') as f:
+        return len(PdfReader(f).pages)
+
+def extract_pages(file_path: str, start: int = 0, stop: int = None) -> list[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF file, one string per page.
+    Runs in the extraction process pool, so it only takes and returns picklable values.
     """
     with open(file_path, 'rb') as f:
         reader = PdfReader(f)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
+        pages = reader.pages[start:stop]
+        return [page.extract_text() or "" for page in pages]
+
+def extract_text_from_pdf(file_path: str) -> str:
+    """
+    Extract text from a PDF file.
+    """
+    return "".join(extract_pages(file_path))
 
 
 class PDFIngestion:
-    def __init__(self, folder_path: str):
+    def __init__(self, folder_path: str, manifest_path: str = None, max_workers: int = INGEST_WORKERS):
         self.folder_path = folder_path
+        # filename -> {"sha256", "index", "ids"} of every manual already in its index
+        self.manifest_path = manifest_path or os.path.join(folder_path, MANIFEST_NAME)
+        self.max_workers = max_workers
+
+    def load_manifest(self) -> dict:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path) as f:
+            return json.load(f)
+
+    def save_manifest(self, manifest: dict):
+        # Written after every manual, through a rename so an interrupted run never leaves it half written
+        temporary_path = f"{self.manifest_path}.tmp"
+        with open(temporary_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(temporary_path, self.manifest_path)
 
-    def ingest_pdfs_to_index(self, that_vector_store_config: VectorStoreConfiguration = None):
+    def ingest_pdfs_to_index(self, that_vector_store_config: VectorStoreConfiguration = None) -> dict[str, int]:
         """
-        Ingest all PDF files in the folder into the FAISS index.
-        The index is created based on the name of the PDF file.
+        Ingest the new and changed PDF files of the folder into the vector store.
+        The index is created based on the name of the PDF file. Manuals whose content hash is
+        in the manifest are skipped as long as the vector store still holds the chunks recorded
+        with it (the manifest may describe another store, or an in-memory one of an earlier run); pages are extracted in a process pool and fed to the splitter
+        as they come back. Returns the number of chunks added per ingested file.
         """
         if that_vector_store_config is None:
-            that_vector_store_config = vector_store_config
-        for filename in os.listdir(self.folder_path):
-            if filename.endswith(".pdf"):
-                save_name = filename[0: -4].lower()
+            that_vector_store_config = get_vector_store_config()
+        manifest = self.load_manifest()
+        digests = {filename: file_digest(os.path.join(self.folder_path, filename))
+                   for filename in sorted(os.listdir(self.folder_path)) if filename.endswith(".pdf")}
+
+        stored = {filename: that_vector_store_config.has_documents(entry["index"], entry["ids"])
+                  for filename, entry in manifest.items()}
+
+        for filename in [f for f in manifest if f not in digests]:
+            entry = manifest.pop(filename)
+            if stored[filename]:
+                logger.debug("removing deleted PDF file %s", filename)
+                that_vector_store_config.get_vector_store_handle(entry["index"]).delete(entry["ids"])
+                that_vector_store_config.persist()
+                that_vector_store_config.manuals_changed()
+            self.save_manifest(manifest)
+
+        changed = [f for f, digest in digests.items()
+                   if manifest.get(f, {}).get("sha256") != digest or not stored[f]]
+        if not changed:
+            logger.debug("all PDF files are up to date")
+            return {}
+
+        text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=50,
+            length_function=len,
+            is_separator_regex=False,
+        )
+        ingested = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+            # Queue the pages of every changed manual up front so extraction runs ahead of embedding
+            tasks = {}
+            for filename in changed:
                 file_path = os.path.join(self.folder_path, filename)
-                print(f"Ingesting PDF file: {filename}")
-                text = extract_text_from_pdf(file_path)
-                vector_store = that_vector_store_config.get_vector_store_handle(save_name)
-                text_splitter = RecursiveCharacterTextSplitter(
-                    chunk_size=1000,
-                    chunk_overlap=50,
-                    length_function=len,
-                    is_separator_regex=False,
-                )
-                docs = text_splitter.create_documents([text])
-                vector_store.add_documents(docs)
-                print(f"Successfully ingested '{filename}' into the index.")
+                tasks[filename] = [(start, pool.submit(extract_pages, file_path, start, start + PAGES_PER_TASK))
+                                   for start in range(0, count_pages(file_path), PAGES_PER_TASK)]
+
+            for filename in changed:
+                with span("ingest", "ingest", manual=filename) as ingesting:
+                    save_name = filename[0: -4].lower()
+                    vector_store = that_vector_store_config.get_vector_store_handle(save_name)
+                    ids = []
+                    for start, task in tasks[filename]:
+                        pages = task.result()
+                        docs = text_splitter.create_documents(
+                            pages,
+                            metadatas=[{"source": filename, "page": start + i + 1} for i in range(len(pages))]
+                        )
+                        if docs:
+                            ids += vector_store.add_documents(docs)
+                    # Drop the previous version only once the new one is in, so the index is never empty
+                    previous = manifest.get(filename)
+                    if previous and previous["ids"] and stored[filename]:
+                        vector_store.delete(previous["ids"])
+                    that_vector_store_config.persist()
+                    that_vector_store_config.manuals_changed()
+                    manifest[filename] = {"sha256": digests[filename], "index": save_name, "ids": ids}
+                    self.save_manifest(manifest)
+                    ingested[filename] = len(ids)
+                    ingesting.set(chunks=len(ids))
+                    logger.debug("ingested %s into the index %s, %d chunks", filename, save_name, len(ids))
+        return ingested
 
 
 if __name__ == "__main__":
@@ -51,4 +145,4 @@ if __name__ == "__main__":
     pdf_ingestion = PDFIngestion(pdf_folder)
     pdf_ingestion.ingest_pdfs_to_index()
 
-    print(vector_store_config.get_vector_store_handle("caterpillar-c32").similarity_search("service", k=5))
+    print(get_vector_store_config().get_vector_store_handle("caterpillar-c32").similarity_search("service", k=5))
@@ -0,0 +1,80 @@
+"""
+Read access to the organization data, shared by the API views and the agent tools. Every function
+takes the SQLAlchemy session to run on: Flask-SQLAlchemy's db.session in the API, a plain session
+of the agent's own engine in the tools.
+"""
+from sqlalchemy.orm import Session, selectinload
+
+from models import Organization, Fleet, Vessel, Equipment
+
+def list_organizations(session: Session) -> list[dict]:
+    return [{'organization_id': org.organization_id, 'name': org.name} for org in session.query(Organization).all()]
+
+def organization_tree(session: Session, org_id: int) -> dict | None:
+    """The organization with its fleets, vessels, equipment and components, or None."""
+    # Load the whole tree up front: one SELECT per level instead of one per parent row.
+    organization = session.query(Organization).options(
+        selectinload(Organization.fleets)
+        .selectinload(Fleet.vessels)
+        .selectinload(Vessel.equipment)
+        .selectinload(Equipment.components)
+    ).filter_by(organization_id=org_id).one_or_none()
+    if not organization:
+        return None
+
+    org_data = {
+        'organization_id': organization.organization_id,
+        'name': organization.name,
+        'type': organization.type,
+        'contact_info': organization.contact_info,
+        'subscription_level': organization.subscription_level,
+        'fleets': []
+    }
+
+    for fleet in organization.fleets:
+        fleet_data = {
+            'fleet_id': fleet.fleet_id,
+            'name': fleet.name,
+            'type': fleet.type,
+            'description': fleet.description,
+            'vessels': []
+        }
+
+        for vessel in fleet.vessels:
+            vessel_data = {
+                'vessel_id': vessel.vessel_id,
+                'name': vessel.name,
+                'type': vessel.type,
+                'build_year': vessel.build_year,
+                'classification': vessel.classification,
+                'dimensions': vessel.dimensions,
+                'gross_tonnage': str(vessel.gross_tonnage),
+                'equipment': []
+            }
+
+            for equipment in vessel.equipment:
+                equipment_data = {
+                    'equipment_id': equipment.equipment_id,
+                    'type': equipment.type,
+                    'manufacturer': equipment.manufacturer,
+                    'model': equipment.model,
+                    'installation_date': str(equipment.installation_date),
+                    'specifications': equipment.specifications,
+                    'manual_ref': equipment.manual_ref,
+                    'components': []
+                }
+
+                for component in equipment.components:
+                    component_data = {
+                        'component_id': component.component_id,
+                        'name': component.name,
+                        'type': component.type,
+                        'manufacturer': component.manufacturer,
+                        'serial_number': component.serial_number,
+                        'installation_date': str(component.installation_date)
+                    }
+                    equipment_data['components'].append(component_data)
+                vessel_data['equipment'].append(equipment_data)
+            fleet_data['vessels'].append(vessel_data)
+        org_data['fleets'].append(fleet_data)
+    return org_data
@@ -0,0 +1,107 @@
+import csv
+import gzip
+import io
+import json
+import math
+import zlib
+from datetime import datetime, timezone
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+COLUMNS = ('sensor_id', 'timestamp', 'value', 'quality_indicator', 'collection_method')
+COPY_SQL = f"COPY sensor_reading ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)"
+COPY_CHUNK_SIZE = 50000
+MAX_REPORTED_ERRORS = 20
+# Bounds of the sensor_reading columns; a single row outside them would fail the COPY of the whole batch
+MAX_TEXT_LENGTH = 50  # quality_indicator and collection_method are VARCHAR(50)
+MAX_ABS_VALUE = 1e9  # value is DECIMAL(15,6), nine digits before the point
+# Raised while reading the body itself: a truncated or corrupt gzip stream, invalid UTF-8, a broken CSV
+BODY_ERRORS = (OSError, EOFError, UnicodeDecodeError, zlib.error, csv.Error)
+
+##########################
+# SENSOR READING INGEST  #
+##########################
+def open_text_stream(stream: IO[bytes], gzipped: bool = False) -> IO[str]:
+    """Wraps a (possibly gzip encoded) binary request body into a line iterable text stream."""
+    if gzipped:
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    return io.TextIOWrapper(stream, encoding='utf-8', newline='')
+
+def read_ndjson(lines: Iterable[str]) -> Iterator[tuple[int, dict | Exception]]:
+    """Yields (line number, record) for every non empty line, or (line number, error) if it is not valid JSON."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line)
+        except json.JSONDecodeError as e:
+            yield number, e
+
+def read_csv(lines: Iterable[str]) -> Iterator[tuple[int, dict | Exception]]:
+    """Yields (line number, record) for every row of a CSV body with a header line."""
+    for number, row in enumerate(csv.DictReader(lines), start=2):
+        yield number, row
+
+def validate(record: dict, known_sensor_ids: frozenset) -> tuple:
+    """Returns the record as a row in COLUMNS order, raises ValueError when it cannot be stored."""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object")
+    try:
+        sensor_id = int(record['sensor_id'])
+        timestamp = datetime.fromisoformat(record['timestamp'])
+        value = float(record['value'])
+    except KeyError as e:
+        raise ValueError(f"missing field {e}")
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e))
+    if not math.isfinite(value):
+        raise ValueError(f"value {value} is not finite")
+    if abs(round(value, 6)) >= MAX_ABS_VALUE:
+        raise ValueError(f"value {value} is out of range")
+    texts = []
+    for name in ('quality_indicator', 'collection_method'):
+        text = record.get(name)
+        if text and len(str(text)) > MAX_TEXT_LENGTH:
+            raise ValueError(f"{name} is longer than {MAX_TEXT_LENGTH} characters")
+        texts.append(str(text) if text else None)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    if sensor_id not in known_sensor_ids:
+        raise ValueError(f"unknown sensor_id {sensor_id}")
+    return (sensor_id, timestamp, value, *texts)
+
+def copy_rows(connection, rows: list[tuple]):
+    """Streams rows into sensor_reading through COPY FROM STDIN on a DBAPI (psycopg2) connection."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with connection.cursor() as cursor:
+        cursor.copy_expert(COPY_SQL, buffer)
+
+def load_readings(connection, records: Iterable[tuple[int, dict | Exception]], known_sensor_ids: frozenset,
+                  chunk_size: int = COPY_CHUNK_SIZE, on_chunk=None) -> dict:
+    """
+    Validates records and COPYs the accepted ones in chunks of chunk_size rows.
+    on_chunk, if given, is called with every chunk of rows right after it was copied.
+    Returns the accepted/rejected counts of the batch and the first few rejection reasons.
+    """
+    result = {'accepted': 0, 'rejected': 0, 'errors': []}
+
+    def accepted_rows():
+        for number, record in records:
+            try:
+                if isinstance(record, Exception):
+                    raise ValueError(str(record))
+                yield validate(record, known_sensor_ids)
+            except ValueError as e:
+                result['rejected'] += 1
+                if len(result['errors']) < MAX_REPORTED_ERRORS:
+                    result['errors'].append({'line': number, 'error': str(e)})
+
+    rows = accepted_rows()
+    while chunk := list(islice(rows, chunk_size)):
+        copy_rows(connection, chunk)
+        result['accepted'] += len(chunk)
+        if on_chunk:
+            on_chunk(chunk)
+    return result
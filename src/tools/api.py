@@ -1,28 +1,246 @@
-import requests
+import asyncio
+import json
+import os
+import re
+import threading
+import weakref
+
+from cachetools import TTLCache
 from langchain_core.tools import tool
 
 from langchain_core.prompts import ChatPromptTemplate
 from pydantic import BaseModel
-from utils.vector_db_configuration import DefaultVectorStoreConfiguration as VectorStoreConfiguration
-from utils.llm_configuration import GoogleLLMConfiguration as LLMConfiguration
-vector_store_config = VectorStoreConfiguration()
-configuration = LLMConfiguration()
-embeddings = configuration.get_embeddings()
-llm = configuration.get_llm()
-indexes = vector_store_config.get_indexes()
+from common import ANSWER_TAG
+from utils.clients import get_llm, registry
+from utils.context import fit_lines
+from utils.fuzzy import NameMatcher
+from utils.retrieval import tokenize
+from utils.telemetry import cache_lookup, span
+
+API_HOST = os.getenv('NAVEXA_API_HOST', "http://127.0.0.1:5000/")
+API_MAX_CONNECTIONS = int(os.getenv('NAVEXA_API_MAX_CONNECTIONS', 20))
+API_TIMEOUT = float(os.getenv('NAVEXA_API_TIMEOUT', 30))
+# Read the organization data from the database through the repository instead of over HTTP from the API
+IN_PROCESS_DATA = os.getenv('NAVEXA_IN_PROCESS_DATA', '1') == '1'
+ORGANIZATION_CACHE_TTL = int(os.getenv('NAVEXA_ORGANIZATION_CACHE_TTL', 300))
 
 ###################
 # API INTEGRATION #
 ###################
-def call_api_endpoint(endpoint: str, params: dict=None, host="http://127.0.0.1:5000/"):
-    url = f"{host}/{endpoint}"
-    response = requests.get(url, params=params)
+def new_api_client(asynchronous: bool = False):
+    """An HTTP client keeping up to API_MAX_CONNECTIONS connections to the API alive."""
+    import httpx
+    limits = httpx.Limits(max_connections=API_MAX_CONNECTIONS, max_keepalive_connections=API_MAX_CONNECTIONS)
+    return (httpx.AsyncClient if asynchronous else httpx.Client)(limits=limits, timeout=API_TIMEOUT)
+
+registry.register("api_client", new_api_client)
+# An async client is bound to the event loop it first ran on, so each loop gets its own
+async_api_clients = weakref.WeakKeyDictionary()
 
+def get_async_api_client():
+    loop = asyncio.get_running_loop()
+    client = async_api_clients.get(loop)
+    if client is None:
+        client = async_api_clients[loop] = new_api_client(asynchronous=True)
+    return client
+
+def api_result(endpoint: str, response):
     if response.status_code == 200:
         return response.json()
     else:
         return {"error": f"Failed to fetch data from {endpoint}, Status Code: {response.status_code}"}
 
+def endpoint_name(endpoint: str) -> str:
+    """The endpoint with its ids left out, so all organizations share one latency histogram."""
+    return re.sub(r"/\d+", "/{id}", endpoint)
+
+def call_api_endpoint(endpoint: str, params: dict=None, host: str = None):
+    url = f"{(host or API_HOST).rstrip('/')}/{endpoint}"
+    with span(endpoint_name(endpoint), "http", url=url):
+        return api_result(endpoint, registry.get("api_client").get(url, params=params))
+
+async def acall_api_endpoint(endpoint: str, params: dict=None, host: str = None):
+    url = f"{(host or API_HOST).rstrip('/')}/{endpoint}"
+    with span(endpoint_name(endpoint), "http", url=url):
+        return api_result(endpoint, await get_async_api_client().get(url, params=params))
+
+######################
+# ORGANIZATION DATA  #
+######################
+def new_database_sessions():
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from models import DATABASE_URI
+    return sessionmaker(create_engine(DATABASE_URI, pool_pre_ping=True))
+
+registry.register("database_sessions", new_database_sessions)
+organization_lists = TTLCache(maxsize=1, ttl=ORGANIZATION_CACHE_TTL)
+organization_lists_lock = threading.Lock()
+
+def read_organizations() -> list[dict]:
+    from repository import list_organizations
+    with registry.get("database_sessions")() as session:
+        return list_organizations(session)
+
+def read_organization(org_id: int) -> dict:
+    from repository import organization_tree
+    with registry.get("database_sessions")() as session:
+        return organization_tree(session, org_id) or {"error": f"Organization {org_id} not found"}
+
+def cached_organizations(fetch) -> list[dict]:
+    with organization_lists_lock:
+        if "all" in organization_lists:
+            cache_lookup("organizations", True)
+            return organization_lists["all"]
+    cache_lookup("organizations", False)
+    organizations = fetch()
+    if isinstance(organizations, list):
+        with organization_lists_lock:
+            organization_lists["all"] = organizations
+    return organizations
+
+def get_organizations() -> list[dict]:
+    return cached_organizations(read_organizations if IN_PROCESS_DATA else lambda: call_api_endpoint("api/organizations"))
+
+async def aget_organizations() -> list[dict]:
+    with organization_lists_lock:
+        if "all" in organization_lists:
+            cache_lookup("organizations", True)
+            return organization_lists["all"]
+    if IN_PROCESS_DATA:
+        return await asyncio.to_thread(get_organizations)
+    organizations = await acall_api_endpoint("api/organizations")
+    return cached_organizations(lambda: organizations)
+
+def get_organization(org_id: int) -> dict:
+    return read_organization(org_id) if IN_PROCESS_DATA else call_api_endpoint(f"api/organization/{org_id}")
+
+async def aget_organization(org_id: int) -> dict:
+    if IN_PROCESS_DATA:
+        return await asyncio.to_thread(read_organization, org_id)
+    return await acall_api_endpoint(f"api/organization/{org_id}")
+
+def match_organization(query: str, organizations) -> int | None:
+    """Id of the organization the query names, found without the LLM, or None when unsure."""
+    if not isinstance(organizations, list):
+        return None
+    return NameMatcher({org["organization_id"]: org["name"] for org in organizations}).match(query)
+
+# Child lists of the organization tree, from the top, and the words asking for each level
+LEVELS = [("fleets", {"fleet", "fleets"}),
+          ("vessels", {"vessel", "vessels", "ship", "ships"}),
+          ("equipment", {"equipment", "equipments", "engine", "engines", "machinery", "machine", "machines"}),
+          ("components", {"component", "components", "part", "parts"})]
+DEFAULT_DEPTH = 2  # down to the equipment, which the manual lookups need
+QUESTION_WORDS = frozenset(["the", "of", "and", "for", "all", "with", "give", "list", "what", "which", "get", "me",
+                            "their", "its", "from", "show", "are", "is", "how", "many", "has", "have", "does", "want"])
+
+def relevant_organization(tree: dict, query: str) -> dict:
+    """
+    The organization tree trimmed for the query: branches naming a word of the query, or every branch
+    of a level where none does, down to the deepest level the query asks about or names, without empty
+    fields. The organization's own name does not select branches.
+    """
+    terms = set(tokenize(query)) - QUESTION_WORDS - set(tokenize(str(tree.get("name", ""))))
+    terms -= set().union(*(words for _, words in LEVELS))
+
+    def named(node: dict) -> bool:
+        return any(terms & set(tokenize(v)) for v in node.values() if isinstance(v, str))
+
+    def deepest_named(node: dict, level: int) -> int:
+        deepest = level - 1 if named(node) else -1
+        if level < len(LEVELS):
+            for child in node.get(LEVELS[level][0]) or []:
+                deepest = max(deepest, deepest_named(child, level + 1))
+        return deepest
+
+    asked = [level for level, (_, words) in enumerate(LEVELS) if words & set(tokenize(query))]
+    depth = max([DEFAULT_DEPTH, deepest_named(tree, 0), *asked])
+
+    def trim(node: dict, level: int) -> tuple[dict, bool]:
+        trimmed = {k: v for k, v in node.items() if not isinstance(v, list) and v not in (None, "", "None")}
+        if level > depth or level >= len(LEVELS):
+            return trimmed, named(node)
+        children = [trim(child, level + 1) for child in node.get(LEVELS[level][0]) or []]
+        relevant = [child for child, hit in children if hit]
+        trimmed[LEVELS[level][0]] = relevant or [child for child, _ in children]
+        return trimmed, named(node) or bool(relevant)
+
+    return trim(tree, 0)[0]
+
+def organization_tables(tree: dict) -> str:
+    """
+    The organization tree as one pipe separated table per level, each row keyed to its parent by id,
+    which spells every field name once instead of once per object.
+    """
+    rows = {}
+
+    def collect(node: dict, level: int, parent: tuple | None):
+        name = LEVELS[level - 1][0] if level else "organization"
+        fields = {k: v for k, v in node.items() if not isinstance(v, list)}
+        if parent:
+            fields = {parent[0]: parent[1], **fields}
+        rows.setdefault(name, []).append(fields)
+        if level < len(LEVELS):
+            own_id = next(((k, v) for k, v in node.items() if k.endswith("_id")), None)
+            for child in node.get(LEVELS[level][0]) or []:
+                collect(child, level + 1, own_id)
+
+    collect(tree, 0, None)
+    lines = []
+    for name, table in rows.items():
+        columns = list(dict.fromkeys(column for row in table for column in row))
+        lines.append(f"{name}: {'|'.join(columns)}")
+        lines.extend("|".join(str(row.get(column, "")).replace("|", "/") for column in columns) for row in table)
+    return "\n".join(lines)
+
+def organization_context(details: dict, query: str) -> str:
+    if "error" in details:
+        return json.dumps(details)
+    return fit_lines(organization_tables(relevant_organization(details, query)))
+
+class Organization(BaseModel):
+    """Organization under consideration"""
+    name: str
+    id: int
+
+org_ext_prompt = ChatPromptTemplate.from_messages([
+    ('system',
+     """
+     You are a helpful Assistant who is able to extract the actual Organization name and the organization id from {org_list} based on user query
+     give it to me in the json format.
+     Do not include any other text along with the actual json output.
+      
+     Example of the output format is
+     {{
+         "name": "microsoft",
+         "id": 123
+     }}
+     """),
+    ('human', 'query: {query}')
+])
+
+org_details_prompt = ChatPromptTemplate.from_messages([
+    ('system',
+     """
+     You are a helpful Assistant who is answer query based on context: {context}.
+     Give exact answers. Do not include text like ```json etc.
+     """),
+    ('human', 'extract the information based on user query: {query}')
+])
+
+async def aextract_organization_level_data(query: str):
+    org_list = await aget_organizations()
+    org_id = match_organization(query, org_list)
+    if org_id is None:
+        org: Organization = await org_ext_prompt.pipe(get_llm().with_structured_output(Organization)).ainvoke(
+            {"query": query, "org_list": org_list})
+        org_id = org.id
+    org_details = await aget_organization(org_id)
+    answer_llm = get_llm().with_config(tags=[ANSWER_TAG])
+    return await org_details_prompt.pipe(answer_llm).ainvoke({"context": organization_context(org_details, query),
+                                                              "query": query})
+
 @tool
 def extract_organization_level_data(query: str):
     """
@@ -84,37 +302,15 @@ def extract_organization_level_data(query: str):
     Output:
         The output will contain the full set of information for a particular organization
     """
-    org_list: str = call_api_endpoint("api/organizations")
-    class Organization(BaseModel):
-        """Organization under consideration"""
-        name: str
-        id: int
-
-    org_ext_llm = configuration.get_llm().with_structured_output(Organization)
-    org_ext_prompt = ChatPromptTemplate.from_messages([
-        ('system',
-         """
-         You are a helpful Assistant who is able to extract the actual Organization name and the organization id from {org_list} based on user query
-         give it to me in the json format.
-         Do not include any other text along with the actual json output.
-          
-         Example of the output format is
-         {{
-             "name": "microsoft",
-             "id": 123
-         }}
-         """),
-        ('human', 'query: {query}')
-    ])
-    org: Organization = org_ext_prompt.pipe(org_ext_llm).invoke({"query": query, "org_list": org_list})
-
-    org_details = call_api_endpoint(f"api/organization/{org.id}")
-    org_details_prompt = ChatPromptTemplate.from_messages([
-        ('system',
-         """
-         You are a helpful Assistant who is answer query based on context: {context}.
-         Give exact answers. Do not include text like ```json etc.
-         """),
-        ('human', 'extract the information based on user query: {query}')
-    ])
-    return org_details_prompt.pipe(llm).invoke({"context": org_details, "query": query})
+    org_list = get_organizations()
+    org_id = match_organization(query, org_list)
+    if org_id is None:
+        org: Organization = org_ext_prompt.pipe(get_llm().with_structured_output(Organization)).invoke(
+            {"query": query, "org_list": org_list})
+        org_id = org.id
+    org_details = get_organization(org_id)
+    answer_llm = get_llm().with_config(tags=[ANSWER_TAG])
+    return org_details_prompt.pipe(answer_llm).invoke({"context": organization_context(org_details, query),
+                                                      "query": query})
+
+extract_organization_level_data.coroutine = aextract_organization_level_data
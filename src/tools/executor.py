@@ -1,45 +1,104 @@
-from langchain.agents import create_tool_calling_agent, AgentExecutor, AgentType
+import logging
+import os
+
 from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import ensure_config, merge_configs
 from tools import tools
-from utils.vector_db_configuration import DefaultVectorStoreConfiguration as VectorStoreConfiguration
-from utils.llm_configuration import GoogleLLMConfiguration as LLMConfiguration
+from utils.clients import get_llm, registry
+from utils.context import PromptTokenCounter
+from common import Step, WorkflowState
 
-vector_store_config = VectorStoreConfiguration()
-configuration = LLMConfiguration()
-embeddings = configuration.get_embeddings()
-llm = configuration.get_llm()
-indexes = vector_store_config.get_indexes()
-from common import WorkflowState
+# Calls the tool the plan names with arguments taken from the state; 0 asks the agent for every step
+DIRECT_DISPATCH = os.getenv('NAVEXA_DIRECT_DISPATCH', '1') == '1'
+tools_by_name = {tool.name: tool for tool in tools}
+# Tags the runs of the last step, whose ANSWER_TAG LLM calls make the answer streamed to the user
+LAST_STEP_TAG = "last_step"
+logger = logging.getLogger(__name__)
+
+def build_agent():
+    from langchain.agents import create_tool_calling_agent, AgentExecutor  # ~0.6s to import, only needed once a step runs
 
-#################
-# EXECUTE_TOOLS #
-#################
-def execute_tool(state: WorkflowState):
     prompt = ChatPromptTemplate.from_messages([
         ('system', 'You are a smart agent who can execute one of the following utils: utils: {utils}'),
         ("placeholder", "{chat_history}"),
         ('human',"""
-                    Please perform the tool invocation based on context and tasks to perform:   
-                    
-                    context: 
+                    Please perform the tool invocation based on context and tasks to perform:
+
+                    context:
                     {context}
-                    
-                    details of task to perform: 
+
+                    details of task to perform:
                     {steps}
-                    
+
                     query:
                     {query}
-                    
+
                     finally return the result without tags such as ```json or ```.
                 """),
         ("placeholder", "{agent_scratchpad}"),
     ])
-    agent = create_tool_calling_agent(llm=llm,tools=tools,prompt=prompt)
-    agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+    agent = create_tool_calling_agent(llm=get_llm(),tools=tools,prompt=prompt)
+    return AgentExecutor(agent=agent, tools=tools, verbose=True)
+
+registry.register("tool_agent", build_agent)
+
+def tool_arguments(step: Step, state: WorkflowState) -> dict | None:
+    """
+    Arguments for the tool the step names: the query with the task of the step, and the context for
+    tools taking one. None for unknown tools or tools taking other arguments.
+    """
+    tool = tools_by_name.get(step.tool)
+    if tool is None or not set(tool.args) <= {"query", "context"}:
+        return None
+    arguments = {}
+    if "context" in tool.args:
+        arguments["context"] = str(state.get("output", ""))
+    if "query" in tool.args:
+        arguments["query"] = f"{state['query']}\n\ntask: {step.reason_it_was_chosen}"
+    return arguments
+
+def step_config(step: Step, state: WorkflowState, counter: PromptTokenCounter) -> RunnableConfig:
+    """
+    The config of the running graph node with the token counter added, so that the graph's own
+    callbacks, like the ones streaming tokens, still see the step's LLM calls.
+    """
+    last = step.order == max(s.order for s in state["steps"])
+    return merge_configs(ensure_config(), {"callbacks": [counter], "tags": [LAST_STEP_TAG] if last else []})
+
+#################
+# EXECUTE_TOOLS #
+#################
+def dispatch(state: WorkflowState):
+    """
+    What executes the current step: the planned tool or else the agent, its input and config, and the
+    function turning its result into the state update.
+    """
     steps = state["steps"][state.get("current_step", 0)]
     context = state.get("output", "")
-    print(f"executing Steps: {steps} with Context:{context}")
-    result = agent_executor.invoke({"query": state["query"], "utils": tools, "steps": steps, "context": context})
-    print(result)
-    return result
+    arguments = tool_arguments(steps, state) if DIRECT_DISPATCH else None
+    counter = PromptTokenCounter()
+    config = step_config(steps, state, counter)
+    if arguments is not None:
+        logger.debug("dispatching step %s to %s", steps, steps.tool)
+        def shape(output):
+            logger.debug("step %s: %d prompt tokens", steps.order, counter.tokens)
+            return {"query": state["query"], "steps": steps, "context": context,
+                    "output": getattr(output, "content", output), "prompt_tokens": counter.tokens}
+        return tools_by_name[steps.tool], arguments, config, shape
+
+    logger.debug("executing step %s with context %r", steps, context)
+    def shape(result):
+        logger.debug("step %s: %d prompt tokens, result %r", steps.order, counter.tokens, result)
+        return {**result, "prompt_tokens": counter.tokens}
+    inputs = {"query": state["query"], "utils": tools, "steps": steps, "context": context}
+    return registry.get("tool_agent"), inputs, config, shape
+
+def execute_tool(state: WorkflowState):
+    runnable, inputs, config, shape = dispatch(state)
+    return shape(runnable.invoke(inputs, config=config))
 
+async def aexecute_tool(state: WorkflowState):
+    """execute_tool on the event loop: tools, LLM and API calls are awaited instead of holding a thread."""
+    runnable, inputs, config, shape = dispatch(state)
+    return shape(await runnable.ainvoke(inputs, config=config))
@@ -1,19 +1,53 @@
+import asyncio
+import logging
+
 from langchain_core.tools import tool
 from langchain_core.prompts import ChatPromptTemplate
 
 from common import Output
-from utils.vector_db_configuration import DefaultVectorStoreConfiguration as VectorStoreConfiguration
-from utils.llm_configuration import GoogleLLMConfiguration as LLMConfiguration
+from utils.clients import get_llm, get_indexes, get_vector_store_config
+from utils.context import CHUNK_SEPARATOR
+from utils.retrieval import get_hybrid_retriever
+
+logger = logging.getLogger(__name__)
 
-vector_store_config = VectorStoreConfiguration()
-configuration = LLMConfiguration()
-embeddings = configuration.get_embeddings()
-llm = configuration.get_llm()
-indexes = vector_store_config.get_indexes()
 
 ###########################
 # USER MANUAL INTEGRATION #
 ###########################
+search_keywords_prompt = ChatPromptTemplate.from_messages(
+    [
+        ('system', """
+            You are a Mechanical Engineer in the Shipping Industry with expertise in Predictive Maintenance.
+            You have to find relevant words from user query which will help me search out relevant contents from instruction manual.
+            You have to only return me the words as space separated. No other words apart from the search terms must be returned.
+            equipment name must be selected from {equipments}
+
+            Example:
+            What is the weight and size of the abc engine?
+            Answer:
+            {{
+                'equipment_name': 'abc-engine',
+                'keywords': 'weight size'
+            }}
+            """),
+        ('human', "Please answer my query {query}")
+    ]
+)
+
+def search_manual(output: Output, query: str) -> dict[str, str]:
+    logger.debug("searching the manual of %s for %r", output.equipment_name, output.keywords)
+    retriever = get_hybrid_retriever(get_vector_store_config(), output.equipment_name)
+    context = CHUNK_SEPARATOR.join([doc.page_content for doc in retriever.search(output.keywords, k=5)])
+    return {"equipment_name": output.equipment_name, "context": context, "query": query}
+
+async def aextract_from_manual(query: str) -> dict[str, str]:
+    # The index list and the retrieval are blocking database and CPU work, kept off the event loop
+    indexes = await asyncio.to_thread(get_indexes)
+    llm_struct_output = get_llm().with_structured_output(Output)
+    output: Output = await (search_keywords_prompt | llm_struct_output).ainvoke({"equipments": indexes, "query": query})
+    return await asyncio.to_thread(search_manual, output, query)
+
 @tool
 def extract_from_manual(query: str) -> dict[str, str]():
     """
@@ -29,28 +63,9 @@ def extract_from_manual(query: str) -> dict[str, str]():
     Output:
         Will give answer to your question to your query based on information from user manual.
     """
-    search_keywords_prompt = ChatPromptTemplate.from_messages(
-        [
-            ('system', """
-                You are a Mechanical Engineer in the Shipping Industry with expertise in Predictive Maintenance.
-                You have to find relevant words from user query which will help me search out relevant contents from instruction manual.
-                You have to only return me the words as space separated. No other words apart from the search terms must be returned.
-                equipment name must be selected from {equipments}
-
-                Example:
-                What is the weight and size of the abc engine?
-                Answer:
-                {{
-                    'equipment_name': 'abc-engine',
-                    'keywords': 'weight size'
-                }}
-                """),
-            ('human', "Please answer my query {query}")
-        ]
-    )
-    llm_struct_output = configuration.get_llm().with_structured_output(Output)
-    print(f"searching in {indexes} \n query: {query}")
+    indexes = get_indexes()
+    llm_struct_output = get_llm().with_structured_output(Output)
     output: Output = (search_keywords_prompt | llm_struct_output).invoke({"equipments": indexes, "query": query})
-    print(f"Found.. {output}")
-    context = "\n\n\n".join([doc.page_content for doc in vector_store_config.get_vector_store_handle(output.equipment_name).similarity_search(output.keywords, k=5)])
-    return {"equipment_name": output.equipment_name, "context": context, "query": query}
+    return search_manual(output, query)
+
+extract_from_manual.coroutine = aextract_from_manual
@@ -1,90 +1,158 @@
+import asyncio
 from typing import List, Dict
 from langchain_core.prompts import ChatPromptTemplate
 from tools import tools
-from utils.vector_db_configuration import DefaultVectorStoreConfiguration as VectorStoreConfiguration
-from utils.llm_configuration import GoogleLLMConfiguration as LLMConfiguration
+from utils.clients import get_embeddings, get_llm, registry
+from utils.plan_cache import PlanClassifier
+from utils.telemetry import cache_lookup
+from common import WorkflowState, Step, Steps
 
-vector_store_config = VectorStoreConfiguration()
-configuration = LLMConfiguration()
-embeddings = configuration.get_embeddings()
-llm = configuration.get_llm()
-indexes = vector_store_config.get_indexes()
-from common import WorkflowState, Steps
+registry.register("plan_classifier", lambda: PlanClassifier(get_embeddings()))
+
+REASONS = {
+    "extract_organization_level_data": "first have to call the organization level data to get the organization and the list of equipments.",
+    "extract_from_manual": "the information has to be extracted from the manuals of the equipments.",
+    "summarize": "now I have to summarize the information.",
+}
+
+def plan_steps(tool_names) -> List[Step]:
+    return [Step(order=order, tool=tool, reason_it_was_chosen=REASONS[tool]) for order, tool in enumerate(tool_names, 1)]
 
 ########################
 # multi-query rewrite  #
 ########################
-def multi_query_rewrite(state: WorkflowState) -> Dict[str, List[Steps]]:
-    """Rewrites the user query"""
-    tool_bound_llm = configuration.get_llm()
+planner_prompt = ChatPromptTemplate.from_messages(
+    [
+        ('system', """
+                You are a Technical Customer Service Executive who is able to split the user query into logical  steps to answer the question based on following rules.
+                you have the following utils at your disposal {utils}. 
+                
+                
+                Your Task:
+                Your task is to split the user query into a series of steps such that the utils can be used in a particular order. 
+                You must understand the description of each tool then arrange it as a chain. 
+                The output of one tool will become the context to the next if it expects a context.
+                Hence your output is a series of steps one step to call one tool at a time.
+                A step may list in "depends_on" the orders of the steps whose output it needs, without it a step
+                needs the step before it. Steps that need nothing from each other, such as one manual lookup per
+                equipment, must have an empty "depends_on" so that they run at the same time.
+                                  
+                                  
+                If the question outside this given context or if you are not sure of the answer, directly call the summarize step.
+                Answer should be in json format. Following is an example of the output:
+                Question 1.:
+                I want to get the name, model number and manufacturer of all the equipments of Company Cochin Shipping Inc.
+                
+                Answer:
+                {{
+                    "query": "I want to get the name, model number and manufacturer of all the equipments of Company Cochin Shipping Inc."
+                    "steps": [
+                        {{
+                            "order": 1,
+                            "tool": "extract_organization_level_data",
+                            "reason_it_was_chosen": "first have to call the organization level data to get the organization and the list of equipments.
+                        }},
+                        {{
+                            "order": 2,
+                            "tool": "extract_from_manual",
+                            "reason_it_was_chosen": "now that I have the equipments I have to extract the information from the manuals.
+                        }},
+                        {{
+                            "order": 3,
+                            "tool": "summarize",
+                            "reason_it_was_chosen": "now I have to summarize the information.
+                        }}
+                    ]
+                }} 
+                
+                
+                
+                Question 2.:
+                I want to get the description of CAT C-32
+                
+                Answer:
+                {{
+                    "query": "I want to get the name, model number and manufacturer of all the equipments of Company Cochin Shipping Inc."
+                    "steps": [
+                        {{
+                            "order": 1,
+                            "tool": "extract_from_manual",
+                            "reason_it_was_chosen": "This question is equipment specific and has nothing to do with Organization. 
+                        }},
+                        {{
+                            "order": 2,
+                            "tool": "summarize",
+                            "reason_it_was_chosen": "now I have to summarize the information.
+                        }}
+                    ]
+                }} 
+                
+                
+                
+                Question 3.:
+                Compare the service intervals of the CAT C-32 and the Wartsila RT-flex82C
+                
+                Answer:
+                {{
+                    "query": "Compare the service intervals of the CAT C-32 and the Wartsila RT-flex82C"
+                    "steps": [
+                        {{
+                            "order": 1,
+                            "tool": "extract_from_manual",
+                            "reason_it_was_chosen": "get the service intervals of the CAT C-32 from its manual.",
+                            "depends_on": []
+                        }},
+                        {{
+                            "order": 2,
+                            "tool": "extract_from_manual",
+                            "reason_it_was_chosen": "get the service intervals of the Wartsila RT-flex82C from its manual.",
+                            "depends_on": []
+                        }},
+                        {{
+                            "order": 3,
+                            "tool": "summarize",
+                            "reason_it_was_chosen": "now I have to compare and summarize the information.",
+                            "depends_on": [1, 2]
+                        }}
+                    ]
+                }} 
+                """),
+        ('human', "Please answer my query {query}")
+    ]
+)
+
+def planner_chain():
+    tool_bound_llm = get_llm()
     tool_bound_llm = tool_bound_llm.bind_tools(tools)
     tool_bound_llm = tool_bound_llm.with_structured_output(Steps)
+    return planner_prompt | tool_bound_llm
+
+def learn_plan(planner: PlanClassifier, query: str, steps: List[Step]):
+    tool_names = [step.tool for step in sorted(steps, key=lambda step: step.order)]
+    # A plan repeating a tool fans out over the equipments of this query, it does not carry over to others
+    if tool_names and all(tool in REASONS for tool in tool_names) and len(set(tool_names)) == len(tool_names):
+        planner.learn(query, tool_names)
+
+def multi_query_rewrite(state: WorkflowState) -> Dict[str, List[Steps]]:
+    """Rewrites the user query; plans of the shape of earlier plans come from the plan classifier without an LLM call"""
+    planner: PlanClassifier = registry.get("plan_classifier")
+    tool_names, _ = planner.predict(state["query"])
+    cache_lookup("plan", tool_names is not None)
+    if tool_names is not None:
+        return {"steps": plan_steps(tool_names)}
+
+    steps = planner_chain().invoke({"utils": tools, **state}).steps
+    learn_plan(planner, state["query"], steps)
+    return {"steps": steps}
+
+async def amulti_query_rewrite(state: WorkflowState) -> Dict[str, List[Steps]]:
+    planner: PlanClassifier = registry.get("plan_classifier")
+    # The classifier embeds the query with a blocking client
+    tool_names, _ = await asyncio.to_thread(planner.predict, state["query"])
+    cache_lookup("plan", tool_names is not None)
+    if tool_names is not None:
+        return {"steps": plan_steps(tool_names)}
 
-    summarizer_prompt = ChatPromptTemplate.from_messages(
-        [
-            ('system', """
-                    You are a Technical Customer Service Executive who is able to split the user query into logical  steps to answer the question based on following rules.
-                    you have the following utils at your disposal {utils}. 
-                    
-                    
-                    Your Task:
-                    Your task is to split the user query into a series of steps such that the utils can be used in a particular order. 
-                    You must understand the description of each tool then arrange it as a chain. 
-                    The output of one tool will become the context to the next if it expects a context.
-                    Hence your output is a series of steps one step to call one tool at a time.
-                                      
-                                      
-                    If the question outside this given context or if you are not sure of the answer, directly call the summarize step.
-                    Answer should be in json format. Following is an example of the output:
-                    Question 1.:
-                    I want to get the name, model number and manufacturer of all the equipments of Company Cochin Shipping Inc.
-                    
-                    Answer:
-                    {{
-                        "query": "I want to get the name, model number and manufacturer of all the equipments of Company Cochin Shipping Inc."
-                        "steps": [
-                            {{
-                                "order": 1,
-                                "tool": "extract_organization_level_data",
-                                "reason_it_was_chosen": "first have to call the organization level data to get the organization and the list of equipments.
-                            }},
-                            {{
-                                "order": 2,
-                                "tool": "extract_from_manual",
-                                "reason_it_was_chosen": "now that I have the equipments I have to extract the information from the manuals.
-                            }},
-                            {{
-                                "order": 3,
-                                "tool": "summarize",
-                                "reason_it_was_chosen": "now I have to summarize the information.
-                            }}
-                        ]
-                    }} 
-                    
-                    
-                    
-                    Question 2.:
-                    I want to get the description of CAT C-32
-                    
-                    Answer:
-                    {{
-                        "query": "I want to get the name, model number and manufacturer of all the equipments of Company Cochin Shipping Inc."
-                        "steps": [
-                            {{
-                                "order": 1,
-                                "tool": "extract_from_manual",
-                                "reason_it_was_chosen": "This question is equipment specific and has nothing to do with Organization. 
-                            }},
-                            {{
-                                "order": 2,
-                                "tool": "summarize",
-                                "reason_it_was_chosen": "now I have to summarize the information.
-                            }}
-                        ]
-                    }} 
-                    """),
-            ('human', "Please answer my query {query}")
-        ]
-    )
-    steps = (summarizer_prompt | tool_bound_llm).invoke({"utils": tools, **state}).steps
+    steps = (await planner_chain().ainvoke({"utils": tools, **state})).steps
+    await asyncio.to_thread(learn_plan, planner, state["query"], steps)
     return {"steps": steps}
@@ -0,0 +1,69 @@
+import threading
+
+from utils.llm_configuration import DefaultLLMConfiguration as LLMConfiguration
+
+MISSING = object()
+
+##################################
+# SHARED CLIENT REGISTRY         #
+##################################
+class ClientRegistry:
+    """
+    Builds every registered client once, on first use, and hands the same instance to every caller.
+    Factories run under a re-entrant lock so one client may be built from another.
+    """
+    def __init__(self):
+        self.factories = {}
+        self.instances = {}
+        self.lock = threading.RLock()
+
+    def register(self, name: str, factory):
+        with self.lock:
+            self.factories[name] = factory
+            self.instances.pop(name, None)
+
+    def get(self, name: str):
+        instance = self.instances.get(name, MISSING)
+        if instance is not MISSING:
+            return instance
+        with self.lock:
+            instance = self.instances.get(name, MISSING)
+            if instance is MISSING:
+                instance = self.instances[name] = self.factories[name]()
+            return instance
+
+    def reset(self, name: str = None):
+        """Drops one built client, or all of them, so the next get() builds it again."""
+        with self.lock:
+            if name is None:
+                self.instances.clear()
+            else:
+                self.instances.pop(name, None)
+
+
+def vector_store_configuration():
+    # Imported here, the vector store configuration itself asks the registry for the LLM configuration
+    from utils.vector_db_configuration import DefaultVectorStoreConfiguration as VectorStoreConfiguration
+    return VectorStoreConfiguration()
+
+registry = ClientRegistry()
+registry.register("llm_configuration", LLMConfiguration)
+registry.register("llm", lambda: get_llm_configuration().get_llm())
+registry.register("vector_store_config", vector_store_configuration)
+registry.register("embeddings", lambda: get_vector_store_config().get_vector_store_embedding_model())
+
+def get_llm_configuration():
+    return registry.get("llm_configuration")
+
+def get_llm():
+    return registry.get("llm")
+
+def get_embeddings():
+    return registry.get("embeddings")
+
+def get_vector_store_config():
+    return registry.get("vector_store_config")
+
+def get_indexes() -> list[str]:
+    # Not held here, the vector store configuration caches the list for a while itself
+    return get_vector_store_config().get_indexes()
@@ -0,0 +1,112 @@
+import json
+import math
+import os
+import re
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from utils.clients import get_llm_configuration
+from utils.retrieval import tokenize
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+# Overrides the context budget of the configured model
+CONTEXT_TOKENS = os.getenv('NAVEXA_CONTEXT_TOKENS')
+# Pieces sharing this much of the smaller one's words are the same piece
+DUPLICATE_OVERLAP = 0.8
+# Manual lookups join their chunks with this separator
+CHUNK_SEPARATOR = "\n\n\n"
+# Ends a text cut by fit_lines, so the model knows there is more than it sees
+OMITTED_LINES = "[{} more lines omitted]"
+
+def count_tokens(text: str) -> int:
+    """Approximate LLM tokens: one per word or punctuation mark, long words one per four characters."""
+    return sum(max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PATTERN.findall(text))
+
+def truncate(text: str, tokens: int) -> str:
+    """The leading words of text, up to `tokens` tokens."""
+    used = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        used += max(1, math.ceil(len(match.group()) / 4))
+        if used > tokens:
+            return text[:match.start()].rstrip()
+    return text
+
+def context_budget() -> int:
+    return int(CONTEXT_TOKENS) if CONTEXT_TOKENS else get_llm_configuration().context_tokens
+
+def result_pieces(result) -> list[str]:
+    """
+    The text a step hands on, in pieces: the chunks of a manual lookup labelled with their equipment,
+    otherwise the paragraphs of the step's output. The query and plan echoed in a result are left out.
+    """
+    output = result.get("output", result) if isinstance(result, dict) else result
+    output = getattr(output, "content", output)
+    if isinstance(output, dict) and isinstance(output.get("context"), str):
+        label = f"[{output['equipment_name']}] " if output.get("equipment_name") else ""
+        return [label + chunk.strip() for chunk in output["context"].split(CHUNK_SEPARATOR) if chunk.strip()]
+    if not isinstance(output, str):
+        output = json.dumps(output, separators=(",", ":"), default=str)
+    return [paragraph.strip() for paragraph in re.split(r"\n\s*\n", output) if paragraph.strip()]
+
+def deduplicate(pieces: list[str]) -> list[str]:
+    kept, kept_words = [], []
+    for piece in pieces:
+        words = set(tokenize(piece))
+        if not any(len(words & other) >= DUPLICATE_OVERLAP * min(len(words), len(other)) for other in kept_words
+                   if words and other):
+            kept.append(piece)
+            kept_words.append(words)
+    return kept
+
+##################################
+# CONTEXT ASSEMBLY               #
+##################################
+def assemble_context(query: str, results: list, budget: int = None) -> str:
+    """
+    Context for the next step from the results of the steps it depends on: their pieces without
+    duplicates, the ones covering the most query terms first, packed into `budget` tokens and then put
+    back in their original order. A piece larger than the whole budget is cut to it.
+    """
+    budget = context_budget() if budget is None else budget
+    pieces = deduplicate([truncate(piece, budget) for result in results for piece in result_pieces(result)])
+    terms = set(tokenize(query))
+
+    def coverage(piece: str) -> float:
+        return len(terms & set(tokenize(piece))) / len(terms) if terms else 0.0
+
+    chosen, used = set(), 0
+    for i in sorted(range(len(pieces)), key=lambda i: coverage(pieces[i]), reverse=True):
+        tokens = count_tokens(pieces[i])
+        if used + tokens <= budget:
+            chosen.add(i)
+            used += tokens
+    return "\n\n".join(pieces[i] for i in sorted(chosen))
+
+def fit_lines(text: str, budget: int = None) -> str:
+    """
+    The leading lines of text that fit into `budget` tokens; when some are left out, a last line
+    (OMITTED_LINES) says how many.
+    """
+    budget = context_budget() if budget is None else budget
+    lines = text.splitlines()
+    costs = [count_tokens(line) for line in lines]
+    if sum(costs) <= budget:
+        return "\n".join(lines)
+    kept, used = 0, 0
+    while used + costs[kept] + count_tokens(OMITTED_LINES.format(len(lines) - kept - 1)) <= budget:
+        used += costs[kept]
+        kept += 1
+    return "\n".join(lines[:kept] + [OMITTED_LINES.format(len(lines) - kept)])
+
+class PromptTokenCounter(BaseCallbackHandler):
+    """Adds up the approximate tokens of every prompt sent to an LLM while attached to a run."""
+    run_inline = True
+
+    def __init__(self):
+        self.tokens = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.tokens += sum(count_tokens(prompt) for prompt in prompts)
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.tokens += sum(count_tokens(str(message.content)) for batch in messages for message in batch)
@@ -0,0 +1,176 @@
+import hashlib
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from langchain_core.embeddings import Embeddings
+
+from utils.telemetry import cache_lookup, retries, span
+
+EMBEDDING_CACHE_PATH = os.getenv('NAVEXA_EMBEDDING_CACHE', os.path.expanduser("~/.cache/navexa/embeddings.sqlite"))
+EMBEDDING_BATCH_SIZE = int(os.getenv('NAVEXA_EMBEDDING_BATCH_SIZE', 100))
+EMBEDDING_CONCURRENCY = int(os.getenv('NAVEXA_EMBEDDING_CONCURRENCY', 4))
+EMBEDDING_REQUESTS_PER_MINUTE = float(os.getenv('NAVEXA_EMBEDDING_REQUESTS_PER_MINUTE', 150))
+
+DOCUMENT = "document"
+QUERY = "query"
+
+##################################
+# CONTENT ADDRESSED VECTOR CACHE #
+##################################
+class EmbeddingCache:
+    """
+    SQLite store of embedding vectors keyed by sha256(model, kind, text).
+    Documents and queries are kept apart since providers embed them differently.
+    """
+    LOOKUP_BATCH_SIZE = 500
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS embedding (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(model: str, kind: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{kind}\0{text}".encode()).hexdigest()
+
+    def get_many(self, keys: list[str]) -> dict[str, list[float]]:
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), self.LOOKUP_BATCH_SIZE):
+                batch = keys[i:i + self.LOOKUP_BATCH_SIZE]
+                rows = self.connection.execute(
+                    f"SELECT key, vector FROM embedding WHERE key IN ({','.join('?' * len(batch))})", batch
+                )
+                found.update((key, array("f", vector).tolist()) for key, vector in rows)
+        return found
+
+    def put_many(self, items: dict[str, list[float]]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO embedding (key, vector) VALUES (?, ?)",
+                [(key, array("f", vector).tobytes()) for key, vector in items.items()]
+            )
+
+
+class RateLimiter:
+    """Spaces calls evenly so that at most requests_per_minute start in any minute."""
+    def __init__(self, requests_per_minute: float):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+##################################
+# BATCHED EMBEDDINGS             #
+##################################
+class BatchedEmbeddings(Embeddings):
+    """
+    Wraps an embedding provider: texts already in the cache are never sent again, the rest are
+    de-duplicated, split in batches and embedded concurrently within the rate limit, retrying
+    failed batches with exponential backoff.
+    """
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 max_concurrency: int = EMBEDDING_CONCURRENCY,
+                 requests_per_minute: float = EMBEDDING_REQUESTS_PER_MINUTE, max_retries: int = 5,
+                 backoff: float = 1.0):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, "model", None) or type(embeddings).__name__
+        self.cache = cache
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = RateLimiter(requests_per_minute)
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    def call(self, function, *args):
+        with span(function.__name__, "embedding", model=self.model) as embedding:
+            for attempt in range(self.max_retries + 1):
+                self.rate_limiter.acquire()
+                try:
+                    return function(*args)
+                except Exception:
+                    if attempt == self.max_retries:
+                        raise
+                    retries.inc(operation="embedding")
+                    embedding.set(retries=attempt + 1)
+                    time.sleep(self.backoff * 2 ** attempt * (0.5 + random.random()))
+
+    def embed_batch(self, keys: list[str], texts: list[str]) -> dict[str, list[float]]:
+        vectors = dict(zip(keys, self.call(self.embeddings.embed_documents, texts)))
+        # Stored per batch, so an interrupted run keeps what it already paid for
+        self.cache.put_many(vectors)
+        return vectors
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.cache.key(self.model, DOCUMENT, text) for text in texts]
+        vectors = self.cache.get_many(list(set(keys)))
+        missing = {key: text for key, text in zip(keys, texts) if key not in vectors}
+        cache_lookup("embedding", True, len(keys) - len(missing))
+        cache_lookup("embedding", False, len(missing))
+        if missing:
+            missing_keys, missing_texts = list(missing), list(missing.values())
+            batches = [(missing_keys[i:i + self.batch_size], missing_texts[i:i + self.batch_size])
+                       for i in range(0, len(missing_keys), self.batch_size)]
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                # Each batch runs in a copy of this context, so its span nests under the current one
+                for embedded in [pool.submit(copy_context().run, self.embed_batch, *batch) for batch in batches]:
+                    vectors.update(embedded.result())
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> list[float]:
+        key = self.cache.key(self.model, QUERY, text)
+        vector = self.cache.get_many([key]).get(key)
+        cache_lookup("embedding", vector is not None)
+        if vector is None:
+            vector = self.call(self.embeddings.embed_query, text)
+            self.cache.put_many({key: vector})
+        return vector
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Local, deterministic stand-in for a hosted embedding model: a hashed bag of words, so texts
+    sharing words are close. Counts the texts it embeds; every call takes `latency` seconds.
+    """
+    def __init__(self, dimension: int = 768, latency: float = 0.0):
+        self.model = f"fake-{dimension}"
+        self.dimension = dimension
+        self.latency = latency
+        self.calls = 0
+        self.texts = 0
+
+    def embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimension] += 1.0 if digest[4] & 1 else -1.0
+        norm = sum(v * v for v in vector) ** 0.5 or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        self.texts += len(texts)
+        if self.latency:
+            time.sleep(self.latency)
+        return [self.embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
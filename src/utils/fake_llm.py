@@ -0,0 +1,124 @@
+import asyncio
+import re
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+WORD_PATTERN = re.compile(r"\w+")
+# A query with one of these words, or naming a model like C32 or CAT-032, needs the manuals
+MANUAL_WORDS = frozenset(["manual", "manuals", "characteristic", "characteristics", "weight", "service", "interval",
+                          "maintenance", "specification", "specifications", "oil", "pressure", "temperature",
+                          "torque"])
+MODEL_CODE = re.compile(r"\b[a-z]+-?\d+[a-z0-9-]*\b")
+# A query with one of these words needs the data of an organization
+ORGANIZATION_WORDS = frozenset(["organization", "organizations", "fleet", "fleets", "vessel", "vessels", "equipment",
+                                "equipments", "list", "company"])
+
+def words(text: str) -> set[str]:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+def plan(query: str) -> list[dict]:
+    """Tools for the query in the order the planner prompt asks for: organization data, manuals, summary."""
+    query_words = words(query)
+    tools = []
+    if query_words & ORGANIZATION_WORDS:
+        tools.append(("extract_organization_level_data", "the query asks about the data of an organization"))
+    if query_words & MANUAL_WORDS or MODEL_CODE.search(query.lower()):
+        tools.append(("extract_from_manual", "the query asks about the characteristics of an equipment"))
+    tools.append(("summarize", "the answer is summarized for the user"))
+    return [{"order": order, "tool": tool, "reason_it_was_chosen": reason}
+            for order, (tool, reason) in enumerate(tools, 1)]
+
+def best_match(query: str, candidates: list, name=str):
+    """The candidate sharing the most words with the query, the first one on a tie."""
+    query_words = words(query)
+    return max(candidates, key=lambda candidate: len(words(name(candidate)) & query_words), default=None)
+
+##################################
+# FAKE CHAT MODEL                #
+##################################
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic, offline stand-in for the chat model. Answers after `latency` seconds with the first
+    `answer_words` words of the last message, generated one word every `token_latency` seconds and
+    streamed when asked to. Structured outputs are filled from the prompt: a plan by the words of the
+    query, the manual index and the organization sharing the most words with it, and defaults otherwise.
+    """
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer_words: int = 40
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def answer(self, messages) -> list[str]:
+        self.calls += 1
+        answer = str(messages[-1].content).split()[:self.answer_words]
+        return [f"{word} " if i < len(answer) - 1 else word for i, word in enumerate(answer)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self.answer(messages)
+        time.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        tokens = self.answer(messages)
+        await asyncio.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self.answer(messages)
+        time.sleep(self.latency)
+        for token in tokens:
+            time.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tokens = self.answer(messages)
+        await asyncio.sleep(self.latency)
+        for token in tokens:
+            await asyncio.sleep(self.token_latency)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token))
+            if run_manager:
+                await run_manager.on_llm_new_token(token, chunk=chunk)
+            yield chunk
+
+    def structured(self, schema, prompt):
+        self.calls += 1
+        messages = self._convert_input(prompt).to_messages()
+        query, instructions = str(messages[-1].content), str(messages[0].content)
+        fields = schema.model_fields
+        if "steps" in fields:
+            return schema(steps=plan(query))
+        if "equipment_name" in fields:
+            # The system prompt lists the manual indexes to choose from
+            indexes = re.findall(r"'([^']+)'", instructions.split("selected from", 1)[-1].split("]", 1)[0])
+            return schema(equipment_name=best_match(query, indexes) or "", keywords=query)
+        if {"name", "id"} <= set(fields):
+            organizations = re.findall(r"'organization_id': (\d+), 'name': '([^']*)'", instructions)
+            organization_id, name = best_match(query, organizations, name=lambda o: o[1]) or (0, "")
+            return schema(name=name, id=int(organization_id))
+        defaults = {str: "", int: 0, float: 0.0, bool: False, list: []}
+        return schema(**{name: defaults.get(getattr(field.annotation, "__origin__", field.annotation))
+                         for name, field in fields.items() if field.is_required()})
+
+    def with_structured_output(self, schema, **kwargs):
+        def answer(prompt):
+            time.sleep(self.latency)
+            return self.structured(schema, prompt)
+
+        async def aanswer(prompt):
+            await asyncio.sleep(self.latency)
+            return self.structured(schema, prompt)
+        return RunnableLambda(answer, aanswer)
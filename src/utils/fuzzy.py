@@ -0,0 +1,61 @@
+import math
+import os
+
+from utils.retrieval import tokenize
+
+NAME_MATCH_THRESHOLD = float(os.getenv('NAVEXA_NAME_MATCH_THRESHOLD', 0.6))
+NAME_MATCH_MARGIN = float(os.getenv('NAVEXA_NAME_MATCH_MARGIN', 0.15))
+# Words less similar than this are different words, not typos
+SIMILAR_WORDS = 0.5
+# Words that say nothing about which organization is meant
+GENERIC_WORDS = frozenset(["co", "inc", "ltd", "llc", "plc", "corp", "company", "group", "the", "and", "of"])
+
+def trigrams(word: str) -> set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def trigram_similarity(a: str, b: str) -> float:
+    """Dice coefficient of the letter trigrams of two words, 1.0 for equal words; tolerates typos."""
+    ta, tb = trigrams(a), trigrams(b)
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+##################################
+# NAME MATCHER                   #
+##################################
+class NameMatcher:
+    """
+    Finds which of a few names a free text query mentions. Every word of a name scores its best trigram
+    similarity to a word of the query, weighted by how rare the word is among the names, so "Maritime"
+    picks "Maritime Shipping Co." while "Shipping" alone, shared by several names, does not. A name's
+    score adds up its words found in the query; the best name wins when it scores at least `threshold`
+    and beats the runner-up by `margin`, otherwise the query is ambiguous.
+    """
+    def __init__(self, names: dict, threshold: float = NAME_MATCH_THRESHOLD, margin: float = NAME_MATCH_MARGIN):
+        self.threshold = threshold
+        self.margin = margin
+        self.words = {key: {w for w in tokenize(name) if w not in GENERIC_WORDS and len(w) > 2}
+                      for key, name in names.items()}
+        frequency = {}
+        for words in self.words.values():
+            for word in words:
+                frequency[word] = frequency.get(word, 0) + 1
+        idf = {word: math.log(1 + len(self.words) / count) for word, count in frequency.items()}
+        top = max(idf.values(), default=1.0)
+        self.weights = {word: value / top for word, value in idf.items()}
+
+    def scores(self, query: str) -> dict:
+        terms = {t for t in tokenize(query) if len(t) > 2}
+        scores = {}
+        for key, words in self.words.items():
+            similarities = {word: max((trigram_similarity(word, t) for t in terms), default=0.0) for word in words}
+            scores[key] = sum(self.weights[w] * s for w, s in similarities.items() if s >= SIMILAR_WORDS)
+        return scores
+
+    def match(self, query: str):
+        """Key of the name the query mentions, or None when no name or more than one fits."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        if not ranked or ranked[0][1] < self.threshold:
+            return None
+        if len(ranked) > 1 and ranked[0][1] - ranked[1][1] < self.margin:
+            return None
+        return ranked[0][0]
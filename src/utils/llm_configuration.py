@@ -1,37 +1,69 @@
 import os
+from typing import TYPE_CHECKING
 
-from langchain_ollama import ChatOllama
-from langchain_google_genai import GoogleGenerativeAIEmbeddings, ChatGoogleGenerativeAI
 from dotenv import load_dotenv
-from langgraph.graph.graph import CompiledGraph
+from utils.embeddings import FakeEmbeddings
+
+if TYPE_CHECKING:
+    from langgraph.graph.graph import CompiledGraph
 
 load_dotenv()
 
 class LLMConfiguration:
+    # Tokens of context handed from one step to the next
+    context_tokens = 2000
+    # US dollars per million prompt and completion tokens, for the cost metrics
+    prompt_token_price = 0.0
+    completion_token_price = 0.0
+
     def get_llm(self, **configuration):
         pass
 
     def get_embeddings(self):
         pass
 
-    def draw_graph(self, graph: CompiledGraph, filename_without_extension: str):
+    def draw_graph(self, graph: "CompiledGraph", filename_without_extension: str):
         graph.get_graph().draw_png(f"{filename_without_extension}.png")
 
 
 class GoogleLLMConfiguration(LLMConfiguration):
+    context_tokens = 4000
+    prompt_token_price = 1.25
+    completion_token_price = 5.0
+
     def __init__(self):
         os.environ["GOOGLE_API_KEY"] = os.getenv("GOOGLE_API_KEY")
 
+    # Provider packages are imported on first use, each one costs ~0.5s of start up
     def get_llm(self, **configuration):
+        from langchain_google_genai import ChatGoogleGenerativeAI
         return ChatGoogleGenerativeAI(model="gemini-1.5-pro", **configuration)
 
     def get_embeddings(self):
+        from langchain_google_genai import GoogleGenerativeAIEmbeddings
         return GoogleGenerativeAIEmbeddings(model="models/embedding-001")
 
 
 class OllamaLLMConfiguration(LLMConfiguration):
+    context_tokens = 1000  # of the 2048 tokens Ollama gives a model by default
+
     def get_llm(self, **configuration):
+        from langchain_ollama import ChatOllama
         return ChatOllama(model="llama3.2:1b", **configuration)
 
+class FakeLLMConfiguration(LLMConfiguration):
+    """Offline, deterministic chat model and embeddings for tests and benchmarks, with simulated latency."""
+    def __init__(self, latency: float = 0.0, token_latency: float = 0.0, embedding_latency: float = 0.0):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.embedding_latency = embedding_latency
+
+    def get_llm(self, **configuration):
+        from utils.fake_llm import FakeChatModel
+        return FakeChatModel(latency=self.latency, token_latency=self.token_latency, **configuration)
+
+    def get_embeddings(self):
+        return FakeEmbeddings(latency=self.embedding_latency)
+
 class DefaultLLMConfiguration(GoogleLLMConfiguration):
     pass
\ No newline at end of file
@@ -0,0 +1,115 @@
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+PLAN_THRESHOLD = float(os.getenv('NAVEXA_PLAN_THRESHOLD', 0.85))
+PLAN_AGREEMENT = float(os.getenv('NAVEXA_PLAN_AGREEMENT', 0.8))
+PLAN_NEIGHBOURS = int(os.getenv('NAVEXA_PLAN_NEIGHBOURS', 5))
+PLAN_EXAMPLES = int(os.getenv('NAVEXA_PLAN_EXAMPLES', 2000))
+
+ORGANIZATION_MANUAL_SUMMARY = ("extract_organization_level_data", "extract_from_manual", "summarize")
+MANUAL_SUMMARY = ("extract_from_manual", "summarize")
+SUMMARY = ("summarize",)
+
+# Known queries of every plan shape, so the classifier answers before it has seen any LLM plan
+SEED_PLANS = {
+    "I want to get the name, model number and manufacturer of all the equipments of Company Cochin Shipping Inc.": ORGANIZATION_MANUAL_SUMMARY,
+    "list equipments for Maritime": ORGANIZATION_MANUAL_SUMMARY,
+    "What are the service intervals of the engines of Maritime": ORGANIZATION_MANUAL_SUMMARY,
+    "I want to get the description of CAT C-32": MANUAL_SUMMARY,
+    "service interval of the C32": MANUAL_SUMMARY,
+    "What is the weight of the Wartsila RT-flex82C": MANUAL_SUMMARY,
+    "hello": SUMMARY,
+    "what can you do": SUMMARY,
+}
+
+def normalize_intent(query: str) -> str:
+    """Lowercase words of the query, so punctuation, case and spacing do not make a new plan."""
+    return " ".join(re.findall(r"\w+(?:[.\-/]\w+)*", query.lower()))
+
+##################################
+# PLAN CLASSIFIER                #
+##################################
+class PlanClassifier:
+    """
+    Predicts the tool order of a query from the plans of earlier queries. A query whose normalized
+    intent was planned before gets that plan; otherwise its `neighbours` nearest earlier queries with a
+    cosine similarity of at least `threshold` vote, weighted by similarity, and the plan wins when it
+    holds at least `agreement` of the vote. Anything less confident is left to the LLM planner.
+    """
+    def __init__(self, embeddings: Embeddings, threshold: float = PLAN_THRESHOLD, agreement: float = PLAN_AGREEMENT,
+                 neighbours: int = PLAN_NEIGHBOURS, max_examples: int = PLAN_EXAMPLES, seeds: dict = SEED_PLANS):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.agreement = agreement
+        self.neighbours = neighbours
+        self.max_examples = max_examples
+        self.plans: dict[str, tuple[str, ...]] = {}  # normalized intent -> tools, oldest first
+        self.vectors: dict[str, np.ndarray] = {}
+        self.matrix = None  # (intents, stacked vectors), rebuilt after learning
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        if seeds:
+            self.learn_many(seeds)
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        vectors = np.asarray(self.embeddings.embed_documents(texts), dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def learn_many(self, plans: dict[str, tuple[str, ...]]):
+        intents = {normalize_intent(query): tuple(tools) for query, tools in plans.items()}
+        intents = {intent: tools for intent, tools in intents.items() if intent and tools}
+        vectors = self.embed(list(intents)) if intents else []
+        with self.lock:
+            for (intent, tools), vector in zip(intents.items(), vectors):
+                self.plans.pop(intent, None)
+                self.plans[intent] = tools
+                self.vectors[intent] = vector
+            while len(self.plans) > self.max_examples:
+                oldest = next(iter(self.plans))
+                del self.plans[oldest], self.vectors[oldest]
+            self.matrix = None
+
+    def learn(self, query: str, tools: list[str]):
+        """Remembers the plan the LLM made for the query."""
+        self.learn_many({query: tuple(tools)})
+
+    def predict(self, query: str) -> tuple[tuple[str, ...] | None, float]:
+        """The predicted tool order and its confidence, or None when the LLM should plan."""
+        intent = normalize_intent(query)
+        with self.lock:
+            if intent in self.plans:
+                self.counts["exact"] += 1
+                return self.plans[intent], 1.0
+        vector = self.embed([intent])[0]
+        with self.lock:
+            if self.matrix is None and self.plans:
+                intents = list(self.plans)
+                self.matrix = (intents, np.stack([self.vectors[i] for i in intents]))
+            if self.matrix is None:
+                self.counts["fallbacks"] += 1
+                return None, 0.0
+            intents, matrix = self.matrix
+            similarities = matrix @ vector
+            nearest = np.argsort(-similarities)[:self.neighbours]
+            votes = Counter()
+            for i in nearest:
+                if similarities[i] >= self.threshold:
+                    votes[self.plans[intents[i]]] += float(similarities[i])
+            if votes:
+                tools, weight = votes.most_common(1)[0]
+                confidence = weight / sum(votes.values())
+                if confidence >= self.agreement:
+                    self.counts["neighbours"] += 1
+                    return tools, confidence
+            self.counts["fallbacks"] += 1
+            return None, 0.0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {**{k: self.counts[k] for k in ("exact", "neighbours", "fallbacks")}, "examples": len(self.plans)}
@@ -0,0 +1,118 @@
+import copy
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+RESPONSE_CACHE_THRESHOLD = float(os.getenv('NAVEXA_RESPONSE_CACHE_THRESHOLD', 0.95))
+RESPONSE_CACHE_SIZE = int(os.getenv('NAVEXA_RESPONSE_CACHE_SIZE', 1000))
+RESPONSE_CACHE_TTL = float(os.getenv('NAVEXA_RESPONSE_CACHE_TTL', 3600))
+
+
+class CacheEntry:
+    __slots__ = ("query", "vector", "response", "scope", "version", "expires_at")
+
+    def __init__(self, query, vector, response, scope, version, expires_at):
+        self.query = query
+        self.vector = vector
+        self.response = response
+        self.scope = scope
+        self.version = version
+        self.expires_at = expires_at
+
+
+##################################
+# SEMANTIC RESPONSE CACHE        #
+##################################
+class SemanticCache:
+    """
+    Workflow responses keyed by query embedding. A query hits when an earlier query of the same scope
+    (organization) has a cosine similarity of at least `threshold`. Entries expire after `ttl`
+    seconds, the least recently used go first beyond `max_entries`, and an entry is dropped when
+    version() (e.g. the version of the manuals the answers come from) no longer returns what it did
+    when the entry was stored.
+    """
+    def __init__(self, embeddings: Embeddings, threshold: float = RESPONSE_CACHE_THRESHOLD,
+                 max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL, version=lambda: None,
+                 timer=time.monotonic):
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.version = version
+        self.timer = timer
+        self.entries: OrderedDict[int, CacheEntry] = OrderedDict()  # least recently used first
+        self.scopes: dict[str, dict[int, CacheEntry]] = {}
+        self.matrices: dict[str, tuple[list[int], np.ndarray]] = {}  # stacked vectors of a scope, rebuilt on change
+        self.next_id = 0
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def scope_key(scope: str) -> str:
+        return (scope or "").strip().lower()
+
+    def embed(self, query: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def remove(self, entry_id: int, reason: str):
+        entry = self.entries.pop(entry_id)
+        del self.scopes[entry.scope][entry_id]
+        self.matrices.pop(entry.scope, None)
+        self.counts[reason] += 1
+
+    def lookup(self, query: str, scope: str = ""):
+        """The cached response of the most similar earlier query of the scope, or None."""
+        vector = self.embed(query)
+        scope = self.scope_key(scope)
+        version = self.version()
+        now = self.timer()
+        with self.lock:
+            for entry_id, entry in list(self.scopes.get(scope, {}).items()):
+                if entry.expires_at <= now:
+                    self.remove(entry_id, "expirations")
+                elif entry.version != version:
+                    self.remove(entry_id, "invalidations")
+            if scope not in self.matrices and self.scopes.get(scope):
+                ids = list(self.scopes[scope])
+                self.matrices[scope] = (ids, np.stack([self.scopes[scope][i].vector for i in ids]))
+            if scope in self.matrices:
+                ids, matrix = self.matrices[scope]
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.entries.move_to_end(ids[best])
+                    self.counts["hits"] += 1
+                    return copy.deepcopy(self.entries[ids[best]].response)
+            self.counts["misses"] += 1
+            return None
+
+    def store(self, query: str, response, scope: str = ""):
+        vector = self.embed(query)
+        scope = self.scope_key(scope)
+        entry = CacheEntry(query, vector, copy.deepcopy(response), scope, self.version(), self.timer() + self.ttl)
+        with self.lock:
+            entry_id, self.next_id = self.next_id, self.next_id + 1
+            self.entries[entry_id] = entry
+            self.scopes.setdefault(scope, {})[entry_id] = entry
+            self.matrices.pop(scope, None)
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)), "evictions")
+
+    def invalidate(self, scope: str = None):
+        """Drops the entries of one organization, e.g. after its data changed, or every entry."""
+        with self.lock:
+            for entry_id, entry in list(self.entries.items()):
+                if scope is None or entry.scope == self.scope_key(scope):
+                    self.remove(entry_id, "invalidations")
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.counts["hits"] + self.counts["misses"]
+            return {**{k: self.counts[k] for k in ("hits", "misses", "evictions", "expirations", "invalidations")},
+                    "entries": len(self.entries), "hit_ratio": self.counts["hits"] / lookups if lookups else 0.0}
@@ -0,0 +1,304 @@
+import bisect
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Finished spans are appended to this file as JSON lines, for a collector to pick up; unset keeps none
+TRACE_FILE = os.getenv('NAVEXA_TRACE_FILE')
+# Longest SQL statement kept on a database span
+STATEMENT_LENGTH = 200
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+##################################
+# METRICS                        #
+##################################
+def label_text(labels: tuple) -> str:
+    return ",".join(f'{name}="{value}"' for name, value in labels)
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            lines.extend(f"{self.name}{{{label_text(key)}}} {value}" for key, value in sorted(self.values.items()))
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: tuple = SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.values = {}
+        """counts per bucket, then the sum and the count of the observations, by labels"""
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total, count = self.values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                counts[position] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels) -> int:
+        return self.values.get(tuple(sorted(labels.items())), (None, 0.0, 0))[2]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total, count) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{{{label_text(key + (("le", bound),))}}} {cumulative}')
+                lines.append(f'{self.name}_bucket{{{label_text(key + (("le", "+Inf"),))}}} {count}')
+                lines.append(f"{self.name}_sum{{{label_text(key)}}} {total}")
+                lines.append(f"{self.name}_count{{{label_text(key)}}} {count}")
+        return lines
+
+span_seconds = Histogram("navexa_span_duration_seconds", "Wall time of graph nodes, tools, LLM, embedding, "
+                                                          "vector search, API and database calls.")
+span_errors = Counter("navexa_span_errors_total", "Spans that ended with an exception.")
+llm_tokens = Counter("navexa_llm_tokens_total", "Tokens sent to and generated by the LLM.")
+llm_cost = Counter("navexa_llm_cost_usd_total", "Estimated LLM cost in US dollars, at the configured prices.")
+cache_requests = Counter("navexa_cache_requests_total", "Cache lookups by cache and result, hit or miss.")
+retries = Counter("navexa_retries_total", "Calls retried after a failure.")
+METRICS = [span_seconds, span_errors, llm_tokens, llm_cost, cache_requests, retries]
+
+def render_metrics() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    return "\n".join(line for metric in METRICS for line in metric.render()) + "\n"
+
+def cache_lookup(cache: str, hit: bool, count: int = 1):
+    if count:
+        cache_requests.inc(count, cache=cache, result="hit" if hit else "miss")
+
+##################################
+# SPANS                          #
+##################################
+current_span = contextvars.ContextVar("current_span", default=None)
+exporters = []
+"""callables given every finished span as a dict; the trace file is one of them when NAVEXA_TRACE_FILE is set"""
+
+class Span:
+    """An OpenTelemetry style span: a timed operation of a trace with attributes and a parent."""
+    def __init__(self, name: str, kind: str, parent: "Span" = None, **attributes):
+        self.name = name
+        self.kind = kind
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = {key: value for key, value in attributes.items() if value is not None}
+        self.status = "OK"
+        self.start_time = time.time_ns()
+        self.began = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update({key: value for key, value in attributes.items() if value is not None})
+
+    def end(self, error: BaseException = None):
+        seconds = time.perf_counter() - self.began
+        if error is not None:
+            self.status = "ERROR"
+            self.attributes["exception"] = f"{type(error).__name__}: {error}"
+            span_errors.inc(kind=self.kind, name=self.name)
+        span_seconds.observe(seconds, kind=self.kind, name=self.name)
+        finished = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent.span_id if self.parent else None,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start_time,
+            "end_time_unix_nano": self.start_time + int(seconds * 1e9),
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+        for export in exporters:
+            export(finished)
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes):
+    """Times the block as a child of the current span, which it is while the block runs."""
+    previous = current_span.get()
+    started = Span(name, kind, previous, **attributes)
+    current_span.set(started)
+    try:
+        yield started
+    except BaseException as e:
+        started.end(e)
+        raise
+    else:
+        started.end()
+    finally:
+        current_span.set(previous)
+
+class FileExporter:
+    """Appends finished spans as JSON lines."""
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, finished: dict):
+        line = json.dumps(finished, default=str) + "\n"
+        with self.lock, open(self.path, "a") as file:
+            file.write(line)
+
+if TRACE_FILE:
+    exporters.append(FileExporter(TRACE_FILE))
+
+##################################
+# LANGCHAIN CALLBACKS            #
+##################################
+class TelemetryCallback(BaseCallbackHandler):
+    """
+    Spans for the runs of a graph invocation: the graph, its nodes, the tools and the LLM calls, each
+    a child of the span of the nearest traced run above it. Other chains, like prompts and parsers,
+    are not traced. While a run is traced its span is the current one, so embedding, vector search
+    and database spans opened inside it nest under it. LLM spans count the prompt and completion
+    tokens, reported by the model or else approximated, and their cost.
+    """
+    run_inline = True
+
+    def __init__(self):
+        self.spans = {}
+        """the span of every run, or the span of the nearest traced run above it"""
+        self.traced = set()
+
+    def start(self, run_id, parent_run_id, name: str = None, kind: str = None, **attributes):
+        parent = self.spans.get(parent_run_id) or current_span.get()
+        if name is None:
+            self.spans[run_id] = parent
+            return
+        self.spans[run_id] = Span(name, kind, parent, **attributes)
+        self.traced.add(run_id)
+        current_span.set(self.spans[run_id])
+
+    def finish(self, run_id, error: BaseException = None, **attributes):
+        started = self.spans.pop(run_id, None)
+        if run_id not in self.traced:
+            return
+        self.traced.discard(run_id)
+        started.set(**attributes)
+        started.end(error)
+        current_span.set(started.parent)
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        name = kwargs.get("name")
+        if parent_run_id is None:
+            self.start(run_id, parent_run_id, name or "graph", "graph")
+        elif metadata and name == metadata.get("langgraph_node") and name != "__start__":
+            self.start(run_id, parent_run_id, name, "node")
+        else:
+            self.start(run_id, parent_run_id)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        self.start(run_id, parent_run_id, serialized.get("name", "tool"), "tool")
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self.finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id, error)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs):
+        from utils.context import count_tokens
+        self.start(run_id, parent_run_id, llm_model(serialized, kwargs), "llm",
+                   prompt_tokens=sum(count_tokens(prompt) for prompt in prompts))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+        from utils.context import count_tokens
+        self.start(run_id, parent_run_id, llm_model(serialized, kwargs), "llm",
+                   prompt_tokens=sum(count_tokens(str(m.content)) for batch in messages for m in batch))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        from utils.clients import get_llm_configuration
+        from utils.context import count_tokens
+        started = self.spans[run_id]
+        prompt_tokens, completion_tokens = started.attributes["prompt_tokens"], 0
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    prompt_tokens, completion_tokens = usage["input_tokens"], completion_tokens + usage["output_tokens"]
+                else:
+                    completion_tokens += count_tokens(generation.text)
+        model = started.name
+        configuration = get_llm_configuration()
+        cost = (prompt_tokens * configuration.prompt_token_price
+                + completion_tokens * configuration.completion_token_price) / 1e6
+        llm_tokens.inc(prompt_tokens, model=model, type="prompt")
+        llm_tokens.inc(completion_tokens, model=model, type="completion")
+        llm_cost.inc(cost, model=model)
+        self.finish(run_id, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, cost_usd=cost)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self.finish(run_id, error)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        started = self.spans.get(run_id)
+        retries.inc(operation=started.kind if started else "llm")
+
+def llm_model(serialized: dict, kwargs: dict) -> str:
+    parameters = kwargs.get("invocation_params") or {}
+    return str(parameters.get("model") or parameters.get("model_name") or (serialized or {}).get("name") or "unknown")
+
+def telemetry_config() -> dict:
+    """Config for a graph invocation, tracing it under the current span."""
+    return {"callbacks": [TelemetryCallback()]}
+
+##################################
+# DATABASE                       #
+##################################
+def instrument_database():
+    """Database spans for every statement of every SQLAlchemy engine, registered once."""
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    if event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    event.listen(Engine, "handle_error", handle_error)
+
+def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    context._navexa_span = Span(statement.split(None, 1)[0].upper() if statement.strip() else "SQL", "db",
+                                current_span.get(), statement=statement[:STATEMENT_LENGTH],
+                                database=connection.engine.dialect.name)
+
+def after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_navexa_span", None)
+    if started is not None:
+        started.end()
+        context._navexa_span = None
+
+def handle_error(exception_context):
+    started = getattr(exception_context.execution_context, "_navexa_span", None)
+    if started is not None:
+        started.end(exception_context.original_exception)
+        exception_context.execution_context._navexa_span = None
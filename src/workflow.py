@@ -1,50 +1,245 @@
-from langgraph.constants import END
-from langgraph.graph import StateGraph
-from langgraph.graph.graph import CompiledGraph
-
-from common import WorkflowState
-from tools.executor import execute_tool
-from tools.query_rewrite import multi_query_rewrite
-from utils.vector_db_configuration import DefaultVectorStoreConfiguration as VectorStoreConfiguration
-from utils.llm_configuration import GoogleLLMConfiguration as LLMConfiguration
-
-vector_store_config = VectorStoreConfiguration()
-configuration = LLMConfiguration()
-embeddings = configuration.get_embeddings()
-llm = configuration.get_llm()
-indexes = vector_store_config.get_indexes()
+import asyncio
+import os
+from typing import TYPE_CHECKING, Dict, List
+
+from common import ANSWER_TAG, Step, WorkflowState
+from tools.executor import LAST_STEP_TAG, aexecute_tool, execute_tool
+from tools.query_rewrite import amulti_query_rewrite, multi_query_rewrite
+from utils.clients import get_embeddings, get_llm_configuration, get_vector_store_config, registry
+from utils.context import assemble_context
+from utils.response_cache import SemanticCache
+from utils.telemetry import cache_lookup, span, telemetry_config
+
+if TYPE_CHECKING:
+    from langgraph.graph.graph import CompiledGraph
 
 PNG_GRAPH = "output"
+DRAW_GRAPH = os.getenv('NAVEXA_DRAW_GRAPH', '0') == '1'
 DECIPHER: str = "__decipher__"
 EXECUTE_STEP: str = "__execute_step__"
+COLLECT: str = "__collect__"
 SEND_ALERT: str = "__send_alert__"
 
+def dependencies(steps: List[Step]) -> Dict[int, List[int]]:
+    """Indices of the steps each step waits for; a step without depends_on waits for the step ordered before it."""
+    by_order = sorted(range(len(steps)), key=lambda i: steps[i].order)
+    index_of = {}
+    for i in by_order:
+        index_of.setdefault(steps[i].order, i)
+    waits_for = {}
+    for position, i in enumerate(by_order):
+        if steps[i].depends_on is None:
+            waits_for[i] = by_order[position - 1:position]
+        else:
+            waits_for[i] = [index_of[order] for order in steps[i].depends_on if order in index_of and index_of[order] != i]
+    return waits_for
+
+def step_event(state: WorkflowState, status: str, **fields):
+    """Writes the progress of the running step to the graph's custom stream, read by Workflow.stream."""
+    from langgraph.config import get_stream_writer
+    step = state["steps"][state["current_step"]]
+    get_stream_writer()({"event": "step", "status": status, "order": step.order, "tool": step.tool, **fields})
+
+def step_update(state: WorkflowState, result) -> dict:
+    update = {"results": {state["current_step"]: result}}
+    if isinstance(result, dict) and "prompt_tokens" in result:
+        update["prompt_tokens"] = {state["current_step"]: result["prompt_tokens"]}
+    step_event(state, "done", prompt_tokens=update.get("prompt_tokens", {}).get(state["current_step"]))
+    return update
+
 def execute_step(state: WorkflowState):
-    current_step = state.get("current_step", -1) + 1
-    execution_result = execute_tool(state)
-    return {"current_step": current_step, "output": execution_result}
-
-def perform_route(state: WorkflowState) -> str:
-    if state["current_step"] < len(state["steps"])-1:
-        return EXECUTE_STEP
-    else:
+    step_event(state, "started")
+    return step_update(state, execute_tool(state))
+
+async def aexecute_step(state: WorkflowState):
+    step_event(state, "started")
+    return step_update(state, await aexecute_tool(state))
+
+def collect(state: WorkflowState):
+    """Once every step ran, the output of the last step is the answer."""
+    steps, results = state["steps"], state.get("results") or {}
+    if steps and len(results) == len(steps):
+        return {"output": results[max(range(len(steps)), key=lambda i: steps[i].order)]}
+    return {}
+
+def perform_route(state: WorkflowState):
+    """Fans out every step whose dependencies are done as a parallel branch, or ends once all ran."""
+    from langgraph.constants import END
+    from langgraph.types import Send
+    steps, results = state["steps"], state.get("results") or {}
+    pending = [i for i in range(len(steps)) if i not in results]
+    if not pending:
         return END
+    waits_for = dependencies(steps)
+    ready = [i for i in pending if all(j in results for j in waits_for[i])]
+    if not ready:  # a dependency cycle, break it in step order
+        ready = [min(pending, key=lambda i: steps[i].order)]
+    return [Send(EXECUTE_STEP, {**state, "current_step": i,
+                                "output": assemble_context(state["query"], [results[j] for j in waits_for[i] if j in results])})
+            for i in ready]
+
+def build_graph() -> "CompiledGraph":
+    from langchain_core.runnables import RunnableLambda
+    from langgraph.graph import END, StateGraph
+
+    # Each node runs its sync function under invoke and its async one under ainvoke
+    builder = StateGraph(WorkflowState)
+    builder.add_node(DECIPHER, RunnableLambda(multi_query_rewrite, amulti_query_rewrite))
+    builder.add_node(EXECUTE_STEP, RunnableLambda(execute_step, aexecute_step))
+    builder.add_node(COLLECT, collect)
+
+    builder.set_entry_point(DECIPHER)
+    builder.add_edge(DECIPHER, COLLECT)
+    builder.add_edge(EXECUTE_STEP, COLLECT)
+    builder.add_conditional_edges(COLLECT, perform_route, [EXECUTE_STEP, END])
+
+    graph: "CompiledGraph" = builder.compile()
+    if DRAW_GRAPH:
+        get_llm_configuration().draw_graph(graph, PNG_GRAPH)
+    return graph
+
+registry.register("workflow_graph", build_graph)
+
+#############
+# STREAMING #
+#############
+STREAM_MODES = ["updates", "custom", "messages", "values"]
+
+def answer_text(output) -> str:
+    output = output.get("output", output) if isinstance(output, dict) else output
+    return str(getattr(output, "content", output))
+
+def stream_events(mode: str, chunk) -> list[dict]:
+    """
+    The client events of a chunk streamed by the graph: the plan once DECIPHER made it, the progress
+    the steps write, and the tokens of the last step's answer LLM call as they are generated.
+    """
+    if mode == "updates" and (chunk.get(DECIPHER) or {}).get("steps"):
+        return [{"event": "plan", "steps": [step.model_dump() for step in chunk[DECIPHER]["steps"]]}]
+    if mode == "custom":
+        return [chunk]
+    if mode == "messages":
+        message, metadata = chunk
+        answer = {ANSWER_TAG, LAST_STEP_TAG} <= set(metadata.get("tags", []))
+        if answer and isinstance(message.content, str) and message.content:
+            return [{"event": "token", "text": message.content}]
+    return []
+
+registry.register("response_cache",
+                  lambda: SemanticCache(get_embeddings(), version=lambda: get_vector_store_config().manuals_version()))
+# Scope of the answers to queries naming no organization, which are the same whoever asks
+GLOBAL_SCOPE = ""
+
+def cache_scope(query: str, organization: str = "") -> str | None:
+    """
+    The scope of the cached answers the query may reuse: the organization given, else the one the
+    query names, else GLOBAL_SCOPE. None, when the organizations can't be read, and the query neither
+    reuses nor leaves an answer.
+    """
+    if organization.strip():
+        return organization
+    from tools.api import get_organizations, match_organization
+    try:
+        organizations = get_organizations()
+    except Exception:
+        return None
+    if not isinstance(organizations, list):
+        return None
+    org_id = match_organization(query, organizations)
+    return next((org["name"] for org in organizations if org["organization_id"] == org_id), GLOBAL_SCOPE)
+
+async def acache_scope(query: str, organization: str = "") -> str | None:
+    if organization.strip():
+        return organization
+    from tools.api import aget_organizations
+    try:
+        await aget_organizations()  # cached for cache_scope
+    except Exception:
+        return None
+    return await asyncio.to_thread(cache_scope, query)
 
 class Workflow:
-    def create_graph(self) -> CompiledGraph:
-        builder = StateGraph(WorkflowState)
-        builder.add_node(DECIPHER, multi_query_rewrite)
-        builder.add_node(EXECUTE_STEP, execute_step)
+    def create_graph(self) -> "CompiledGraph":
+        """The compiled graph, built once per process and shared."""
+        return registry.get("workflow_graph")
+
+    def invoke(self, query: str, organization: str = "") -> dict:
+        """
+        Runs the graph for a query, unless a similar query of the same organization was answered
+        recently, in which case that answer is returned without any LLM call.
+        """
+        with span("workflow", "workflow", query=query, organization=organization):
+            response_cache: SemanticCache = registry.get("response_cache")
+            scope = cache_scope(query, organization)
+            response = None if scope is None else response_cache.lookup(query, scope)
+            cache_lookup("response", response is not None)
+            if response is None:
+                response = self.create_graph().invoke({"query": query}, config=telemetry_config())
+                if scope is not None:
+                    response_cache.store(query, response, scope)
+            return response
+
+    def stream(self, query: str, organization: str = ""):
+        """
+        invoke as a stream of events: "plan", "step" as each step starts and ends, "token" for every
+        token of the answer as the last step generates it, and finally "answer" with the whole answer.
+        A cached answer is only the "answer" event.
+        """
+        with span("workflow", "workflow", query=query, organization=organization, streamed=True):
+            response_cache: SemanticCache = registry.get("response_cache")
+            scope = cache_scope(query, organization)
+            response = None if scope is None else response_cache.lookup(query, scope)
+            cache_lookup("response", response is not None)
+            if response is not None:
+                yield {"event": "answer", "output": answer_text(response["output"]), "cached": True}
+                return
+            for mode, chunk in self.create_graph().stream({"query": query}, config=telemetry_config(),
+                                                          stream_mode=STREAM_MODES):
+                if mode == "values":
+                    response = chunk
+                yield from stream_events(mode, chunk)
+            if scope is not None:
+                response_cache.store(query, response, scope)
+            yield {"event": "answer", "output": answer_text(response["output"]), "cached": False}
+
+    async def astream(self, query: str, organization: str = ""):
+        """stream on the event loop."""
+        with span("workflow", "workflow", query=query, organization=organization, streamed=True):
+            response_cache: SemanticCache = registry.get("response_cache")
+            scope = await acache_scope(query, organization)
+            response = None if scope is None else await asyncio.to_thread(response_cache.lookup, query, scope)
+            cache_lookup("response", response is not None)
+            if response is not None:
+                yield {"event": "answer", "output": answer_text(response["output"]), "cached": True}
+                return
+            async for mode, chunk in self.create_graph().astream({"query": query}, config=telemetry_config(),
+                                                                 stream_mode=STREAM_MODES):
+                if mode == "values":
+                    response = chunk
+                for event in stream_events(mode, chunk):
+                    yield event
+            if scope is not None:
+                await asyncio.to_thread(response_cache.store, query, response, scope)
+            yield {"event": "answer", "output": answer_text(response["output"]), "cached": False}
 
-        builder.set_entry_point(DECIPHER)
-        builder.add_edge(DECIPHER, EXECUTE_STEP)
-        builder.add_conditional_edges(EXECUTE_STEP, perform_route)
+    async def ainvoke(self, query: str, organization: str = "") -> dict:
+        """invoke on the event loop; only the cache's embedding and similarity lookups use a worker thread."""
+        with span("workflow", "workflow", query=query, organization=organization):
+            response_cache: SemanticCache = registry.get("response_cache")
+            scope = await acache_scope(query, organization)
+            response = None if scope is None else await asyncio.to_thread(response_cache.lookup, query, scope)
+            cache_lookup("response", response is not None)
+            if response is None:
+                response = await self.create_graph().ainvoke({"query": query}, config=telemetry_config())
+                if scope is not None:
+                    await asyncio.to_thread(response_cache.store, query, response, scope)
+            return response
 
-        graph: CompiledGraph = builder.compile()
-        configuration.draw_graph(graph, PNG_GRAPH)
-        return graph
+    def draw_graph(self, filename_without_extension: str = PNG_GRAPH):
+        """Renders the graph to a PNG with graphviz."""
+        get_llm_configuration().draw_graph(self.create_graph(), filename_without_extension)
 
 if __name__ == "__main__":
-    workflow: CompiledGraph = Workflow().create_graph()
+    workflow: "CompiledGraph" = Workflow().create_graph()
     for c in workflow.invoke({"query": "Give me all the list of equipments and then from the user manual give me 2 characteristics for Maritime"}):
         print(c)
@@ -0,0 +1,112 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("NAVEXA_DATABASE_URI", "sqlite://")
+
+import numpy as np
+
+from analytics import BatchAnomalyDetector
+from analytics.batch_detector import detect, runs, rolling_zscore, THRESHOLD, RATE_OF_CHANGE, OUTLIER
+from api import app
+from models import db, Organization, Fleet, Vessel, Equipment, Sensor, SensorReading, SensorThreshold, AnomalyDetection, Alert
+
+START = datetime(2025, 1, 1)
+
+
+def series(*per_sensor):
+    """Builds sensor-sorted parallel arrays from one list of values per sensor, sampled at 1 Hz."""
+    sensor_index = np.concatenate([np.full(len(v), i) for i, v in enumerate(per_sensor)])
+    timestamps = np.concatenate([np.arange(len(v), dtype=float) for v in per_sensor])
+    values = np.concatenate([np.asarray(v, dtype=float) for v in per_sensor])
+    return sensor_index, timestamps, values
+
+
+class Test(unittest.TestCase):
+    def test_rolling_zscore_matches_naive_computation(self):
+        rng = np.random.default_rng(7)
+        sensor_index, _, values = series(rng.normal(80, 2, 50), rng.normal(1000, 5, 40))
+        z = rolling_zscore(sensor_index, values, window=10, min_periods=5)
+        for i in range(len(values)):
+            previous = [j for j in range(max(0, i - 10), i) if sensor_index[j] == sensor_index[i]]
+            if len(previous) < 5:
+                self.assertTrue(np.isnan(z[i]))
+            else:
+                window = values[previous]
+                self.assertAlmostEqual(z[i], (values[i] - window.mean()) / window.std(ddof=1), places=6)
+
+    def test_detect_flags_each_kind_per_sensor(self):
+        rng = np.random.default_rng(1)
+        temperature = rng.normal(80, 0.5, 200)
+        temperature[100:103] = 99  # above the 70-95 band
+        pressure = rng.normal(35, 0.1, 200)
+        pressure[150] = 39.5  # inside the 30-40 band, but a sudden jump and a statistical outlier
+        sensor_index, timestamps, values = series(temperature, pressure)
+        masks = detect(sensor_index, timestamps, values, np.array([70.0, 30.0]), np.array([95.0, 40.0]), rate_fraction=0.25)
+
+        starts, ends = runs(masks[THRESHOLD], sensor_index)
+        self.assertEqual(list(zip(starts, ends)), [(100, 102)])
+        self.assertIn(350, np.flatnonzero(masks[RATE_OF_CHANGE]))
+        self.assertIn(350, np.flatnonzero(masks[OUTLIER]))
+        self.assertFalse(masks[THRESHOLD][200:].any())
+
+    def test_runs_do_not_cross_sensors(self):
+        sensor_index = np.array([0, 0, 1, 1])
+        starts, ends = runs(np.array([False, True, True, False]), sensor_index)
+        self.assertEqual(list(zip(starts, ends)), [(1, 1), (2, 2)])
+
+
+class BatchDetectorTest(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        organization = Organization(name="Maritime Shipping Co.")
+        equipment = Equipment(type="Main Engine", vessel=Vessel(name="MS Oceanic", fleet=Fleet(name="Alpha", organization=organization)))
+        db.session.add(equipment)
+        db.session.flush()
+        self.equipment_id = equipment.equipment_id
+        sensor = Sensor(type="Temperature", equipment_id=equipment.equipment_id)
+        db.session.add(sensor)
+        db.session.flush()
+        db.session.add(SensorThreshold(sensor_id=sensor.sensor_id, min_value=65, max_value=90, context_conditions="Low load operation"))
+        db.session.add(SensorThreshold(sensor_id=sensor.sensor_id, min_value=70, max_value=95, context_conditions="Normal operation"))
+        for i in range(120):
+            value = 97 if 60 <= i < 65 else 80 + (i % 3) * 0.1
+            db.session.add(SensorReading(reading_id=i + 1, sensor_id=sensor.sensor_id, timestamp=START + timedelta(seconds=i), value=value))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_run_writes_one_anomaly_per_run(self):
+        written = BatchAnomalyDetector(db.session, rate_fraction=10).run(START, START + timedelta(hours=1))
+        anomalies = AnomalyDetection.query.filter(AnomalyDetection.type.like("%Threshold Breach")).all()
+        self.assertGreaterEqual(written, 1)
+        self.assertEqual(len(anomalies), 1)
+        self.assertEqual(anomalies[0].equipment_id, self.equipment_id)
+        self.assertEqual(anomalies[0].timestamp, START + timedelta(seconds=60))
+        self.assertIn("5 readings", anomalies[0].description)
+        self.assertIn("[70, 95]", anomalies[0].description)
+
+    def test_rerun_replaces_its_anomalies_but_keeps_the_alerted_ones(self):
+        streamed = AnomalyDetection(equipment_id=self.equipment_id, timestamp=START + timedelta(seconds=60),
+                                    type="Temperature Threshold Breach", severity="High")
+        db.session.add(streamed)
+        db.session.flush()
+        db.session.add(Alert(anomaly_id=streamed.anomaly_id, type="Anomaly", timestamp=START, status="Open"))
+        db.session.commit()
+        detector = BatchAnomalyDetector(db.session, rate_fraction=10)
+        written = detector.run(START, START + timedelta(hours=1))
+        self.assertEqual(detector.run(START, START + timedelta(hours=1)), written)
+        self.assertEqual(AnomalyDetection.query.count(), written + 1)
+        self.assertIsNotNone(db.session.get(AnomalyDetection, streamed.anomaly_id))
+
+    def test_run_outside_window_writes_nothing(self):
+        self.assertEqual(BatchAnomalyDetector(db.session).run(START - timedelta(days=2), START), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
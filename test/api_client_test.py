@@ -0,0 +1,48 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("NAVEXA_DATABASE_URI", "sqlite://")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import httpx
+
+from api import app
+from asgi import asgi_app
+from models import db, Organization
+from tools import api
+
+
+def asgi_client(asynchronous: bool = False):
+    return httpx.AsyncClient(transport=httpx.ASGITransport(asgi_app))
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        db.session.add(Organization(organization_id=1, name="Maritime Shipping Co.", type="Shipping"))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    @mock.patch.object(api, "new_api_client", asgi_client)
+    def test_async_calls_share_one_client_per_event_loop(self):
+        async def calls():
+            organizations = await api.acall_api_endpoint("api/organizations", host="http://navexa")
+            missing = await api.acall_api_endpoint("api/organization/2", host="http://navexa")
+            return organizations, missing, api.get_async_api_client()
+
+        organizations, missing, client = asyncio.run(calls())
+        self.assertEqual(organizations, [{"organization_id": 1, "name": "Maritime Shipping Co."}])
+        self.assertEqual(missing, {"error": "Failed to fetch data from api/organization/2, Status Code: 404"})
+        self.assertIsNot(asyncio.run(calls())[2], client)
+
+
+if __name__ == '__main__':
+    unittest.main()
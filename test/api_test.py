@@ -0,0 +1,192 @@
+import gzip
+import json
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("NAVEXA_DATABASE_URI", "sqlite://")
+
+from sqlalchemy import event
+
+from api import app, pick_resolution
+from models import db, Organization, Fleet, Vessel, Equipment, Component, Sensor, SensorReading, SensorReadingRollup1h
+
+FLEETS = 4
+VESSELS_PER_FLEET = 5
+EQUIPMENT_PER_VESSEL = 3
+COMPONENTS_PER_EQUIPMENT = 2
+READINGS_PER_SENSOR = 25
+START = datetime(2025, 1, 1)
+
+
+class QueryCounter:
+    """Counts the SQL statements issued against an engine while active."""
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._on_execute)
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        organization = Organization(name="Maritime Shipping Co.", type="Shipping")
+        for f in range(FLEETS):
+            fleet = Fleet(name=f"Fleet {f}", organization=organization)
+            for v in range(VESSELS_PER_FLEET):
+                vessel = Vessel(name=f"Vessel {f}-{v}", fleet=fleet)
+                for e in range(EQUIPMENT_PER_VESSEL):
+                    equipment = Equipment(type="Main Engine", model=f"C{e}", vessel=vessel)
+                    for c in range(COMPONENTS_PER_EQUIPMENT):
+                        Component(name=f"Part {c}", equipment=equipment)
+        db.session.add(organization)
+        db.session.flush()
+        equipment = organization.fleets[0].vessels[0].equipment[0]
+        reading_id = 0
+        for kind in ("Temperature", "Pressure"):
+            sensor = Sensor(type=kind, equipment_id=equipment.equipment_id)
+            for i in range(READINGS_PER_SENSOR):
+                # BIGINT keys are not autoincremented by SQLite
+                reading_id += 1
+                SensorReading(reading_id=reading_id, sensor=sensor, timestamp=START + timedelta(minutes=i), value=i)
+            db.session.add(sensor)
+        db.session.commit()
+        self.org_id = organization.organization_id
+        self.vessel_id = equipment.vessel_id
+        db.session.expunge_all()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_organization_tree_is_complete(self):
+        response = self.client.get(f"/api/organization/{self.org_id}")
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(len(body["fleets"]), FLEETS)
+        vessels = [v for f in body["fleets"] for v in f["vessels"]]
+        self.assertEqual(len(vessels), FLEETS * VESSELS_PER_FLEET)
+        equipment = [e for v in vessels for e in v["equipment"]]
+        self.assertEqual(len(equipment), FLEETS * VESSELS_PER_FLEET * EQUIPMENT_PER_VESSEL)
+        components = [c for e in equipment for c in e["components"]]
+        self.assertEqual(len(components), len(equipment) * COMPONENTS_PER_EQUIPMENT)
+
+    def test_organization_tree_query_count_is_bounded(self):
+        # organization + fleets + vessels + equipment + components
+        with QueryCounter(db.engine) as counter:
+            response = self.client.get(f"/api/organization/{self.org_id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertLessEqual(counter.count, 5)
+
+    def test_organization_not_found(self):
+        response = self.client.get("/api/organization/9999")
+        self.assertEqual(response.status_code, 404)
+
+    def test_operational_data_pages_cover_every_reading_once(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 7}
+            if cursor:
+                params["cursor"] = cursor
+            body = self.client.get(f"/api/operational_data/{self.vessel_id}", query_string=params).get_json()
+            self.assertLessEqual(len(body["sensor_readings"]), 7)
+            seen.extend(r["reading_id"] for r in body["sensor_readings"])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 2 * READINGS_PER_SENSOR)
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_operational_data_time_window_and_sensor_filter(self):
+        params = {
+            "from": (START + timedelta(minutes=5)).isoformat(),
+            "to": (START + timedelta(minutes=10)).isoformat(),
+            "sensor_id": 1,
+        }
+        body = self.client.get(f"/api/operational_data/{self.vessel_id}", query_string=params).get_json()
+        self.assertEqual(len(body["sensor_readings"]), 5)
+        self.assertTrue(all(r["sensor_id"] == 1 for r in body["sensor_readings"]))
+
+    def test_operational_data_ndjson_stream(self):
+        response = self.client.get(f"/api/operational_data/{self.vessel_id}", query_string={"format": "ndjson"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual(len(lines), 2 * READINGS_PER_SENSOR)
+        timestamps = [line["timestamp"] for line in lines]
+        self.assertEqual(timestamps, sorted(timestamps))
+
+    def test_operational_data_rejects_bad_parameters(self):
+        response = self.client.get(f"/api/operational_data/{self.vessel_id}", query_string={"from": "yesterday"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_ingest_rejects_undecodable_bodies(self):
+        line = b'{"sensor_id": 1, "timestamp": "2025-02-01T00:00:00", "value": 1}\n'
+        truncated = gzip.compress(line * 1000)[:-20]
+        for body, headers in [(truncated, {'Content-Encoding': 'gzip'}),
+                              (b'not gzip at all', {'Content-Encoding': 'gzip'}),
+                              (line + b'{"sensor_id": 1, "quality_indicator": "\xff"}\n', {})]:
+            response = self.client.post('/api/sensor_readings/bulk', data=body,
+                                        headers={'Content-Type': 'application/x-ndjson', **headers})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("Unreadable body", response.get_json()['error'])
+        self.assertEqual(SensorReading.query.count(), 2 * READINGS_PER_SENSOR)
+
+    def test_auto_resolution_picks_finest_rollup_within_limit(self):
+        self.assertEqual(pick_resolution("auto", START, START + timedelta(minutes=30), 1000), "1m")
+        self.assertEqual(pick_resolution("auto", START, START + timedelta(days=30), 1000), "1h")
+        self.assertEqual(pick_resolution("auto", START, START + timedelta(days=365), 1000), "1d")
+        self.assertEqual(pick_resolution("auto", START, START + timedelta(days=3650), 100), "1d")
+        self.assertEqual(pick_resolution("raw"), "raw")
+        with self.assertRaises(ValueError):
+            pick_resolution("auto")
+        with self.assertRaises(ValueError):
+            pick_resolution("5s")
+
+    def test_operational_data_from_rollups(self):
+        # 24 hourly buckets per sensor, normally maintained by the sensor_reading trigger
+        for sensor_id in (1, 2):
+            for hour in range(24):
+                db.session.add(SensorReadingRollup1h(sensor_id=sensor_id, bucket=START + timedelta(hours=hour),
+                                                     reading_count=4, mean=10.0, m2=12.0, min_value=8.0, max_value=12.0))
+        db.session.commit()
+        params = {"from": START.isoformat(), "to": (START + timedelta(days=1)).isoformat(), "resolution": "auto", "limit": 30}
+        body = self.client.get(f"/api/operational_data/{self.vessel_id}", query_string=params).get_json()
+        self.assertEqual(body["resolution"], "1h")
+        self.assertNotIn("sensor_readings", body)
+        self.assertEqual(len(body["sensor_aggregates"]), 30)
+        self.assertEqual(body["sensor_aggregates"][0]["stddev"], 2.0)
+
+        body = self.client.get(f"/api/operational_data/{self.vessel_id}",
+                               query_string={**params, "cursor": body["next_cursor"]}).get_json()
+        self.assertEqual(len(body["sensor_aggregates"]), 18)
+        self.assertIsNone(body["next_cursor"])
+
+    def test_rollups_start_with_the_bucket_holding_from(self):
+        for hour in range(3):
+            db.session.add(SensorReadingRollup1h(sensor_id=1, bucket=START + timedelta(hours=hour),
+                                                 reading_count=4, mean=10.0, m2=12.0, min_value=8.0, max_value=12.0))
+        db.session.commit()
+        params = {"from": (START + timedelta(minutes=30)).isoformat(), "to": (START + timedelta(hours=2)).isoformat(),
+                  "resolution": "1h", "sensor_id": 1}
+        body = self.client.get(f"/api/operational_data/{self.vessel_id}", query_string=params).get_json()
+        self.assertEqual([a["bucket"] for a in body["sensor_aggregates"]],
+                         [str(START), str(START + timedelta(hours=1))])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import threading
+import time
+import unittest
+
+from utils.clients import ClientRegistry
+
+
+class Test(unittest.TestCase):
+    def test_client_is_built_once_under_concurrent_first_use(self):
+        built = []
+        def factory():
+            time.sleep(0.05)
+            built.append(object())
+            return built[-1]
+        registry = ClientRegistry()
+        registry.register("llm", factory)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get("llm"))) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertTrue(all(result is built[0] for result in results))
+
+    def test_clients_are_built_lazily_and_may_depend_on_each_other(self):
+        registry = ClientRegistry()
+        calls = []
+        registry.register("configuration", lambda: calls.append("configuration") or {"model": "fake"})
+        registry.register("llm", lambda: ("llm", registry.get("configuration")["model"]))
+        self.assertEqual(calls, [])
+        self.assertEqual(registry.get("llm"), ("llm", "fake"))
+        self.assertEqual(registry.get("llm"), ("llm", "fake"))
+        self.assertEqual(calls, ["configuration"])
+
+    def test_reset_rebuilds_on_next_use(self):
+        registry = ClientRegistry()
+        registry.register("indexes", list)
+        first = registry.get("indexes")
+        registry.reset("indexes")
+        self.assertIsNot(registry.get("indexes"), first)
+
+
+if __name__ == '__main__':
+    unittest.main()
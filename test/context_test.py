@@ -0,0 +1,56 @@
+import os
+import unittest
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.language_models import FakeListChatModel
+
+from common import Step
+from tools import executor
+from utils.clients import registry
+from utils.context import CHUNK_SEPARATOR, assemble_context, count_tokens, deduplicate, fit_lines, truncate
+
+
+class Test(unittest.TestCase):
+    def test_tokens_are_counted_and_cut_by_word(self):
+        self.assertEqual(count_tokens("Check the C32 injector."), 7)
+        self.assertEqual(count_tokens("turbocharger"), 3)
+        self.assertEqual(truncate("Check the C32 injector every 500 hours.", 6), "Check the C32 injector")
+        self.assertEqual(fit_lines("a|b\nc|d\ne|f", 9), "a|b\nc|d\ne|f")
+
+    def test_lines_past_the_budget_are_marked_as_omitted(self):
+        table = "\n".join(f"{i}|vessel {i}" for i in range(10))
+        self.assertEqual(fit_lines(table, 20), "0|vessel 0\n1|vessel 1\n[8 more lines omitted]")
+
+    def test_near_duplicate_pieces_are_kept_once(self):
+        pieces = ["Replace the fuel filter every 500 hours.", "Replace the fuel filter every 500 running hours.",
+                  "Check the coolant level daily."]
+        self.assertEqual(deduplicate(pieces), [pieces[0], pieces[2]])
+
+    def test_most_relevant_pieces_fill_the_budget_in_their_order(self):
+        results = ["The vessel was built in 2015 by a yard in Korea.\n\nThe C32 generator needs an oil change every 250 hours.",
+                   "The crew list has 24 members.\n\nThe C32 generator oil is SAE 15W-40."]
+        context = assemble_context("C32 generator oil", results, budget=30)
+        self.assertEqual(context, "The C32 generator needs an oil change every 250 hours.\n\nThe C32 generator oil is SAE 15W-40.")
+        self.assertLessEqual(count_tokens(context), 30)
+
+    def test_manual_chunks_are_labelled_with_their_equipment(self):
+        result = {"query": "q", "output": {"equipment_name": "C32", "query": "q",
+                                           "context": CHUNK_SEPARATOR.join(["Oil: SAE 15W-40.", "Oil: SAE 15W-40.", "Coolant: ELC."])}}
+        self.assertEqual(assemble_context("oil", [result], budget=100), "[C32] Oil: SAE 15W-40.\n\n[C32] Coolant: ELC.")
+
+    def test_prompt_tokens_of_a_step_are_reported(self):
+        factory = registry.factories["llm"]
+        registry.register("llm", lambda: FakeListChatModel(responses=["summary"]))
+        try:
+            step = Step(order=1, tool="summarize", reason_it_was_chosen="summarize the oil grades")
+            result = executor.execute_tool({"query": "Which oil does the C32 take?", "steps": [step],
+                                            "current_step": 0, "output": "The C32 oil is SAE 15W-40."})
+        finally:
+            registry.register("llm", factory)
+        self.assertEqual(result["output"], "summary")
+        self.assertGreater(result["prompt_tokens"], count_tokens("Which oil does the C32 take? SAE 15W-40."))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from utils import telemetry
+from utils.embeddings import BatchedEmbeddings, EmbeddingCache, FakeEmbeddings, RateLimiter
+
+
+class FlakyEmbeddings(FakeEmbeddings):
+    """Fails every other call, like a provider answering 429."""
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls % 2:
+            raise RuntimeError("Resource exhausted")
+        return [self.embed(text) for text in texts]
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "embeddings.sqlite")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def embeddings(self, provider, **options):
+        return BatchedEmbeddings(provider, EmbeddingCache(self.path), requests_per_minute=0, backoff=0, **options)
+
+    def test_batches_are_embedded_once_in_order(self):
+        provider = FakeEmbeddings()
+        texts = [f"chunk {i}" for i in range(25)] + ["chunk 3"]
+        vectors = self.embeddings(provider, batch_size=10).embed_documents(texts)
+        self.assertEqual(vectors, [provider.embed(text) for text in texts])
+        self.assertEqual((provider.calls, provider.texts), (3, 25))
+
+    def test_reembedding_the_same_chunks_makes_no_calls(self):
+        texts = [f"Lubricating oil pressure {i} bar" for i in range(50)]
+        first = self.embeddings(FakeEmbeddings()).embed_documents(texts)
+        provider = FakeEmbeddings()
+        second = self.embeddings(provider).embed_documents(texts)
+        self.assertEqual(provider.calls, 0)
+        for a, b in zip(first, second):
+            self.assertEqual(len(a), len(b))
+            self.assertAlmostEqual(sum(x * y for x, y in zip(a, b)), 1.0, places=5)
+
+        self.embeddings(provider).embed_query(texts[0])
+        self.embeddings(provider).embed_query(texts[0])
+        self.assertEqual(provider.calls, 1)
+
+    def test_failed_batches_are_retried(self):
+        provider = FlakyEmbeddings()
+        vectors = self.embeddings(provider, batch_size=5, max_concurrency=1).embed_documents([str(i) for i in range(10)])
+        self.assertEqual(len(vectors), 10)
+        self.assertEqual(provider.calls, 4)
+
+    def test_retried_batches_are_spans_of_the_current_span(self):
+        spans, retried = [], telemetry.retries.value(operation="embedding")
+        with mock.patch.object(telemetry, "exporters", [spans.append]), telemetry.span("ingest") as ingest:
+            self.embeddings(FlakyEmbeddings(), batch_size=5, max_concurrency=1).embed_documents([str(i) for i in range(10)])
+        batches = [s for s in spans if s["kind"] == "embedding"]
+        self.assertEqual([(s["name"], s["parent_span_id"], s["attributes"]["retries"]) for s in batches],
+                         [("embed_documents", ingest.span_id, 1)] * 2)
+        self.assertEqual(telemetry.retries.value(operation="embedding") - retried, 2)
+
+    def test_rate_limiter_spaces_calls(self):
+        limiter = RateLimiter(requests_per_minute=60 * 50)
+        start = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 5 / 50 - 0.005)
+
+    def test_fake_embeddings_rank_shared_words_higher(self):
+        provider = FakeEmbeddings()
+        query = provider.embed_query("fuel injector maintenance")
+        related, unrelated = provider.embed_documents(["Fuel injector maintenance interval", "Crew roster"])
+        dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+        self.assertGreater(dot(query, related), dot(query, unrelated))
+
+
+if __name__ == '__main__':
+    unittest.main()
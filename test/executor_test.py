@@ -0,0 +1,70 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.tools import tool
+
+from common import Step
+from tools import executor
+from utils.clients import registry
+
+
+@tool
+def extract_from_manual(query: str):
+    """Manual lookup."""
+    return f"manual for {query}"
+
+@tool
+def summarize(context: str, query: str):
+    """Summary."""
+    return f"summary of {context}"
+
+
+class RecordingAgent:
+    def __init__(self):
+        self.inputs = []
+
+    def invoke(self, inputs, config=None):
+        self.inputs.append(inputs)
+        return {"output": "agent"}
+
+
+@mock.patch.object(executor, "tools_by_name", {t.name: t for t in [extract_from_manual, summarize]})
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.factory = registry.factories["tool_agent"]
+        self.agent = RecordingAgent()
+        registry.register("tool_agent", lambda: self.agent)
+
+    def tearDown(self):
+        registry.register("tool_agent", self.factory)
+
+    def state(self, tool: str, output: str = "") -> dict:
+        return {"query": "weight of the C32", "output": output, "current_step": 0,
+                "steps": [Step(order=1, tool=tool, reason_it_was_chosen="look it up")]}
+
+    def test_planned_tool_is_called_without_the_agent(self):
+        result = executor.execute_tool(self.state("extract_from_manual", output="C32 of Maritime"))
+        self.assertEqual(result["output"], "manual for weight of the C32\n\ntask: look it up")
+        self.assertEqual(executor.execute_tool(self.state("summarize", output="8 tons"))["output"], "summary of 8 tons")
+        self.assertEqual(self.agent.inputs, [])
+
+    def test_async_dispatch_matches_the_sync_one(self):
+        state = self.state("extract_from_manual", output="C32 of Maritime")
+        self.assertEqual(asyncio.run(executor.aexecute_tool(state)), executor.execute_tool(state))
+
+    def test_unknown_tool_is_left_to_the_agent(self):
+        self.assertEqual(executor.execute_tool(self.state("send_alert"))["output"], "agent")
+        self.assertEqual(len(self.agent.inputs), 1)
+
+    @mock.patch.object(executor, "DIRECT_DISPATCH", False)
+    def test_agent_mode(self):
+        executor.execute_tool(self.state("summarize"))
+        self.assertEqual(self.agent.inputs[0]["query"], "weight of the C32")
+
+
+if __name__ == '__main__':
+    unittest.main()
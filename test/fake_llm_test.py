@@ -0,0 +1,54 @@
+import asyncio
+import os
+import time
+import unittest
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.messages import HumanMessage
+
+from common import Output, Steps
+from tools.api import org_ext_prompt, Organization
+from tools.manual import search_keywords_prompt
+from utils.fake_llm import FakeChatModel, plan
+
+
+class Test(unittest.TestCase):
+    def test_plan_picks_tools_by_the_words_of_the_query(self):
+        self.assertEqual([s["tool"] for s in plan("What is the weight of CAT-032?")],
+                         ["extract_from_manual", "summarize"])
+        self.assertEqual([s["tool"] for s in plan("Give me all the list of equipments and it's 2 unique characteristics for Maritime")],
+                         ["extract_organization_level_data", "extract_from_manual", "summarize"])
+        self.assertEqual([s["tool"] for s in plan("Tell me a story of a camel and it's owner.")], ["summarize"])
+        self.assertEqual([s["order"] for s in plan("List the fleets of Maritime")], [1, 2])
+
+    def test_structured_outputs_are_filled_from_the_prompt(self):
+        llm = FakeChatModel()
+        steps = llm.with_structured_output(Steps).invoke([HumanMessage(content="What is the weight of CAT-032?")]).steps
+        self.assertEqual(steps[0].tool, "extract_from_manual")
+
+        output = (search_keywords_prompt | llm.with_structured_output(Output)).invoke(
+            {"equipments": ["caterpillar-c32", "wartsila-rt-flex82c"], "query": "RT-flex82C cylinder lubrication"})
+        self.assertEqual(output.equipment_name, "wartsila-rt-flex82c")
+
+        organization = (org_ext_prompt | llm.with_structured_output(Organization)).invoke({
+            "org_list": [{'organization_id': 1, 'name': 'Maritime Shipping Co.'},
+                         {'organization_id': 2, 'name': 'Global Logistics Ltd.'}],
+            "query": "vessels of Global Logistics"})
+        self.assertEqual((organization.name, organization.id), ("Global Logistics Ltd.", 2))
+        self.assertEqual(llm.calls, 3)
+
+    def test_answer_takes_the_latency_and_streams_word_by_word(self):
+        llm = FakeChatModel(latency=0.05, token_latency=0.01, answer_words=3)
+        began = time.perf_counter()
+        self.assertEqual(llm.invoke("lubricating oil pressure bar").content, "lubricating oil pressure")
+        self.assertGreaterEqual(time.perf_counter() - began, 0.08)
+        self.assertEqual([c.content for c in llm.stream("lubricating oil pressure")], ["lubricating ", "oil ", "pressure"])
+
+        async def astream():
+            return [c.content async for c in llm.astream("lubricating oil")]
+        self.assertEqual(asyncio.run(astream()), ["lubricating ", "oil"])
+
+
+if __name__ == '__main__':
+    unittest.main()
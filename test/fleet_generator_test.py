@@ -0,0 +1,53 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from fleet_generator import FleetGenerator, SENSORS, REPAIR, EQUIPMENT_PER_TASK, TABLES, sensor_series, reading_lines
+
+END = datetime(2025, 1, 8)
+
+
+class Test(unittest.TestCase):
+    def test_entities_match_the_scale_and_continue_the_existing_ids(self):
+        generator = FleetGenerator(organizations=2, fleets=2, vessels=3, equipment=5, components=2, sensors=2,
+                                   days=7, end=END, failure_rate=0.5)
+        first_ids = {table: 100 for table in TABLES}
+        rows, tasks = generator.entities(first_ids)
+        counts = generator.counts()
+        for table in ("organization", "fleet", "vessel", "equipment", "component", "sensor"):
+            self.assertEqual(len(rows[table]), counts[table])
+            self.assertEqual(rows[table][0][0], 100)
+        self.assertEqual(len(rows["sensor_threshold"]), counts["sensor"])
+        self.assertEqual(rows["fleet"][2][1], 100 + 1)  # the first fleet of the second organization
+
+        equipment = [e for task in tasks for e in task["equipment"]]
+        self.assertEqual([e[0] for e in equipment], [row[0] for row in rows["equipment"]])
+        self.assertTrue(all(len(task["equipment"]) <= EQUIPMENT_PER_TASK for task in tasks))
+        failures = [failed for _, _, times in equipment for failed in times]
+        self.assertEqual(len(failures), len(rows["failure_event"]))
+        self.assertTrue(all(generator.start < failed <= END for failed in failures))
+        self.assertEqual(rows, generator.entities(first_ids)[0])
+
+    def test_readings_spike_degrade_before_a_failure_and_pause_for_the_repair(self):
+        profile = SENSORS["Main Engine"][0]
+        low, high = profile[7], profile[8]
+        failed = END - timedelta(days=2)
+        timestamps, values = sensor_series(np.random.default_rng(0), profile, END - timedelta(days=7), END, [failed], 0.01)
+        self.assertGreater(len(timestamps), 6 * 24 * 60)
+
+        before = timestamps < np.datetime64(failed - timedelta(days=3))
+        outside = (values < low) | (values > high)
+        self.assertAlmostEqual(outside[before].mean(), 0.01, delta=0.005)
+
+        last_hour = (timestamps > np.datetime64(failed - timedelta(hours=1))) & (timestamps <= np.datetime64(failed))
+        self.assertGreater(np.median(values[last_hour]), high)
+        repair = (timestamps > np.datetime64(failed)) & (timestamps <= np.datetime64(failed + REPAIR))
+        self.assertFalse(repair.any())
+
+        line = reading_lines(7, timestamps[:1], values[:1])[0]
+        self.assertRegex(line, r"^7,2025-01-01T00:00:\d\d,\d+\.\d{4},Good,Automatic\n$")
+
+
+if __name__ == '__main__':
+    unittest.main()
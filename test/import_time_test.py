@@ -0,0 +1,38 @@
+import os
+import subprocess
+import sys
+import unittest
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+# About 3.3s before provider imports were made lazy, about 1.3s after
+IMPORT_BUDGET_MS = int(os.getenv("NAVEXA_IMPORT_BUDGET_MS", 2500))
+LAZY_MODULES = ["langchain_google_genai", "langchain_ollama", "langchain.agents", "langgraph", "langchain_community",
+                "faiss", "psycopg2", "PyPDF2"]
+
+
+def run(*args) -> subprocess.CompletedProcess:
+    environment = {**os.environ, "PYTHONPATH": SRC, "GOOGLE_API_KEY": "test"}
+    return subprocess.run([sys.executable, *args], env=environment, capture_output=True, text=True, check=True)
+
+
+class Test(unittest.TestCase):
+    def test_workflow_import_is_within_budget(self):
+        lines = [line.split("|") for line in run("-X", "importtime", "-c", "import workflow").stderr.splitlines()
+                 if line.startswith("import time:")]
+        cumulative = min(int(micros) for _, micros, name in lines if name.strip() == "workflow")
+        self.assertLess(cumulative / 1000, IMPORT_BUDGET_MS)
+
+    def test_providers_are_not_imported_until_used(self):
+        loaded = run("-c", f"import sys, workflow; print(*[m for m in {LAZY_MODULES!r} if m in sys.modules])").stdout
+        self.assertEqual(loaded.split(), [])
+
+    def test_compiled_graph_is_built_once(self):
+        os.environ.setdefault("GOOGLE_API_KEY", "test")
+        from workflow import Workflow
+        graph = Workflow().create_graph()
+        self.assertIs(Workflow().create_graph(), graph)
+        self.assertIn("__execute_step__", graph.get_graph().nodes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+import uuid
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from injest import PDFIngestion, extract_pages, extract_text_from_pdf
+from utils.vector_db_configuration import VectorStoreConfiguration
+
+MANUALS = os.path.join(os.path.dirname(__file__), "..", "docs", "manuals", "equipment")
+
+
+class RecordingVectorStore:
+    def __init__(self):
+        self.documents = {}
+
+    def add_documents(self, docs):
+        ids = [str(uuid.uuid4()) for _ in docs]
+        self.documents.update(zip(ids, docs))
+        return ids
+
+    def delete(self, ids):
+        for id in ids:
+            del self.documents[id]
+
+    def get_by_ids(self, ids):
+        return [self.documents[id] for id in ids if id in self.documents]
+
+
+class RecordingVectorStoreConfiguration(VectorStoreConfiguration):
+    def __init__(self):
+        self.stores = {}
+
+    def get_indexes(self):
+        return sorted(self.stores)
+
+    def get_vector_store_handle(self, index_name):
+        return self.stores.setdefault(index_name, RecordingVectorStore())
+
+    def persist(self):
+        pass
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        for filename in ("Caterpillar-C32.pdf", "Wartsila-RT-flex82C.pdf"):
+            shutil.copy(os.path.join(MANUALS, filename), self.folder)
+        self.config = RecordingVectorStoreConfiguration()
+        self.ingestion = PDFIngestion(self.folder, max_workers=2)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_pages_are_extracted_in_order(self):
+        file_path = os.path.join(self.folder, "Caterpillar-C32.pdf")
+        pages = extract_pages(file_path)
+        self.assertEqual(extract_pages(file_path, 1, 3), pages[1:3])
+        self.assertEqual(extract_text_from_pdf(file_path), "".join(pages))
+
+    def test_unchanged_manuals_are_skipped(self):
+        ingested = self.ingestion.ingest_pdfs_to_index(self.config)
+        self.assertEqual(sorted(ingested), ["Caterpillar-C32.pdf", "Wartsila-RT-flex82C.pdf"])
+        caterpillar = self.config.stores["caterpillar-c32"].documents
+        self.assertEqual(len(caterpillar), ingested["Caterpillar-C32.pdf"])
+        self.assertEqual({d.metadata["source"] for d in caterpillar.values()}, {"Caterpillar-C32.pdf"})
+        self.assertEqual(min(d.metadata["page"] for d in caterpillar.values()), 1)
+
+        version = self.config.manuals_version()
+        self.assertEqual(PDFIngestion(self.folder).ingest_pdfs_to_index(self.config), {})
+        self.assertEqual(len(caterpillar), ingested["Caterpillar-C32.pdf"])
+        self.assertEqual(self.config.manuals_version(), version)
+
+    def test_manuals_missing_from_the_store_are_ingested_again(self):
+        ingested = self.ingestion.ingest_pdfs_to_index(self.config)
+        fresh = RecordingVectorStoreConfiguration()  # e.g. in-memory FAISS after a restart
+        self.assertEqual(self.ingestion.ingest_pdfs_to_index(fresh), ingested)
+        self.assertEqual(len(fresh.stores["caterpillar-c32"].documents), ingested["Caterpillar-C32.pdf"])
+        self.assertEqual(self.ingestion.ingest_pdfs_to_index(fresh), {})
+
+    def test_changed_manual_replaces_only_its_own_chunks(self):
+        self.ingestion.ingest_pdfs_to_index(self.config)
+        wartsila = dict(self.config.stores["wartsila-rt-flex82c"].documents)
+        shutil.copy(os.path.join(MANUALS, "Wartsila-RT-flex82C.pdf"), os.path.join(self.folder, "Caterpillar-C32.pdf"))
+
+        version = self.config.manuals_version()
+        ingested = self.ingestion.ingest_pdfs_to_index(self.config)
+        self.assertNotEqual(self.config.manuals_version(), version)
+        self.assertEqual(list(ingested), ["Caterpillar-C32.pdf"])
+        self.assertEqual(len(self.config.stores["caterpillar-c32"].documents), ingested["Caterpillar-C32.pdf"])
+        self.assertEqual(self.config.stores["wartsila-rt-flex82c"].documents, wartsila)
+
+    def test_deleted_manual_is_removed_from_its_index(self):
+        self.ingestion.ingest_pdfs_to_index(self.config)
+        os.remove(os.path.join(self.folder, "Caterpillar-C32.pdf"))
+        self.assertEqual(self.ingestion.ingest_pdfs_to_index(self.config), {})
+        self.assertEqual(self.config.stores["caterpillar-c32"].documents, {})
+        self.assertNotIn("Caterpillar-C32.pdf", self.ingestion.load_manifest())
+
+
+if __name__ == '__main__':
+    unittest.main()
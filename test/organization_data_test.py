@@ -0,0 +1,97 @@
+import json
+import os
+import unittest
+
+os.environ.setdefault("NAVEXA_DATABASE_URI", "sqlite://")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from sqlalchemy.orm import sessionmaker
+
+from api import app
+from models import db, Organization, Fleet, Vessel, Equipment, Component
+from tools import api
+from utils.clients import registry
+from utils.fuzzy import NameMatcher
+
+NAMES = {1: "Maritime Shipping Co.", 2: "Global Logistics Ltd.", 3: "OceanTech Solutions", 4: "Cochin Shipping Inc."}
+
+
+class NameMatcherTest(unittest.TestCase):
+    def test_organization_is_found_by_its_distinctive_words(self):
+        matcher = NameMatcher(NAMES)
+        self.assertEqual(matcher.match("list equipments for Maritime"), 1)
+        self.assertEqual(matcher.match("equipment of Maritme Shipping"), 1)
+        self.assertEqual(matcher.match("vessels of global logistics"), 2)
+        self.assertEqual(matcher.match("Cochin Shipping Inc fleets"), 4)
+
+    def test_unnamed_or_ambiguous_organization_is_left_to_the_llm(self):
+        matcher = NameMatcher(NAMES)
+        self.assertIsNone(matcher.match("vessels of the shipping companies"))
+        self.assertIsNone(matcher.match("service interval of the C32"))
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        for name in ["Maritime Shipping Co.", "Global Logistics Ltd."]:
+            organization = Organization(name=name, type="Shipping")
+            cargo = Fleet(name="Cargo Fleet Alpha", type="Container", organization=organization)
+            tankers = Fleet(name="Tanker Fleet", type="Oil Tanker", organization=organization)
+            engine = Equipment(type="Main Engine", manufacturer="Caterpillar", model="C32",
+                               vessel=Vessel(name="MS Oceanic", fleet=cargo))
+            Component(name="Fuel Injector", equipment=engine)
+            Equipment(type="Main Engine", manufacturer="Wartsila", model="RT-flex82C",
+                      vessel=Vessel(name="MT Petrostar", fleet=tankers))
+            db.session.add(organization)
+        db.session.commit()
+        self.factories = dict(registry.factories)
+        self.prompts = []
+        registry.register("database_sessions", lambda: sessionmaker(db.engine))
+        registry.register("llm", lambda: RunnableLambda(lambda prompt: self.prompts.append(prompt.to_string())
+                                                       or AIMessage(content="answer")))
+        api.organization_lists.clear()
+
+    def tearDown(self):
+        for name in ("database_sessions", "llm"):
+            registry.register(name, self.factories[name])
+        api.organization_lists.clear()
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_named_organization_is_read_in_process_without_picking_it_by_llm(self):
+        answer = api.extract_organization_level_data.invoke({"query": "Which vessels of Maritime have a Caterpillar engine?"})
+        self.assertEqual(answer.content, "answer")
+        self.assertEqual(len(self.prompts), 1)
+        self.assertIn("|Maritime Shipping Co.|", self.prompts[0])
+        self.assertIn("MS Oceanic", self.prompts[0])
+        self.assertNotIn("MT Petrostar", self.prompts[0])
+        self.assertNotIn("Fuel Injector", self.prompts[0])
+
+    def test_context_keeps_every_branch_of_a_level_no_branch_is_named_in(self):
+        tree = api.get_organization(1)
+        everything = api.relevant_organization(tree, "List the components of all equipment of Maritime")
+        self.assertEqual([f["name"] for f in everything["fleets"]], ["Cargo Fleet Alpha", "Tanker Fleet"])
+        self.assertEqual(everything["fleets"][0]["vessels"][0]["equipment"][0]["components"][0]["name"], "Fuel Injector")
+        self.assertNotIn("contact_info", everything)
+
+        tankers = api.relevant_organization(tree, "What engines does the tanker fleet of Maritime run?")
+        self.assertEqual([f["name"] for f in tankers["fleets"]], ["Tanker Fleet"])
+        self.assertEqual(tankers["fleets"][0]["vessels"][0]["equipment"][0]["model"], "RT-flex82C")
+        self.assertLess(len(json.dumps(tankers)), len(json.dumps(tree)) / 2)
+
+    def test_context_is_one_table_per_level_keyed_to_the_parent(self):
+        tree = api.get_organization(1)
+        context = api.organization_context(tree, "List the components of all equipment of Maritime")
+        self.assertIn("fleets: organization_id|fleet_id|name|type", context)
+        self.assertIn("components: equipment_id|component_id|name", context)
+        self.assertEqual(context.count("Main Engine"), 2)
+        self.assertLess(len(context), len(json.dumps(api.relevant_organization(tree, "all equipment of Maritime"))))
+
+
+if __name__ == '__main__':
+    unittest.main()
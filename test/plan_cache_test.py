@@ -0,0 +1,79 @@
+import os
+import unittest
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.runnables import RunnableLambda
+
+from common import Step, Steps
+from tools.query_rewrite import multi_query_rewrite
+from utils.clients import registry
+from utils.embeddings import FakeEmbeddings
+from utils.plan_cache import MANUAL_SUMMARY, ORGANIZATION_MANUAL_SUMMARY, PlanClassifier
+
+
+class PlanningLLM:
+    """Plans every query as organization -> summary and counts the calls."""
+    def __init__(self):
+        self.calls = 0
+
+    def bind_tools(self, tools):
+        return self
+
+    def with_structured_output(self, schema):
+        return RunnableLambda(self.plan)
+
+    def plan(self, prompt):
+        self.calls += 1
+        return Steps(steps=[Step(order=2, tool="summarize", reason_it_was_chosen="summary"),
+                            Step(order=1, tool="extract_organization_level_data", reason_it_was_chosen="organization")])
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.classifier = PlanClassifier(FakeEmbeddings(), threshold=0.7)
+
+    def test_queries_like_a_seed_get_its_plan(self):
+        self.assertEqual(self.classifier.predict("Service interval of the C32?"), (MANUAL_SUMMARY, 1.0))
+        self.assertEqual(self.classifier.predict("what is the weight of the Wartsila RT-flex96C")[0], MANUAL_SUMMARY)
+        self.assertEqual(self.classifier.predict("list the equipments for Maritime")[0], ORGANIZATION_MANUAL_SUMMARY)
+        self.assertEqual(self.classifier.predict("bearing clearance of the turbocharger"), (None, 0.0))
+        self.assertEqual(self.classifier.stats(), {"exact": 1, "neighbours": 2, "fallbacks": 1, "examples": 8})
+
+    def test_disagreeing_neighbours_leave_the_plan_to_the_llm(self):
+        classifier = PlanClassifier(FakeEmbeddings(), threshold=0.5, seeds={
+            "oil pressure of the C32": MANUAL_SUMMARY, "oil pressure of Maritime": ORGANIZATION_MANUAL_SUMMARY})
+        self.assertEqual(classifier.predict("oil pressure"), (None, 0.0))
+
+    def test_oldest_examples_are_forgotten(self):
+        classifier = PlanClassifier(FakeEmbeddings(), max_examples=2, seeds={})
+        for query in ["fuel pump", "oil filter", "exhaust valve"]:
+            classifier.learn(query, MANUAL_SUMMARY)
+        self.assertEqual(list(classifier.plans), ["oil filter", "exhaust valve"])
+
+
+class MultiQueryRewriteTest(unittest.TestCase):
+    def setUp(self):
+        self.factories = dict(registry.factories)
+        self.llm = PlanningLLM()
+        registry.register("llm", lambda: self.llm)
+        registry.register("plan_classifier", lambda: PlanClassifier(FakeEmbeddings(), threshold=0.7))
+
+    def tearDown(self):
+        for name in ("llm", "plan_classifier"):
+            registry.register(name, self.factories[name])
+
+    def test_known_plan_shapes_skip_the_llm(self):
+        steps = multi_query_rewrite({"query": "service interval of the C18"})["steps"]
+        self.assertEqual([(s.order, s.tool) for s in steps], [(1, "extract_from_manual"), (2, "summarize")])
+        self.assertEqual(self.llm.calls, 0)
+
+    def test_llm_plans_are_learned(self):
+        multi_query_rewrite({"query": "bearing clearance of the turbocharger"})
+        steps = multi_query_rewrite({"query": "Bearing clearance of the turbocharger?"})["steps"]
+        self.assertEqual([s.tool for s in steps], ["extract_organization_level_data", "summarize"])
+        self.assertEqual(self.llm.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import unittest
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from utils.clients import registry
+from utils.embeddings import FakeEmbeddings
+from utils.response_cache import SemanticCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class CountingGraph:
+    def __init__(self):
+        self.invocations = 0
+
+    def invoke(self, state, config=None):
+        self.invocations += 1
+        return {"query": state["query"], "output": f"answer {self.invocations}"}
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.version = 0
+        self.cache = SemanticCache(FakeEmbeddings(), threshold=0.9, max_entries=3, ttl=60,
+                                   version=lambda: self.version, timer=self.clock)
+
+    def test_similar_queries_of_the_same_organization_hit(self):
+        self.cache.store("service interval of the C32", {"output": "250 hours"}, "Maritime")
+        self.assertEqual(self.cache.lookup("Service interval of the C32?", "maritime"), {"output": "250 hours"})
+        self.assertIsNone(self.cache.lookup("service interval of the C32", "Cochin Shipping"))
+        self.assertIsNone(self.cache.lookup("weight of the RT-flex82C", "Maritime"))
+        self.assertEqual({k: self.cache.stats()[k] for k in ("hits", "misses")}, {"hits": 1, "misses": 2})
+
+    def test_entries_expire(self):
+        self.cache.store("list equipments", "six", "Maritime")
+        self.clock.now = 61
+        self.assertIsNone(self.cache.lookup("list equipments", "Maritime"))
+        self.assertEqual(self.cache.stats()["expirations"], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        for query in ["fuel pump", "oil filter", "exhaust valve"]:
+            self.cache.store(query, query)
+        self.cache.lookup("fuel pump")
+        self.cache.store("piston ring", "piston ring")
+        self.assertEqual(self.cache.lookup("fuel pump"), "fuel pump")
+        self.assertIsNone(self.cache.lookup("oil filter"))
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_changed_data_invalidates(self):
+        self.cache.store("list equipments", "six", "Maritime")
+        self.cache.store("list equipments", "two", "Cochin")
+        self.cache.invalidate("Cochin")
+        self.assertIsNone(self.cache.lookup("list equipments", "Cochin"))
+        self.assertEqual(self.cache.lookup("list equipments", "Maritime"), "six")
+        self.version = 1  # the manuals were re-ingested
+        self.assertIsNone(self.cache.lookup("list equipments", "Maritime"))
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+    def test_cached_responses_are_copies(self):
+        self.cache.store("list equipments", {"equipment": ["C32"]})
+        self.cache.lookup("list equipments")["equipment"].append("RT-flex82C")
+        self.assertEqual(self.cache.lookup("list equipments"), {"equipment": ["C32"]})
+
+
+class WorkflowTest(unittest.TestCase):
+    def setUp(self):
+        from workflow import Workflow
+        self.workflow = Workflow()
+        self.factories = dict(registry.factories)
+        self.graph = CountingGraph()
+        registry.register("workflow_graph", lambda: self.graph)
+        registry.register("response_cache", lambda: SemanticCache(FakeEmbeddings(), threshold=0.9))
+
+        from tools.api import organization_lists
+        self.organization_lists = organization_lists
+        organization_lists["all"] = [{"organization_id": 1, "name": "Maritime Shipping Co."},
+                                     {"organization_id": 2, "name": "Global Logistics Ltd."}]
+
+    def tearDown(self):
+        for name in ("workflow_graph", "response_cache"):
+            registry.register(name, self.factories[name])
+        self.organization_lists.clear()
+
+    def test_repeated_query_does_not_run_the_graph(self):
+        first = self.workflow.invoke("List the equipment of Maritime", organization="Maritime")
+        second = self.workflow.invoke("list the equipment of maritime", organization="Maritime")
+        self.assertEqual(first, second)
+        self.assertEqual(self.graph.invocations, 1)
+        self.workflow.invoke("List the equipment of Maritime", organization="Cochin")
+        self.assertEqual(self.graph.invocations, 2)
+
+    def test_without_an_organization_the_query_names_the_scope(self):
+        self.workflow.invoke("List the vessels of Maritime Shipping")
+        self.workflow.invoke("list the vessels of maritime shipping", organization="Maritime Shipping Co.")
+        self.assertEqual(self.graph.invocations, 1)
+        self.workflow.invoke("List the vessels of Global Logistics")
+        self.assertEqual(self.graph.invocations, 2)
+
+    def test_a_query_naming_no_organization_is_cached_for_every_caller(self):
+        self.workflow.invoke("What is the service interval of the C32?")
+        self.workflow.invoke("what is the service interval of the C32")
+        self.assertEqual(self.graph.invocations, 1)
+        self.workflow.invoke("What is the service interval of the C32?", organization="Maritime")
+        self.assertEqual(self.graph.invocations, 2)
+
+    def test_unreadable_organizations_skip_the_cache(self):
+        self.organization_lists["all"] = {"error": "unavailable"}
+        self.workflow.invoke("List all the vessels")
+        self.workflow.invoke("List all the vessels")
+        self.assertEqual(self.graph.invocations, 2)
+        self.assertFalse(registry.get("response_cache").entries)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+from langchain_core.documents import Document
+
+from utils.retrieval import BM25Index, HybridRetriever, reciprocal_rank_fusion, rerank_by_coverage, tokenize
+
+CHUNKS = [
+    "Fuel filter, secondary (2 micron). Electronic fuel priming.",
+    "Torque at 1200 rpm is 5499 N*m for the C32 ACERT rating.",
+    "The RT-flex82C common-rail system delivers fuel oil at pressures up to 1000 bar.",
+    "Scheduled maintenance and oil change intervals of up to 500-hours.",
+]
+
+
+class StaticVectorStore:
+    """Vector store double returning a fixed ranking, like a dense model blind to part numbers."""
+    def __init__(self, documents):
+        self.documents = documents
+
+    def similarity_search(self, query, k):
+        return self.documents[:k]
+
+
+class Test(unittest.TestCase):
+    def test_tokenize_keeps_codes_and_their_parts(self):
+        self.assertEqual(tokenize("RT-flex82C at 0.845-0.850 kg/L"),
+                         ["rt-flex82c", "rt", "flex82c", "at", "0.845-0.850", "0.845", "0.850", "kg/l", "kg", "l"])
+
+    def test_bm25_ranks_exact_terms_first(self):
+        index = BM25Index([Document(page_content=c) for c in CHUNKS])
+        self.assertEqual(index.search("torque 5499", k=2)[0][0], 1)
+        self.assertEqual(index.search("flex82c pressure", k=2)[0][0], 2)
+        self.assertEqual(index.search("crew roster", k=2), [])
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([["a", "b", "c"], ["c", "a"]], k=60)
+        self.assertEqual([key for key, _ in fused], ["a", "c", "b"])
+        self.assertAlmostEqual(fused[0][1], 1 / 61 + 1 / 62)
+
+    def test_hybrid_search_finds_what_the_vector_search_misses(self):
+        documents = [Document(page_content=c) for c in CHUNKS]
+        dense = StaticVectorStore([documents[0], documents[3], documents[2]])
+        found = HybridRetriever(dense, documents, fetch_k=3).search("C32 torque 5499", k=2)
+        self.assertIn(CHUNKS[1], [d.page_content for d in found])
+
+    def test_rerank_by_coverage(self):
+        documents = [Document(page_content=c) for c in CHUNKS]
+        reranked = rerank_by_coverage("oil change intervals", documents)
+        self.assertEqual(reranked[0].page_content, CHUNKS[3])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import csv
+import gzip
+import io
+import json
+import unittest
+
+from sensor_ingest import open_text_stream, read_csv, read_ndjson, load_readings, COPY_SQL
+
+
+class RecordingConnection:
+    """DBAPI connection double that keeps what was sent through COPY."""
+    def __init__(self):
+        self.copies = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, list(csv.reader(buffer))))
+
+
+def ndjson(*records) -> bytes:
+    return "".join(json.dumps(r) + "\n" for r in records).encode()
+
+
+class Test(unittest.TestCase):
+    def test_ndjson_rows_are_validated_and_copied_in_chunks(self):
+        body = ndjson(
+            *({"sensor_id": 1, "timestamp": f"2025-01-01T00:00:{i:02d}", "value": i} for i in range(5)),
+            {"sensor_id": 42, "timestamp": "2025-01-01T00:00:00", "value": 1},
+            {"sensor_id": 1, "timestamp": "yesterday", "value": 1},
+            {"sensor_id": 1, "timestamp": "2025-01-01T00:00:00"},
+        )
+        connection = RecordingConnection()
+        result = load_readings(connection, read_ndjson(open_text_stream(io.BytesIO(body))), frozenset({1, 2}),
+                               chunk_size=2)
+        self.assertEqual(result["accepted"], 5)
+        self.assertEqual(result["rejected"], 3)
+        self.assertEqual([e["line"] for e in result["errors"]], [6, 7, 8])
+        self.assertEqual([len(rows) for _, rows in connection.copies], [2, 2, 1])
+        self.assertTrue(all(sql == COPY_SQL for sql, _ in connection.copies))
+
+    def test_gzip_csv_body(self):
+        body = gzip.compress(
+            b"sensor_id,timestamp,value,quality_indicator,collection_method\n"
+            b"1,2025-01-01T00:00:00,85.2,Good,Automatic\n"
+            b"2,2025-01-01T00:00:00,35.5,,\n"
+        )
+        connection = RecordingConnection()
+        result = load_readings(connection, read_csv(open_text_stream(io.BytesIO(body), gzipped=True)),
+                               frozenset({1, 2}))
+        self.assertEqual(result, {"accepted": 2, "rejected": 0, "errors": []})
+        rows = connection.copies[0][1]
+        self.assertEqual(rows[0], ["1", "2025-01-01 00:00:00", "85.2", "Good", "Automatic"])
+        self.assertEqual(rows[1], ["2", "2025-01-01 00:00:00", "35.5", "", ""])
+
+    def test_timezone_aware_timestamps_are_stored_as_utc(self):
+        connection = RecordingConnection()
+        body = ndjson({"sensor_id": 1, "timestamp": "2025-01-01T02:00:00+02:00", "value": 1})
+        load_readings(connection, read_ndjson(open_text_stream(io.BytesIO(body))), frozenset({1}))
+        self.assertEqual(connection.copies[0][1][0][1], "2025-01-01 00:00:00")
+
+    def test_malformed_lines_are_rejected(self):
+        body = b'not json\n[1, 2]\n{"sensor_id": 1, "timestamp": "2025-01-01T00:00:00", "value": "nan"}\n'
+        connection = RecordingConnection()
+        result = load_readings(connection, read_ndjson(open_text_stream(io.BytesIO(body))), frozenset({1}))
+        self.assertEqual(result["accepted"], 0)
+        self.assertEqual(result["rejected"], 3)
+        self.assertEqual(connection.copies, [])
+
+    def test_rows_that_do_not_fit_the_columns_are_rejected(self):
+        reading = {"sensor_id": 1, "timestamp": "2025-01-01T00:00:00"}
+        body = ndjson(
+            {**reading, "value": 1e9},
+            {**reading, "value": -999999999.9999999},
+            {**reading, "value": 1, "quality_indicator": "G" * 51},
+            {**reading, "value": 1, "collection_method": "A" * 51},
+            {**reading, "value": 999999999.999999, "quality_indicator": "G" * 50},
+        )
+        connection = RecordingConnection()
+        result = load_readings(connection, read_ndjson(open_text_stream(io.BytesIO(body))), frozenset({1}))
+        self.assertEqual((result["accepted"], result["rejected"]), (1, 4))
+        self.assertEqual([e["error"] for e in result["errors"]][1:], [
+            "value -999999999.9999999 is out of range",
+            "quality_indicator is longer than 50 characters",
+            "collection_method is longer than 50 characters",
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
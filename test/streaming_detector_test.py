@@ -0,0 +1,136 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+os.environ.setdefault("NAVEXA_DATABASE_URI", "sqlite://")
+
+import numpy as np
+
+from analytics import StreamingAnomalyDetector
+from analytics.batch_detector import rolling_zscore, THRESHOLD, RATE_OF_CHANGE, OUTLIER
+from analytics.streaming_detector import SensorState, DRIFT
+from api import app
+from models import db, Organization, Fleet, Vessel, Equipment, Sensor, SensorThreshold, AnomalyDetection, Alert
+
+START = datetime(2025, 1, 1)
+
+
+def readings(sensor_id, values):
+    return [(sensor_id, START + timedelta(seconds=i), float(v), None, None) for i, v in enumerate(values)]
+
+
+class Test(unittest.TestCase):
+    def detector(self, **options):
+        return StreamingAnomalyDetector({1: (70.0, 95.0)}, {1: (10, "Temperature")}, window=20, **options)
+
+    def test_window_zscore_matches_batch_rolling_zscore(self):
+        values = np.random.default_rng(3).normal(1000, 5, 200)
+        expected = rolling_zscore(np.zeros(len(values), dtype=int), values, window=20, min_periods=10)
+        state = SensorState(20)
+        for i, value in enumerate(values):
+            z = state.window_zscore(value - values[0], 10)
+            if np.isnan(expected[i]):
+                self.assertTrue(np.isnan(z))
+            else:
+                self.assertAlmostEqual(z, expected[i], places=6)
+            state.push(value - values[0])
+
+    def test_sustained_breach_is_reported_once(self):
+        detector = self.detector(rate_fraction=10)
+        values = [80] * 30 + [97] * 5 + [80] * 10 + [97]
+        started = [detector.update(1, timestamp, value) for _, timestamp, value, *_ in readings(1, values)]
+        self.assertEqual([i for i, kinds in enumerate(started) if THRESHOLD in kinds], [30, 45])
+
+    def test_jump_is_a_rate_of_change_and_outlier(self):
+        detector = self.detector(rate_fraction=0.25)
+        values = [80 + (i % 3) * 0.1 for i in range(40)] + [89]
+        kinds = [detector.update(1, timestamp, value) for _, timestamp, value, *_ in readings(1, values)][-1]
+        self.assertIn(RATE_OF_CHANGE, kinds)
+        self.assertIn(OUTLIER, kinds)
+        self.assertNotIn(THRESHOLD, kinds)
+
+    def test_slow_drift_is_reported(self):
+        detector = self.detector(rate_fraction=10, z_threshold=100)
+        rng = np.random.default_rng(5)
+        values = list(rng.normal(80, 0.5, 500)) + [80 + i * 0.01 for i in range(1, 500)]
+        started = [detector.update(1, timestamp, value) for _, timestamp, value, *_ in readings(1, values)]
+        drift = [i for i, kinds in enumerate(started) if DRIFT in kinds]
+        self.assertTrue(drift)
+        self.assertGreater(drift[0], 500)
+
+    def test_state_round_trips_through_bytes(self):
+        detector = self.detector()
+        for _, timestamp, value, *_ in readings(1, np.random.default_rng(2).normal(80, 1, 37)):
+            detector.update(1, timestamp, value)
+        state = detector.states[1]
+        restored = SensorState.from_bytes(state.to_bytes())
+        self.assertEqual(restored.to_bytes(), state.to_bytes())
+        self.assertEqual(len(state.to_bytes()), SensorState.HEADER.size + 8 * 20)
+
+    def test_unknown_sensors_are_ignored(self):
+        self.assertEqual(self.detector().process(readings(42, [1000] * 50)), [])
+
+
+class RecordTest(unittest.TestCase):
+    def setUp(self):
+        self.ctx = app.app_context()
+        self.ctx.push()
+        db.create_all()
+        organization = Organization(name="Maritime Shipping Co.")
+        equipment = Equipment(type="Main Engine", vessel=Vessel(name="MS Oceanic", fleet=Fleet(name="Alpha", organization=organization)))
+        db.session.add(equipment)
+        db.session.flush()
+        self.equipment_id = equipment.equipment_id
+        sensor = Sensor(type="Temperature", equipment_id=equipment.equipment_id)
+        db.session.add(sensor)
+        db.session.flush()
+        self.sensor_id = sensor.sensor_id
+        db.session.add(SensorThreshold(sensor_id=sensor.sensor_id, min_value=70, max_value=95, context_conditions="Normal operation"))
+        db.session.commit()
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.ctx.pop()
+
+    def test_record_writes_anomalies_alerts_and_checkpoint(self):
+        detector = StreamingAnomalyDetector.restore(db.session, rate_fraction=10)
+        rows = readings(self.sensor_id, [80 + (i % 3) * 0.1 for i in range(30)] + [97, 97])
+        self.assertEqual(detector.record(db.session, rows[:20]), 0)
+        self.assertGreaterEqual(detector.record(db.session, rows[20:]), 1)
+        db.session.commit()
+
+        anomaly = AnomalyDetection.query.filter(AnomalyDetection.type.like("%Threshold Breach")).one()
+        self.assertEqual(anomaly.equipment_id, self.equipment_id)
+        self.assertEqual(anomaly.timestamp, START + timedelta(seconds=30))
+        alert = Alert.query.filter_by(anomaly_id=anomaly.anomaly_id).one()
+        self.assertEqual(alert.status, "Open")
+        self.assertEqual(alert.severity, "High")
+
+        # Another detector carries on where the checkpoint left off: the breach is still active
+        restored = StreamingAnomalyDetector.restore(db.session, rate_fraction=10)
+        states = restored.load_states(db.session, [self.sensor_id])
+        self.assertEqual(states[self.sensor_id].count, 32)
+        self.assertEqual(restored.update(self.sensor_id, START + timedelta(seconds=32), 97, states), [])
+
+    def test_rolled_back_batch_leaves_no_state_behind(self):
+        detector = StreamingAnomalyDetector.restore(db.session, rate_fraction=10)
+        rows = readings(self.sensor_id, [80 + (i % 3) * 0.1 for i in range(30)] + [97, 97])
+        detector.record(db.session, rows[:30])
+        db.session.commit()
+
+        # The first chunk of a batch is scored, then the COPY of its second chunk fails
+        started = detector.record(db.session, rows[30:31])
+        self.assertGreaterEqual(started, 1)
+        db.session.rollback()
+        self.assertEqual(AnomalyDetection.query.count(), 0)
+
+        # Retried, the breach is reported again and scored from the committed checkpoint
+        self.assertEqual(detector.record(db.session, rows[30:]), started)
+        db.session.commit()
+        self.assertEqual(AnomalyDetection.query.count(), started)
+        self.assertEqual(detector.load_states(db.session, [self.sensor_id])[self.sensor_id].count, 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
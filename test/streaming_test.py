@@ -0,0 +1,116 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("NAVEXA_DATABASE_URI", "sqlite://")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.language_models import FakeListChatModel
+from langchain_core.tools import tool
+
+import workflow
+from api import app
+from common import ANSWER_TAG, Step
+from tools import executor
+from utils.clients import get_llm, registry
+from utils.embeddings import FakeEmbeddings
+from utils.response_cache import SemanticCache
+
+QUERY = "Which oil does the C32 take?"
+ANSWER = "SAE 15W-40"
+
+
+@tool
+def extract_from_manual(query: str):
+    """Manual lookup."""
+    return get_llm().invoke(query).content
+
+
+@tool
+def summarize(context: str, query: str):
+    """Summary behind an internal LLM call, like the organization lookup's structured output."""
+    get_llm().invoke(query)
+    return get_llm().with_config(tags=[ANSWER_TAG]).invoke(context).content
+
+
+def planner(state):
+    return {"steps": [Step(order=1, tool="extract_from_manual", reason_it_was_chosen="oil grade"),
+                      Step(order=2, tool="summarize", reason_it_was_chosen="answer")]}
+
+
+async def aplanner(state):
+    return planner(state)
+
+
+def parse(body: str) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        name, data = block.split("\n")
+        events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.factories = dict(registry.factories)
+        registry.register("llm", lambda: FakeListChatModel(responses=["Oil grade SAE 15W-40 for the C32.", ANSWER]))
+        registry.register("response_cache", lambda: SemanticCache(FakeEmbeddings(), threshold=0.9))
+        with mock.patch.object(workflow, "multi_query_rewrite", planner), \
+                mock.patch.object(workflow, "amulti_query_rewrite", aplanner):
+            graph = workflow.build_graph()
+        registry.register("workflow_graph", lambda: graph)
+        self.tools = mock.patch.dict(executor.tools_by_name, {"extract_from_manual": extract_from_manual})
+        self.tools.start()
+
+    def tearDown(self):
+        self.tools.stop()
+        for name in ("llm", "response_cache", "workflow_graph"):
+            registry.register(name, self.factories[name])
+
+    def test_progress_then_the_tokens_of_the_last_step_then_the_answer(self):
+        events = list(workflow.Workflow().stream(QUERY))
+        self.assertEqual(events[0]["event"], "plan")
+        self.assertEqual([step["tool"] for step in events[0]["steps"]], ["extract_from_manual", "summarize"])
+        progress = [(e["order"], e["status"]) for e in events if e["event"] == "step"]
+        self.assertEqual(progress, [(1, "started"), (1, "done"), (2, "started"), (2, "done")])
+        tokens = [e["text"] for e in events if e["event"] == "token"]
+        self.assertGreater(len(tokens), 1)
+        self.assertEqual("".join(tokens), ANSWER)
+        first_token = next(i for i, e in enumerate(events) if e["event"] == "token")
+        summarized = next(i for i, e in enumerate(events) if e["event"] == "step" and e == {**e, "order": 2, "status": "done"})
+        self.assertLess(first_token, summarized)
+        self.assertEqual(events[-1], {"event": "answer", "output": ANSWER, "cached": False})
+
+    def test_only_the_answer_llm_call_of_the_last_step_is_streamed(self):
+        registry.register("llm", lambda: FakeListChatModel(responses=["Oil grade SAE 15W-40 for the C32.",
+                                                                      '{"name": "Maritime", "id": 1}', ANSWER]))
+        with mock.patch.dict(executor.tools_by_name, {"summarize": summarize}):
+            events = list(workflow.Workflow().stream(QUERY))
+        self.assertEqual("".join(e["text"] for e in events if e["event"] == "token"), ANSWER)
+
+    def test_astream_yields_the_same_events(self):
+        async def collect():
+            return [event async for event in workflow.Workflow().astream(QUERY)]
+        events = asyncio.run(collect())
+        self.assertEqual("".join(e["text"] for e in events if e["event"] == "token"), ANSWER)
+        self.assertEqual(events[-1], {"event": "answer", "output": ANSWER, "cached": False})
+
+    def test_server_sent_events_endpoint(self):
+        client = app.test_client()
+        arguments = {"query": QUERY, "organization": "Maritime"}
+        response = client.get("/api/query/stream", query_string=arguments)
+        self.assertEqual(response.mimetype, "text/event-stream")
+        events = parse(response.get_data(as_text=True))
+        self.assertEqual(events[0][0], "plan")
+        self.assertEqual("".join(data["text"] for name, data in events if name == "token"), ANSWER)
+        self.assertEqual(events[-1], ("answer", {"output": ANSWER, "cached": False}))
+
+        repeated = parse(client.get("/api/query/stream", query_string=arguments).get_data(as_text=True))
+        self.assertEqual(repeated, [("answer", {"output": ANSWER, "cached": True})])
+        self.assertEqual(client.get("/api/query/stream").status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import unittest
+from unittest import mock
+
+os.environ.setdefault("NAVEXA_DATABASE_URI", "sqlite://")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+from langchain_core.language_models import FakeListChatModel
+from sqlalchemy import create_engine, text
+
+import workflow
+from api import app
+from streaming_test import aplanner, extract_from_manual, planner
+from tools import executor
+from utils import telemetry
+from utils.clients import registry
+from utils.embeddings import FakeEmbeddings
+from utils.response_cache import SemanticCache
+
+QUERY = "Which oil does the C32 take?"
+
+
+def tree(spans: list[dict]) -> list[str]:
+    """Every span as kind:name, indented under its parent, in start order."""
+    by_id = {s["span_id"]: s for s in spans}
+
+    def depth(s):
+        return 1 + depth(by_id[s["parent_span_id"]]) if s["parent_span_id"] in by_id else 0
+    return ["  " * depth(s) + f'{s["kind"]}:{s["name"]}' for s in sorted(spans, key=lambda s: s["start_time_unix_nano"])]
+
+
+class MetricsTest(unittest.TestCase):
+    def test_prometheus_text_format(self):
+        histogram = telemetry.Histogram("test_seconds", "Test.", buckets=(0.1, 1.0))
+        for seconds in (0.05, 0.5, 5.0):
+            histogram.observe(seconds, kind="tool")
+        counter = telemetry.Counter("test_total", "Test.")
+        counter.inc(2, cache="plan", result="hit")
+        self.assertEqual(histogram.render() + counter.render(), [
+            "# HELP test_seconds Test.", "# TYPE test_seconds histogram",
+            'test_seconds_bucket{kind="tool",le="0.1"} 1',
+            'test_seconds_bucket{kind="tool",le="1.0"} 2',
+            'test_seconds_bucket{kind="tool",le="+Inf"} 3',
+            'test_seconds_sum{kind="tool"} 5.55',
+            'test_seconds_count{kind="tool"} 3',
+            "# HELP test_total Test.", "# TYPE test_total counter",
+            'test_total{cache="plan",result="hit"} 2',
+        ])
+
+    def test_database_statements_are_spans_of_the_current_span(self):
+        spans = []
+        engine = create_engine("sqlite://")
+        with mock.patch.object(telemetry, "exporters", [spans.append]):
+            with telemetry.span("report"), engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+                with self.assertRaises(Exception):
+                    connection.execute(text("SELECT * FROM missing"))
+        self.assertEqual(tree(spans), ["internal:report", "  db:SELECT", "  db:SELECT"])
+        self.assertEqual([s["status"] for s in spans[:2]], ["OK", "ERROR"])
+        self.assertEqual(spans[1]["attributes"]["statement"], "SELECT * FROM missing")
+
+
+class WorkflowTest(unittest.TestCase):
+    def setUp(self):
+        self.factories = dict(registry.factories)
+        registry.register("llm", lambda: FakeListChatModel(responses=["Oil grade SAE 15W-40.", "SAE 15W-40"]))
+        registry.register("response_cache", lambda: SemanticCache(FakeEmbeddings(), threshold=0.9))
+        with mock.patch.object(workflow, "multi_query_rewrite", planner), \
+                mock.patch.object(workflow, "amulti_query_rewrite", aplanner):
+            graph = workflow.build_graph()
+        registry.register("workflow_graph", lambda: graph)
+        self.spans = []
+        self.patches = [mock.patch.dict(executor.tools_by_name, {"extract_from_manual": extract_from_manual}),
+                        mock.patch.object(telemetry, "exporters", [self.spans.append])]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        for name in ("llm", "response_cache", "workflow_graph"):
+            registry.register(name, self.factories[name])
+
+    def test_nodes_tools_and_llm_calls_nest_under_the_workflow(self):
+        expected = ["workflow:workflow", "  graph:LangGraph", "    node:__decipher__", "    node:__collect__",
+                    "    node:__execute_step__", "      tool:extract_from_manual", "        llm:FakeListChatModel",
+                    "    node:__collect__", "    node:__execute_step__", "      tool:summarize",
+                    "        llm:FakeListChatModel", "    node:__collect__"]
+        workflow.Workflow().invoke(QUERY, organization="Maritime")
+        self.assertEqual(tree(self.spans), expected)
+
+        self.spans.clear()
+        asyncio.run(workflow.Workflow().ainvoke("Which coolant does the RT-flex82C need?", organization="Maritime"))
+        self.assertEqual(tree(self.spans), expected)
+
+    def test_llm_tokens_cost_and_cache_hits_are_counted(self):
+        tokens = telemetry.llm_tokens.value(model="FakeListChatModel", type="completion")
+        hits = telemetry.cache_requests.value(cache="response", result="hit")
+        workflow.Workflow().invoke(QUERY, organization="Maritime")
+        workflow.Workflow().invoke(QUERY, organization="Maritime")
+        llm = [s for s in self.spans if s["kind"] == "llm"]
+        self.assertEqual(len(llm), 2)
+        self.assertGreater(llm[1]["attributes"]["prompt_tokens"], llm[1]["attributes"]["completion_tokens"])
+        self.assertGreater(llm[1]["attributes"]["cost_usd"], 0)
+        self.assertEqual(telemetry.llm_tokens.value(model="FakeListChatModel", type="completion") - tokens,
+                         sum(s["attributes"]["completion_tokens"] for s in llm))
+        self.assertEqual(telemetry.cache_requests.value(cache="response", result="hit") - hits, 1)
+
+        metrics = app.test_client().get("/metrics")
+        self.assertEqual(metrics.mimetype, "text/plain")
+        self.assertIn('navexa_span_duration_seconds_count{kind="tool",name="summarize"}', metrics.get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
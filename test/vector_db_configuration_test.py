@@ -0,0 +1,141 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import faiss
+
+from utils import vector_db_configuration
+from utils.embeddings import BatchedEmbeddings, EmbeddingCache, FakeEmbeddings
+from utils.vector_db_configuration import FAISSVectorStoreConfiguration, PGVectorStoreConfiguration
+
+PARTS = ["fuel injector", "turbocharger bearing", "cooling water pump", "lubricating oil filter", "exhaust valve"]
+
+
+class OfflineFAISSConfiguration(FAISSVectorStoreConfiguration):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, dimension=64, **kwargs)
+        self.provider = FakeEmbeddings(dimension=64)
+        self.embeddings = BatchedEmbeddings(self.provider, EmbeddingCache(":memory:"), requests_per_minute=0)
+
+    def get_vector_store_embedding_model(self):
+        return self.embeddings
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_each_index_has_its_own_documents(self):
+        config = OfflineFAISSConfiguration()
+        ids = config.get_vector_store_handle("caterpillar-c32").add_texts(["Caterpillar fuel injector"])
+        config.get_vector_store_handle("wartsila-rt-flex82c").add_texts(["Wartsila exhaust valve"])
+        self.assertTrue(config.has_documents("caterpillar-c32", ids))
+        self.assertFalse(config.has_documents("wartsila-rt-flex82c", ids))
+        self.assertFalse(config.has_documents("man-b-w", ids))
+        found = config.get_vector_store_handle("caterpillar-c32").similarity_search("exhaust valve", k=5)
+        self.assertEqual([d.page_content for d in found], ["Caterpillar fuel injector"])
+        self.assertEqual(config.get_indexes(), ["caterpillar-c32", "wartsila-rt-flex82c"])
+        self.assertEqual([d.page_content for d in config.get_documents("caterpillar-c32")], ["Caterpillar fuel injector"])
+
+    def test_persisted_indexes_are_mapped_back_without_embedding(self):
+        config = OfflineFAISSConfiguration(self.folder)
+        config.get_vector_store_handle("caterpillar-c32").add_texts([f"{p} service interval" for p in PARTS])
+        config.persist()
+
+        reloaded = OfflineFAISSConfiguration(self.folder)
+        self.assertEqual(reloaded.get_indexes(), ["caterpillar-c32"])
+        found = reloaded.get_vector_store_handle("caterpillar-c32").similarity_search("turbocharger bearing", k=1)
+        self.assertEqual(found[0].page_content, "turbocharger bearing service interval")
+        self.assertEqual(reloaded.provider.texts, 1)  # the query only
+
+    def test_hnsw_index_supports_delete(self):
+        config = OfflineFAISSConfiguration(self.folder, index_type="hnsw")
+        store = config.get_vector_store_handle("manual")
+        ids = store.add_texts(PARTS)
+        self.assertIsInstance(store.index, faiss.IndexHNSWFlat)
+        store.delete(ids[:2])
+        config.persist()
+
+        store = OfflineFAISSConfiguration(self.folder, index_type="hnsw").get_vector_store_handle("manual")
+        self.assertEqual(store.index.ntotal, 3)
+        self.assertEqual(store.similarity_search("cooling water pump", k=1)[0].page_content, "cooling water pump")
+        self.assertNotIn("fuel injector", [d.page_content for d in store.similarity_search("fuel injector", k=3)])
+
+    def test_ivf_index_is_trained_once_large_enough(self):
+        with mock.patch.object(vector_db_configuration, "IVF_MIN_VECTORS", 200):
+            store = OfflineFAISSConfiguration(index_type="ivf").get_vector_store_handle("manual")
+            store.add_texts([f"{part} reading {i}" for i in range(40) for part in PARTS[:4]])
+            self.assertIsInstance(store.index, faiss.IndexFlat)
+            store.add_texts([f"{PARTS[4]} reading {i}" for i in range(40)])
+            self.assertIsInstance(store.index, faiss.IndexIVFFlat)
+            ids = list(store.index_to_docstore_id.values())
+            store.delete(ids[:10])
+            self.assertEqual(store.index.ntotal, 190)
+            self.assertEqual(store.similarity_search("exhaust valve reading 7", k=1)[0].page_content, "exhaust valve reading 7")
+
+
+class RecordingPGVector:
+    created = []
+
+    def __init__(self, **kwargs):
+        time.sleep(0.01)
+        self.kwargs = kwargs
+        RecordingPGVector.created.append(self)
+
+
+class OfflinePGVectorConfiguration(PGVectorStoreConfiguration):
+    def __init__(self, **kwargs):
+        super().__init__("postgresql://navexa@localhost/navexa", **kwargs)
+        self.fetches = 0
+
+    def get_vector_store_embedding_model(self):
+        return FakeEmbeddings()
+
+    def fetch_indexes(self):
+        self.fetches += 1
+        return [handle.kwargs["collection_name"] for handle in RecordingPGVector.created]
+
+
+@mock.patch.object(vector_db_configuration, "PGVector", RecordingPGVector)
+class PGVectorTest(unittest.TestCase):
+    def setUp(self):
+        RecordingPGVector.created = []
+
+    def test_handles_share_one_pooled_engine(self):
+        config = OfflinePGVectorConfiguration(pool_size=3, max_overflow=2)
+        handles = []
+        threads = [threading.Thread(target=lambda name=name: handles.append(config.get_vector_store_handle(name)))
+                   for name in ["caterpillar-c32", "wartsila-rt-flex82c"] * 8]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(h.kwargs["collection_name"] for h in RecordingPGVector.created),
+                         ["caterpillar-c32", "wartsila-rt-flex82c"])
+        self.assertEqual({id(h.kwargs["connection"]) for h in handles}, {id(config.get_engine())})
+        self.assertEqual(config.get_engine().pool.size(), 3)
+
+    def test_collection_list_is_cached_until_it_expires_or_a_collection_is_added(self):
+        config = OfflinePGVectorConfiguration(index_cache_ttl=0.2)
+        self.assertEqual(config.get_indexes(), [])
+        self.assertEqual(config.get_indexes(), [])
+        self.assertEqual(config.fetches, 1)
+        config.get_vector_store_handle("caterpillar-c32")
+        self.assertEqual(config.get_indexes(), ["caterpillar-c32"])
+        self.assertEqual(config.fetches, 2)
+        time.sleep(0.25)
+        config.get_indexes()
+        self.assertEqual(config.fetches, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+
+import workflow
+from common import Step
+
+TOOL_SECONDS = 0.3
+
+
+def plan(*steps):
+    return lambda state: {"steps": [Step(order=order, tool=tool, reason_it_was_chosen=tool, depends_on=depends_on)
+                                     for order, tool, depends_on in steps]}
+
+
+class Test(unittest.TestCase):
+    def setUp(self):
+        self.executed = []
+        self.lock = threading.Lock()
+
+    def execute_tool(self, state):
+        time.sleep(TOOL_SECONDS)
+        step = state["steps"][state["current_step"]]
+        with self.lock:
+            self.executed.append((step.order, state["output"]))
+        return f"result {step.order}"
+
+    async def aexecute_tool(self, state):
+        await asyncio.sleep(TOOL_SECONDS)
+        step = state["steps"][state["current_step"]]
+        self.executed.append((step.order, state["output"]))
+        return f"result {step.order}"
+
+    def run_graph(self, planner):
+        with mock.patch.object(workflow, "multi_query_rewrite", planner), \
+                mock.patch.object(workflow, "execute_tool", self.execute_tool):
+            began = time.perf_counter()
+            state = workflow.build_graph().invoke({"query": "Compare the C32, the C18 and the RT-flex82C"})
+            return state, time.perf_counter() - began
+
+    def test_independent_steps_run_concurrently(self):
+        state, seconds = self.run_graph(plan((1, "extract_from_manual", []), (2, "extract_from_manual", []),
+                                             (3, "extract_from_manual", []), (4, "summarize", [1, 2, 3])))
+        self.assertLess(seconds, 3 * TOOL_SECONDS)
+        self.assertEqual(sorted(self.executed[:3]), [(1, ""), (2, ""), (3, "")])
+        self.assertEqual(self.executed[3], (4, "result 1\n\nresult 2\n\nresult 3"))
+        self.assertEqual(state["output"], "result 4")
+
+    def test_steps_without_dependencies_run_in_order(self):
+        state, _ = self.run_graph(plan((2, "extract_from_manual", None), (1, "extract_organization_level_data", None),
+                                       (3, "summarize", None)))
+        self.assertEqual(self.executed, [(1, ""), (2, "result 1"), (3, "result 2")])
+        self.assertEqual(state["output"], "result 3")
+
+    def test_dependency_cycle_still_runs_every_step(self):
+        state, _ = self.run_graph(plan((1, "extract_from_manual", [2]), (2, "summarize", [1])))
+        self.assertEqual(sorted(order for order, _ in self.executed), [1, 2])
+        self.assertEqual(state["output"], "result 2")
+
+    def test_independent_steps_run_concurrently_on_the_event_loop(self):
+        planner = plan((1, "extract_from_manual", []), (2, "extract_from_manual", []), (3, "summarize", [1, 2]))
+
+        async def aplanner(state):
+            return planner(state)
+        with mock.patch.object(workflow, "amulti_query_rewrite", aplanner), \
+                mock.patch.object(workflow, "aexecute_tool", self.aexecute_tool):
+            began = time.perf_counter()
+            state = asyncio.run(workflow.build_graph().ainvoke({"query": "Compare the C32 and the C18"}))
+        self.assertLess(time.perf_counter() - began, 3 * TOOL_SECONDS)
+        self.assertEqual(self.executed[2], (3, "result 1\n\nresult 2"))
+        self.assertEqual(state["output"], "result 3")
+
+
+if __name__ == '__main__':
+    unittest.main()